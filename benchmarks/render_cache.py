@@ -0,0 +1,50 @@
+"""Allocations per question sent: building buttons per send vs filling the RenderCache template.
+
+Run from the repository root: `python -m benchmarks.render_cache`
+"""
+import tracemalloc
+import uuid
+
+from bot.services.quiz_registry import Quiz
+from bot.services.render_cache import RenderCache
+
+SENDS = 10000
+
+
+def _measure(label, send, session_ids):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for sid in session_ids:
+        send(sid)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    allocations = sum(s.count_diff for s in stats if s.count_diff > 0)
+    print(f"{label}: {allocations / len(session_ids):.1f} live allocations per question")
+
+
+def main():
+    quiz = Quiz.from_payload('bench', {'title': 'bench', 'questions': [
+        {'question_text': 'Which planet is known as the red planet?',
+         'options': ['Venus', 'Mars', 'Jupiter', 'Saturn'], 'correct_index': 1}]})
+    session_ids = [str(uuid.uuid4()) for _ in range(SENDS)]
+    sink = []
+    try:
+        from bot.utils.keyboards import options_keyboard
+
+        def _per_send(sid):
+            q = quiz.questions[0]
+            sink.append((f"Q1. {q.question_text}", options_keyboard(q.options, prefix=f"ans:{sid}:0")))
+        _measure('InlineKeyboardMarkup per send', _per_send, session_ids)
+    except ImportError:
+        print('python-telegram-bot not installed; skipping the per-send markup baseline')
+    sink.clear()
+
+    def _template(sid):
+        r = RenderCache.question(quiz, 0)
+        sink.append((r.text, r.solo_markup(sid)))
+    _measure('pre-rendered template', _template, session_ids)
+
+
+if __name__ == '__main__':
+    main()
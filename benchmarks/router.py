@@ -0,0 +1,40 @@
+"""Dispatch cost per callback query: CallbackRouter's prefix dict vs trying a regex per handler
+(python-telegram-bot's way).
+
+Run from the repository root: `python -m benchmarks.router`
+"""
+import re
+import timeit
+
+from bot.utils.router import CallbackRouter
+
+PREFIXES = ['play_quiz', 'my_score', 'leaderboard', 'premium', 'help', 'subject', 'qpage',
+            'quiz', 'start', 'a', 'j', 'g']
+BARE = ('play_quiz', 'my_score', 'leaderboard', 'premium', 'help')  # callback_data without a payload
+SAMPLES = ['g:041VYPpB2p', 'a:130VYPpB2p', 'play_quiz', 'subject:Physics']
+N = 200000
+
+
+async def _noop(update, context):
+    return None
+
+
+def main():
+    patterns = [re.compile(f'^{p}$' if p in BARE else f'^{p}:') for p in PREFIXES]
+    router = CallbackRouter()
+    for p in PREFIXES:
+        router.route(p)(_noop)
+
+    def _regex(data):
+        for pattern in patterns:
+            if pattern.match(data):
+                return pattern
+
+    for data in SAMPLES:
+        regex_us = timeit.timeit(lambda: _regex(data), number=N) / N * 1e6
+        dict_us = timeit.timeit(lambda: router.resolve(data), number=N) / N * 1e6
+        print(f"{data:<18} regex scan {regex_us:.3f}us  prefix dict {dict_us:.3f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,16 +11,61 @@ class Settings(BaseSettings):
 
     FIREBASE_CREDENTIALS_JSON: Optional[str]
     FIRESTORE_PROJECT_ID: Optional[str]
+    FIRESTORE_MAX_WORKERS: int = 32
+    FIRESTORE_TIMEOUT: float = 10.0  # per-operation deadline in seconds
 
     RAZORPAY_KEY_ID: Optional[str]
     RAZORPAY_KEY_SECRET: Optional[str]
 
-    WEBHOOK_URL: Optional[AnyHttpUrl]
+    WEBHOOK_URL: Optional[AnyHttpUrl]  # set to receive updates by webhook instead of polling
+    WEBHOOK_SECRET: Optional[str]
+    WEBHOOK_LISTEN: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8000
+    WEBHOOK_MAX_CONNECTIONS: int = 40
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    WEBHOOK_MAX_IN_FLIGHT: int = 256
+    ADMIN_API_TOKEN: Optional[str]  # bearer token for the admin HTTP endpoints; unset disables them
     ENV: str = "development"
 
     RATE_LIMIT_PER_MIN: int = 30
+    RATE_LIMIT_BACKEND: str = "memory"  # memory | redis
     REDIS_URL: Optional[str]
 
+    QUIZ_CACHE_MAX_ENTRIES: int = 512
+    QUIZ_CACHE_MAX_QUESTIONS: int = 50000
+    QUIZ_CACHE_TTL: int = 600
+    CATALOG_REFRESH_SECONDS: int = 300
+    CATALOG_SHARDS: int = 8  # documents each subject's quiz map is spread over; only ever raise it
+    QUIZ_PAGE_SIZE: int = 8
+    TIMER_TICK_SECONDS: float = 0.5
+
+    SESSION_STORE: str = "memory"  # memory | redis
+    SESSION_TTL_SECONDS: int = 21600
+    SESSION_SWEEP_INTERVAL: int = 10
+    SESSION_SWEEP_GRACE: int = 15
+
+    OUTBOUND_GLOBAL_PER_SECOND: int = 30
+    OUTBOUND_GROUP_PER_MINUTE: int = 20
+    OUTBOUND_PRIVATE_PER_SECOND: int = 1
+    OUTBOUND_MAX_CONCURRENCY: int = 30
+
+    RESULT_FLUSH_SIZE: int = 500
+    RESULT_FLUSH_INTERVAL: float = 2.0
+    RESULT_BUFFER_MAX: int = 20000
+    RESULT_MAX_RETRIES: int = 5
+    RESULT_JOURNAL_DIR: Optional[str] = "data/journal"  # empty keeps unwritten results in memory only
+    RESULT_JOURNAL_SEGMENT_BYTES: int = 16 * 1024 * 1024
+    RESULT_JOURNAL_FSYNC_INTERVAL: float = 0.01
+
+    ROLLUP_SHARDS: int = 4  # documents each leaderboard/bucket rollup is spread over; only ever raise it
+    LEADERBOARD_CACHE_TTL: float = 5.0  # seconds a /leaderboard reply is served without re-rendering
+    LEADERBOARD_CACHE_STALE: float = 300.0  # further seconds it may be served while re-rendering
+    LEADERBOARD_QUIZ_BOARDS: int = 256  # per-quiz boards kept in memory; others are re-read from rollups
+
+    DRAFT_FLUSH_DELAY: float = 5.0  # seconds quiz-builder changes may stay unsaved
+
+    GROUP_TALLY_INTERVAL: float = 10.0  # min seconds between edits of a group question's answer tally
+
     class Config:
         env_file = ".env"
 
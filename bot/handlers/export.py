@@ -0,0 +1,48 @@
+import os
+import tempfile
+import time
+from contextlib import aclosing
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+from bot.services.results_export import FORMATS, export_chunks, export_filename
+from bot.utils.helpers import admin_only, rate_limit
+
+MAX_EXPORT_DAYS = 3650
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # Bot API limit for documents sent by bots
+USAGE = f"Usage: /export_results [days (1-{MAX_EXPORT_DAYS}, default 7)] [{'|'.join(FORMATS)}] [quiz_id]"
+
+@admin_only
+@rate_limit(calls=3)
+async def export_results_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = list(context.args)
+    days, fmt, quiz_id = 7, 'csv', None
+    if args and args[0].isdigit():
+        days = int(args.pop(0))
+    if args and args[0] in FORMATS:
+        fmt = args.pop(0)
+    if args:
+        quiz_id = args.pop(0)
+    if args or not 1 <= days <= MAX_EXPORT_DAYS:
+        return await update.message.reply_text(USAGE)
+    end = int(time.time())
+    start = end - days * 86400
+    name = export_filename(fmt, start, end)
+    await update.message.reply_text("Exporting results...")
+    with tempfile.TemporaryDirectory() as tmp:
+        # compressed pages go straight to disk; only the upload itself reads the file back
+        path = os.path.join(tmp, name)
+        size = 0
+        with open(path, 'wb') as f, aclosing(export_chunks(start, end, fmt, quiz_id)) as chunks:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    return await update.message.reply_text(
+                        "Export is larger than Telegram's 50 MB limit. Use fewer days, or download it from "
+                        "the /admin/export/results HTTP endpoint.")
+                f.write(chunk)
+        with open(path, 'rb') as f:
+            await update.message.reply_document(f, filename=name, caption=f"Results of the last {days} days"
+                                                + (f" for quiz {quiz_id}" if quiz_id else ""))
+
+def register_export_handlers(app):
+    app.add_handler(CommandHandler('export_results', export_results_cmd))
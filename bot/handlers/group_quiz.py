@@ -2,11 +2,17 @@ import logging
 import time
 try:
     from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-    from telegram.ext import CommandHandler, CallbackQueryHandler, ContextTypes
+    from telegram.ext import CommandHandler, ContextTypes
 except Exception as e:
     raise ImportError("python-telegram-bot is not installed or is an incompatible package. Ensure you have installed 'python-telegram-bot[aio]==20.6' and there is no conflicting 'telegram' package installed.") from e
 from bot.services.firestore import FirestoreClient
-from bot.services.group_sessions import GroupSessionManager
+from bot.services.group_sessions import ALL_ANSWERED, GroupSessionManager
+from bot.services.outbound import QUESTION, outbound
+from bot.services.render_cache import RenderCache
+from bot.services.result_writer import ResultBufferFull, result_writer
+from bot.services.session_store import GROUP, GroupSession, on_expired_deadline
+from bot.utils.callback_data import GROUP_ANSWER, GROUP_JOIN
+from bot.utils.router import callback_router
 
 logger = logging.getLogger(__name__)
 
@@ -22,60 +28,96 @@ async def startquiz_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     quiz = await FirestoreClient.get_quiz(quiz_id)
     if not quiz:
         return await update.message.reply_text("Quiz not found")
-    s = GroupSessionManager.create(chat.id, quiz_id, quiz, user.id)
+    s = await GroupSessionManager.create(chat.id, quiz_id, quiz, user.id)
+    await GroupSessionManager.join(s.id, user.id)
+    join = InlineKeyboardMarkup([[InlineKeyboardButton("Join ✋", callback_data=GROUP_JOIN.encode(tail=s.id))]])
+    # same lane as the questions so it is posted before the first one
+    outbound.send_message(chat.id, f"Group quiz started with session id {s.id}\nTap Join to play; "
+                          "a question closes as soon as every player has answered.",
+                          reply_markup=join, priority=QUESTION)
     # post first question
     await post_question(s, context)
-    await update.message.reply_text(f"Group quiz started with session id {s['id']}")
 
-async def post_question(session: dict, context: ContextTypes.DEFAULT_TYPE):
-    idx = session['current']
-    quiz = session['quiz']
-    if idx >= len(quiz['questions']):
+async def post_question(session: GroupSession, context: ContextTypes.DEFAULT_TYPE):
+    idx = session.current
+    quiz = session.quiz
+    if idx >= len(quiz.questions):
         # finish
-        s = GroupSessionManager.finish(session['id'])
+        stats = GroupSessionManager.question_stats(session.id)
+        s = await GroupSessionManager.finish(session.id)
         if not s:
             return
         # prepare leaderboard
-        scores = s['scores']
+        scores = s.scores
         lines = [f"{i+1}. {uid} - {score}" for i, (uid, score) in enumerate(sorted(scores.items(), key=lambda x: -x[1]))]
         text = "Group Quiz finished!\n" + ("\n".join(lines) if lines else "No one scored points.")
-        await context.bot.send_message(chat_id=s['chat_id'], text=text)
-        # persist results per user
-        for uid, score in scores.items():
-            await FirestoreClient.save_result({'user_id': uid, 'quiz_id': s['quiz_id'], 'score': score, 'timestamp': int(time.time()), 'time_taken': 0})
+        if stats:
+            early = sum(1 for st in stats if st.closed_by == ALL_ANSWERED)
+            avg = sum(st.duration for st in stats) / len(stats)
+            text += f"\n\n{early}/{len(stats)} questions closed early, {avg:.1f}s per question on average."
+        outbound.send_message(s.chat_id, text, priority=QUESTION)
+        # persist results per user in one go; the writer batches them into a few Firestore commits
+        now = int(time.time())
+        try:
+            await result_writer.enqueue_many([{'user_id': uid, 'quiz_id': s.quiz_id, 'score': score, 'timestamp': now,
+                                               'time_taken': 0} for uid, score in scores.items()])
+        except ResultBufferFull:
+            logger.error("Result buffer full, dropping %d results of group session %s", len(scores), s.id)
         return
-    q = quiz['questions'][idx]
-    text = f"Q{idx+1}. {q['question_text']}"
-    keyboard = [[InlineKeyboardButton(f"{['A','B','C','D'][i]}", callback_data=f"gans:{session['id']}:{idx}:{i}")] for i in range(len(q['options']))]
-    await context.bot.send_message(chat_id=session['chat_id'], text=text, reply_markup=InlineKeyboardMarkup(keyboard))
+    rendered = RenderCache.question(quiz, idx)
+    markup = rendered.group_markup(session.id)
+    # the clock starts once the question has actually been delivered
+    msg = await outbound.send_message(session.chat_id, rendered.text, reply_markup=markup, priority=QUESTION)
+    # answers show up as a periodically edited tally under the question
+    GroupSessionManager.open_tally(session.id, idx, session.chat_id, msg.message_id, rendered.text, markup,
+                                   len(quiz.questions[idx].options))
 
     async def _timeout():
-        GroupSessionManager.timeout(session['id'], idx)
-        GroupSessionManager.next(session['id'])
-        s2 = GroupSessionManager.get(session['id'])
-        if s2:
-            await post_question(s2, context)
+        await handle_timeout(context, session.id, idx)
 
-    GroupSessionManager.schedule_timeout(session['id'], idx, quiz['time_per_question'], _timeout)
+    await GroupSessionManager.schedule_timeout(session.id, idx, quiz.time_per_question, _timeout)
 
+async def handle_timeout(context, session_id: str, idx: int):
+    # False when everyone answered first and the question was already closed
+    if await GroupSessionManager.timeout(session_id, idx):
+        await _post_next(session_id, context)
+
+async def _post_next(session_id: str, context):
+    s2 = await GroupSessionManager.get(session_id)
+    if s2:
+        await post_question(s2, context)
+
+@callback_router.route(GROUP_JOIN.prefix)
+async def group_join_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    decoded = GROUP_JOIN.decode(query.data)
+    if decoded is None:
+        return await query.answer()
+    _, session_id = decoded
+    if await GroupSessionManager.join(session_id, update.effective_user.id):
+        return await query.answer("You're in!")
+    await query.answer("Already joined, or this quiz has ended.")
+
+@callback_router.route(GROUP_ANSWER.prefix)
 async def group_answer_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
-    parts = query.data.split(':')
-    if len(parts) != 4:
-        return
-    _, session_id, q_idx_s, sel_s = parts
-    q_idx = int(q_idx_s)
-    sel = int(sel_s)
+    decoded = GROUP_ANSWER.decode(query.data)
+    if decoded is None:
+        return await query.answer()
+    (q_idx, sel), session_id = decoded
     user = update.effective_user
-    ok = GroupSessionManager.answer(session_id, q_idx, user.id, sel)
+    ok = await GroupSessionManager.answer(session_id, q_idx, user.id, sel, name=user.first_name)
     if not ok:
         return await query.answer("Not accepted (maybe you already answered or session ended)", show_alert=True)
-    await query.message.reply_text(f"{user.first_name} answered")
-
-    # we do not progress until timeout; optional: end early if everyone answered
+    await query.answer("Answer recorded")
+    if await GroupSessionManager.close_question(session_id, q_idx, ALL_ANSWERED):
+        await _post_next(session_id, context)
 
 
 def register_group_handlers(app):
+    # the application exposes .bot like a callback context does
+    async def _recover_timeout(session_id: str, idx: int):
+        await handle_timeout(app, session_id, idx)
+    on_expired_deadline(GROUP, _recover_timeout)
+
     app.add_handler(CommandHandler('startquiz', startquiz_cmd))
-    app.add_handler(CallbackQueryHandler(group_answer_handler, pattern='^gans:'))
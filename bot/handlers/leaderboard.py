@@ -1,48 +1,42 @@
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
 from bot.services.firestore import FirestoreClient
+from bot.services.leaderboards import LeaderboardStore, daily_key, weekly_key, quiz_key
+from bot.services.rollups import MAX_RANGE_DAYS
 
 async def leaderboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # /leaderboard [daily|weekly|quiz <quiz_id>]
+    # /leaderboard [daily|weekly|month|last <days>|quiz <quiz_id>]
+    # daily/weekly are the current UTC day and ISO week, month the current UTC month
     args = context.args
     now = int(time.time())
     if not args or args[0] == 'daily':
-        start = int((datetime.utcnow() - timedelta(days=1)).timestamp())
-        end = now
+        view = ('daily', daily_key(now))
+        load = lambda: FirestoreClient.get_leaderboard(view[1])
     elif args[0] == 'weekly':
-        start = int((datetime.utcnow() - timedelta(days=7)).timestamp())
-        end = now
+        view = ('weekly', weekly_key(now))
+        load = lambda: FirestoreClient.get_leaderboard(view[1])
     elif args[0] == 'quiz' and len(args) == 2:
-        start = 0
-        end = now
-        quiz_id = args[1]
+        view = ('quiz', quiz_key(args[1]))
+        load = lambda: FirestoreClient.get_leaderboard(view[1])
+    elif args[0] == 'month':
+        month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        view = ('month', int(month_start.timestamp()))
+        load = lambda: FirestoreClient.get_range_leaderboard(view[1], int(time.time()))
+    elif args[0] == 'last' and len(args) == 2 and args[1].isdigit() and 1 <= int(args[1]) <= MAX_RANGE_DAYS:
+        view = ('last', int(args[1]))
+        load = lambda: FirestoreClient.get_range_leaderboard(int(time.time()) - view[1] * 86400, int(time.time()))
     else:
-        return await update.message.reply_text("Usage: /leaderboard [daily|weekly|quiz <quiz_id>]")
-
-    if args and args[0] == 'quiz' and len(args) == 2:
-        results = await FirestoreClient.get_results_for_timeframe(start, end, quiz_id=args[1])
-    else:
-        results = await FirestoreClient.get_results_for_timeframe(start, end)
-
-    # aggregate by user_id -> best score (or highest score, then lower time)
-    agg = {}
-    for r in results:
-        uid = r.get('user_id')
-        if uid is None:
-            continue
-        score = r.get('score', 0)
-        t = r.get('time_taken', 0) or 0
-        prev = agg.get(uid)
-        if not prev or (score > prev['score'] or (score == prev['score'] and t < prev['time'])):
-            agg[uid] = {'score': score, 'time': t}
-    if not agg:
-        return await update.message.reply_text("No results for the period.")
-    items = sorted(agg.items(), key=lambda x: (-x[1]['score'], x[1]['time']))[:10]
-    lines = [f"#{i+1} - {uid}: {v['score']} pts, {v['time']}s" for i, (uid, v) in enumerate(items)]
-    await update.message.reply_text("\n".join(lines))
+        return await update.message.reply_text(f"Usage: /leaderboard [daily|weekly|month|last <1-{MAX_RANGE_DAYS} days>|quiz <quiz_id>]")
 
+    async def _render():
+        items = (await load()).top(10)
+        if not items:
+            return "No results for the period."
+        return "\n".join(f"#{i+1} - {uid}: {score} pts, {t}s" for i, (uid, score, t) in enumerate(items))
+    # concurrent requests for a view share one render; once warm, replies never wait for one
+    await update.message.reply_text(await LeaderboardStore.cached_view(view, _render))
 
 def register_leaderboard_handlers(app):
     app.add_handler(CommandHandler('leaderboard', leaderboard_command))
@@ -1,9 +1,15 @@
+import os
+import tempfile
 import uuid
 import logging
 from telegram import Update
-from telegram.ext import ContextTypes, CommandHandler
+from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
 from bot.config import settings
+from bot.services.drafts import DraftService
 from bot.services.firestore import FirestoreClient
+from bot.services.quiz_import import FORMATS, QuizImporter, import_format
+from bot.services.render_cache import RenderCache
+from bot.utils.validation import describe, quiz_errors
 
 logger = logging.getLogger(__name__)
 
@@ -19,15 +25,7 @@ async def create_quiz_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if not await is_admin(user.id):
         return await update.message.reply_text(ADMIN_ONLY_MSG)
-    draft_id = str(user.id)
-    draft = {
-        'title': '',
-        'subject': '',
-        'time_per_question': 15,
-        'is_premium': False,
-        'questions': []
-    }
-    await FirestoreClient.set_doc('quiz_drafts', draft_id, draft)
+    await DraftService.create_draft(user.id)
     await update.message.reply_text("Draft created. Use /set_quiz_title, /set_subject, /set_time_per_question, /add_question, /add_options, /set_correct_option and /publish_quiz to build it.")
 
 async def set_quiz_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -39,10 +37,7 @@ async def set_quiz_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await update.message.reply_text("Usage: /set_quiz_title Your Quiz Title (max 300 chars)")
     if len(title) > 300:
         return await update.message.reply_text("Title too long (max 300 chars)")
-    draft_id = str(user.id)
-    draft = await FirestoreClient.get_doc('quiz_drafts', draft_id) or {}
-    draft['title'] = title
-    await FirestoreClient.set_doc('quiz_drafts', draft_id, draft)
+    await DraftService.set_field(user.id, 'title', title)
     await update.message.reply_text("Title set.")
 
 async def set_subject(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -52,10 +47,7 @@ async def set_subject(update: Update, context: ContextTypes.DEFAULT_TYPE):
     subject = ' '.join(context.args)
     if not subject:
         return await update.message.reply_text("Usage: /set_subject SubjectName")
-    draft_id = str(user.id)
-    draft = await FirestoreClient.get_doc('quiz_drafts', draft_id) or {}
-    draft['subject'] = subject
-    await FirestoreClient.set_doc('quiz_drafts', draft_id, draft)
+    await DraftService.set_field(user.id, 'subject', subject)
     await update.message.reply_text("Subject set.")
 
 async def set_time_per_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -67,10 +59,7 @@ async def set_time_per_question(update: Update, context: ContextTypes.DEFAULT_TY
     secs = int(context.args[0])
     if secs < 5 or secs > 600:
         return await update.message.reply_text("Time must be between 5 and 600 seconds")
-    draft_id = str(user.id)
-    draft = await FirestoreClient.get_doc('quiz_drafts', draft_id) or {}
-    draft['time_per_question'] = secs
-    await FirestoreClient.set_doc('quiz_drafts', draft_id, draft)
+    await DraftService.set_field(user.id, 'time_per_question', secs)
     await update.message.reply_text("Time per question set.")
 
 async def add_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -82,12 +71,8 @@ async def add_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await update.message.reply_text("Usage: /add_question Your question text (max 300 chars)")
     if len(q_text) > 300:
         return await update.message.reply_text("Question too long (max 300 chars)")
-    draft_id = str(user.id)
-    draft = await FirestoreClient.get_doc('quiz_drafts', draft_id) or {'questions': []}
-    q = {'question_text': q_text, 'options': [], 'correct_index': None}
-    draft.setdefault('questions', []).append(q)
-    await FirestoreClient.set_doc('quiz_drafts', draft_id, draft)
-    await update.message.reply_text(f"Added question #{len(draft['questions'])-1}")
+    idx = await DraftService.add_question(user.id, q_text)
+    await update.message.reply_text(f"Added question #{idx}")
 
 async def add_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
@@ -104,13 +89,8 @@ async def add_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
     parts = [p.strip() for p in rest.split('|') if p.strip()]
     if len(parts) != 4:
         return await update.message.reply_text("You must provide exactly 4 options separated by |")
-    draft_id = str(user.id)
-    draft = await FirestoreClient.get_doc('quiz_drafts', draft_id) or {}
-    questions = draft.setdefault('questions', [])
-    if q_idx < 0 or q_idx >= len(questions):
+    if not await DraftService.set_question_field(user.id, q_idx, 'options', parts):
         return await update.message.reply_text("Question index out of range")
-    questions[q_idx]['options'] = parts
-    await FirestoreClient.set_doc('quiz_drafts', draft_id, draft)
     await update.message.reply_text(f"Options set for question {q_idx}.")
 
 async def set_correct_option(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -126,55 +106,95 @@ async def set_correct_option(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return await update.message.reply_text("Invalid numbers")
     if correct < 0 or correct > 3:
         return await update.message.reply_text("Correct option must be 0-3")
-    draft_id = str(user.id)
-    draft = await FirestoreClient.get_doc('quiz_drafts', draft_id) or {}
-    questions = draft.setdefault('questions', [])
-    if q_idx < 0 or q_idx >= len(questions):
+    if not await DraftService.set_question_field(user.id, q_idx, 'correct_index', correct):
         return await update.message.reply_text("Question index out of range")
-    questions[q_idx]['correct_index'] = correct
-    await FirestoreClient.set_doc('quiz_drafts', draft_id, draft)
     await update.message.reply_text(f"Correct option set for question {q_idx}.")
 
 async def publish_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if not await is_admin(user.id):
         return await update.message.reply_text(ADMIN_ONLY_MSG)
-    draft_id = str(user.id)
-    draft = await FirestoreClient.get_doc('quiz_drafts', draft_id)
+    # save pending edits first, so the draft survives if publishing fails
+    await DraftService.flush(user.id)
+    draft = await DraftService.get_draft(user.id)
     if not draft:
         return await update.message.reply_text("No draft found. Create one with /create_quiz")
-    # validate
-    required = ['title', 'subject', 'time_per_question']
-    for r in required:
-        if not draft.get(r):
-            return await update.message.reply_text(f"Draft missing {r}. Set it before publishing.")
-    if not draft.get('questions'):
-        return await update.message.reply_text("Add at least one question before publishing.")
-    for idx, q in enumerate(draft['questions']):
-        if not q.get('question_text') or not q.get('options') or q.get('correct_index') is None:
-            return await update.message.reply_text(f"Question {idx} is incomplete. Ensure text, 4 options and correct option are set.")
+    # same rules as the bulk importer
+    errors = quiz_errors(draft)
+    if errors:
+        return await update.message.reply_text("Fix the draft before publishing:\n" + '\n'.join(f"- {describe(e)}" for e in errors[:20]))
     quiz_id = str(uuid.uuid4())
     payload = {
         'title': draft['title'],
         'subject': draft['subject'],
         'time_per_question': draft['time_per_question'],
         'is_premium': draft.get('is_premium', False),
-        'questions': draft['questions']
+        'questions': [dict(q) for q in draft['questions']]  # the draft stays editable while this is written
     }
     await FirestoreClient.create_quiz(quiz_id, payload)
-    await FirestoreClient.delete_doc('quiz_drafts', draft_id)
+    RenderCache.warm(quiz_id, payload)
+    await DraftService.delete_draft(user.id)
     await update.message.reply_text(f"Quiz published with id: {quiz_id}")
 
+async def delete_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not await is_admin(user.id):
+        return await update.message.reply_text(ADMIN_ONLY_MSG)
+    if len(context.args) != 1:
+        return await update.message.reply_text("Usage: /delete_quiz <quiz_id>")
+    if not await FirestoreClient.delete_quiz(context.args[0]):
+        return await update.message.reply_text("Quiz not found")
+    await update.message.reply_text("Quiz deleted.")
+
 async def list_draft(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if not await is_admin(user.id):
         return await update.message.reply_text(ADMIN_ONLY_MSG)
-    draft = await FirestoreClient.get_doc('quiz_drafts', str(user.id))
+    await DraftService.flush(user.id)  # also picks up edits saved through another worker
+    draft = await DraftService.get_draft(user.id)
     if not draft:
         return await update.message.reply_text("No draft found")
     await update.message.reply_text(str(draft))
 
-async def register_quiz_create_handlers(app):
+MAX_IMPORT_BYTES = 20 * 1024 * 1024  # largest file a bot may download through the Bot API
+MAX_REPORT_CHARS = 3500
+
+@rate_limit(calls=5)
+async def import_quizzes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not await is_admin(user.id):
+        return await update.message.reply_text(ADMIN_ONLY_MSG)
+    document = update.message.document
+    fmt = import_format(document.file_name)
+    if fmt is None:
+        return await update.message.reply_text(f"To import quizzes send a {', '.join(FORMATS)} file.")
+    if document.file_size and document.file_size > MAX_IMPORT_BYTES:
+        return await update.message.reply_text("File too large (max 20 MB); split it into several files.")
+    await update.message.reply_text("Checking file...")
+    with tempfile.TemporaryDirectory() as tmp:
+        # streamed to disk and parsed from there, so the file is never held in memory
+        path = os.path.join(tmp, 'import' + os.path.splitext(document.file_name)[1].lower())
+        tg_file = await document.get_file()
+        await tg_file.download_to_drive(path)
+        report = await QuizImporter.run(path, fmt)
+    if report.error_count:
+        lines = [f"Nothing imported: {report.error_count} problem(s) in {report.quizzes} quizzes."]
+        shown = 0
+        for line in report.errors:
+            if sum(len(l) + 1 for l in lines) + len(line) > MAX_REPORT_CHARS:
+                break
+            lines.append(line)
+            shown += 1
+        if shown < report.error_count:
+            lines.append(f"... and {report.error_count - shown} more")
+        return await update.message.reply_text('\n'.join(lines))
+    if report.failure:
+        return await update.message.reply_text(
+            f"Import stopped after {report.written} of {report.quizzes} quizzes: {report.failure}. "
+            "Quizzes already written stay published; remove them from the file before retrying.")
+    await update.message.reply_text(f"Imported {report.written} quizzes ({report.questions} questions).")
+
+def register_quiz_create_handlers(app):
     app.add_handler(CommandHandler('create_quiz', create_quiz_cmd))
     app.add_handler(CommandHandler('set_quiz_title', set_quiz_title))
     app.add_handler(CommandHandler('set_subject', set_subject))
@@ -183,4 +203,6 @@ async def register_quiz_create_handlers(app):
     app.add_handler(CommandHandler('add_options', add_options))
     app.add_handler(CommandHandler('set_correct_option', set_correct_option))
     app.add_handler(CommandHandler('publish_quiz', publish_quiz))
+    app.add_handler(CommandHandler('delete_quiz', delete_quiz))
     app.add_handler(CommandHandler('list_draft', list_draft))
+    app.add_handler(MessageHandler(filters.ChatType.PRIVATE & filters.Document.ALL, import_quizzes))
@@ -1,13 +1,27 @@
+import asyncio
 import logging
 import time
+from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CallbackQueryHandler
+from telegram.ext import ContextTypes
+from bot.config import settings
 from bot.services.firestore import FirestoreClient
+from bot.services.outbound import FEEDBACK, QUESTION, outbound
+from bot.services.quiz_registry import OPTION_LABELS
+from bot.services.render_cache import RenderCache
+from bot.services.result_writer import ResultBufferFull, result_writer
+from bot.services.session_store import SOLO, QuizSession, on_expired_deadline
 from bot.services.sessions import SessionManager
-from bot.utils.keyboards import subject_selection_keyboard, options_keyboard
+from bot.utils.callback_data import ANSWER
+from bot.utils.helpers import rate_limit
+from bot.utils.keyboards import subject_selection_keyboard, quiz_list_keyboard
+from bot.utils.router import callback_router
 
 logger = logging.getLogger(__name__)
 
+MAX_QUIZ_LISTS = 5  # paginated quiz lists remembered per user
+
+@callback_router.route('play_quiz')
 async def show_subjects(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # callback 'play_quiz'
     query = update.callback_query
@@ -17,17 +31,47 @@ async def show_subjects(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await query.edit_message_text("No quizzes available yet.")
     await query.edit_message_text("Choose a subject:", reply_markup=subject_selection_keyboard(subjects))
 
+@callback_router.route('subject', rate_limit(name='browse'))
 async def subject_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     data = query.data  # subject:name
     _, subject = data.split(':', 1)
-    quizzes = await FirestoreClient.list_quizzes_by_subject(subject)
+    # keyed by the list's message, so two open lists page independently
+    pages = context.user_data.setdefault('quiz_pages', {})
+    pages.pop(query.message.message_id, None)
+    while len(pages) >= MAX_QUIZ_LISTS:
+        pages.pop(next(iter(pages)))  # oldest list; its buttons answer "expired"
+    # cursors[-1] is the id the current page starts after (None for the first page)
+    state = pages[query.message.message_id] = {'subject': subject, 'cursors': [None], 'next': None}
+    await _render_quiz_page(query, state)
+
+@callback_router.route('qpage', rate_limit(name='browse'))
+async def quiz_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # callback 'qpage:next' / 'qpage:prev'
+    query = update.callback_query
+    await query.answer()
+    state = context.user_data.get('quiz_pages', {}).get(query.message.message_id)
+    if not state:
+        return await query.edit_message_text("This list has expired. Tap Play Quiz again.")
+    _, direction = query.data.split(':', 1)
+    if direction == 'next' and state['next']:
+        state['cursors'].append(state['next'])
+    elif direction == 'prev' and len(state['cursors']) > 1:
+        state['cursors'].pop()
+    await _render_quiz_page(query, state)
+
+async def _render_quiz_page(query, state: dict):
+    subject = state['subject']
+    quizzes, next_cursor = await FirestoreClient.list_quiz_page(subject, settings.QUIZ_PAGE_SIZE, state['cursors'][-1])
+    state['next'] = next_cursor
     if not quizzes:
         return await query.edit_message_text("No quizzes in this subject.")
-    keyboard = [[InlineKeyboardButton(q['title'], callback_data=f"quiz:{q['id']}")] for q in quizzes]
-    await query.edit_message_text(f"Quizzes for {subject}:", reply_markup=InlineKeyboardMarkup(keyboard))
+    page = len(state['cursors'])
+    keyboard = quiz_list_keyboard(quizzes, has_prev=page > 1, has_next=next_cursor is not None)
+    await query.edit_message_text(f"Quizzes for {subject} (page {page}):", reply_markup=keyboard)
 
+@callback_router.route('quiz', rate_limit(name='browse'))
 async def quiz_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -39,6 +83,7 @@ async def quiz_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [[InlineKeyboardButton("Start Quiz ▶️", callback_data=f"start:{quiz_id}")]]
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
 
+@callback_router.route('start', rate_limit(name='browse'))
 async def start_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -47,88 +92,111 @@ async def start_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
     quiz = await FirestoreClient.get_quiz(quiz_id)
     if not quiz:
         return await query.edit_message_text("Quiz not found")
-    session = SessionManager.create_session(user.id, quiz_id, quiz)
+    session = await SessionManager.create_session(user.id, quiz_id, quiz, chat_id=query.message.chat_id)
     await send_question(query.message.chat_id, context, session)
 
-async def send_question(chat_id: int, context: ContextTypes.DEFAULT_TYPE, session: dict):
-    idx = session['current']
-    quiz = session['quiz']
-    if idx >= len(quiz['questions']):
+async def send_question(chat_id: int, context: ContextTypes.DEFAULT_TYPE, session: QuizSession,
+                        started: Optional[float] = None):
+    # started: monotonic time of the answer/timeout that led here, for the turnaround histogram
+    idx = session.current
+    quiz = session.quiz
+    if idx >= len(quiz.questions):
         # finish
-        s = SessionManager.finish(session['id'])
-        total = s['score']
-        count = len(s['answers'])
+        s = await SessionManager.finish(session.id)
+        if not s:
+            return
+        total = s.score
+        count = s.answered
         acc = (total / count * 100) if count else 0
-        await context.bot.send_message(chat_id=chat_id, text=f"Quiz finished! Score: {total}/{count} (Accuracy: {acc:.1f}%)")
+        outbound.send_message(chat_id, f"Quiz finished! Score: {total}/{count} (Accuracy: {acc:.1f}%)", priority=QUESTION)
         # persist result
         payload = {
-            'user_id': s['user_id'],
-            'quiz_id': s['quiz_id'],
-            'score': s['score'],
+            'user_id': s.user_id,
+            'quiz_id': s.quiz_id,
+            'score': s.score,
             'timestamp': int(time.time()),
-            'time_taken': int(time.time() - s['started_at'])
+            'time_taken': int(time.time() - s.started_at)
         }
-        await FirestoreClient.save_result(payload)
+        try:
+            await result_writer.enqueue(payload)
+        except ResultBufferFull:
+            logger.error("Result buffer full, dropping result of user %s for quiz %s", s.user_id, s.quiz_id)
         return
-    q = quiz['questions'][idx]
-    text = f"Q{idx+1}. {q['question_text']}"
-    keyboard = options_keyboard(q['options'], prefix=f"ans:{session['id']}:{idx}")
-    msg = await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard)
+    rendered = RenderCache.question(quiz, idx)
+    # the clock starts once the question has actually been delivered
+    await outbound.send_message(chat_id, rendered.text, reply_markup=rendered.solo_markup(session.id), priority=QUESTION)
+    if started is not None:
+        SessionManager.observe_turnaround(time.monotonic() - started)
 
     # schedule timeout
     async def _timeout():
-        try:
-            # mark timeout in session
-            SessionManager.timeout(session['id'], idx)
-            await context.bot.send_message(chat_id=chat_id, text=f"Time's up for question {idx+1} ⏰")
-            SessionManager.next_question(session['id'])
-            # send next question
-            s = SessionManager.get(session['id'])
-            if s:
-                await send_question(chat_id, context, s)
-        except Exception as e:
-            logger.exception("Timeout handler error: %s", e)
+        await handle_timeout(chat_id, context, session.id, idx)
 
-    SessionManager.schedule_timeout(session['id'], idx, quiz['time_per_question'], _timeout)
+    await SessionManager.schedule_timeout(session.id, idx, quiz.time_per_question, _timeout)
 
+async def handle_timeout(chat_id: int, context, session_id: str, idx: int):
+    started = time.monotonic()
+    try:
+        # mark timeout in session (skipped if the question was answered meanwhile) while fetching it
+        timed_out, s = await asyncio.gather(SessionManager.timeout(session_id, idx), SessionManager.get(session_id))
+        if not timed_out or not s:
+            return
+        # both go through the chat's queue in order, so the notice can't overtake the question
+        outbound.send_message(chat_id, f"Time's up for question {idx+1} ⏰", priority=QUESTION)
+        nxt = await SessionManager.next_question(session_id)
+        if nxt is None:
+            return
+        s.current = nxt
+        await send_question(chat_id, context, s, started=started)
+    except Exception as e:
+        logger.exception("Timeout handler error: %s", e)
+
+@callback_router.route(ANSWER.prefix)
 async def answer_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
-    data = query.data  # ans:session_id:idx:sel
-    parts = data.split(':')
-    if len(parts) != 4:
-        return
-    _, session_id, q_idx_s, sel_s = parts
-    q_idx = int(q_idx_s)
-    selected = int(sel_s)
-    s = SessionManager.get(session_id)
+    started = time.monotonic()
+    decoded = ANSWER.decode(query.data)
+    if decoded is None:
+        return await query.answer()
+    (q_idx, selected), session_id = decoded
+    s = await SessionManager.get(session_id)
     if not s:
-        return await query.edit_message_text("Session expired or invalid.")
+        return await query.answer("Session expired or invalid.", show_alert=True)
     user = update.effective_user
-    if user.id != s['user_id']:
+    if user.id != s.user_id:
         return await query.answer("This quiz is for another user", show_alert=True)
     # compute time taken as naive
     # Here, we simply mark as answered and give instant feedback
     try:
-        is_correct = SessionManager.answer(session_id, q_idx, selected, 0)
+        is_correct = await SessionManager.answer(session_id, q_idx, selected, 0)
     except Exception as e:
         return await query.answer(str(e), show_alert=True)
+    # scored: move on right away so the next question is staged before any Bot API round trip
+    nxt = await SessionManager.next_question(session_id)
     emoji = "✅" if is_correct else "❌"
-    correct_idx = s['quiz']['questions'][q_idx]['correct_index']
-    correct_label = ['A','B','C','D'][correct_idx]
-    await query.edit_message_text(f"{emoji} {query.message.text}\n\nCorrect: {correct_label}")
-    # proceed to next question
-    SessionManager.next_question(session_id)
-    s2 = SessionManager.get(session_id)
-    if s2:
-        await send_question(query.message.chat_id, context, s2)
-
+    correct_label = OPTION_LABELS[s.quiz.questions[q_idx].correct_index]
+    chat_id = query.message.chat_id
+    # the toast, the feedback edit and the next question overlap; the edit touches the old
+    # message only, so it can't reorder the chat, and new messages keep their queue order
+    pending = [
+        query.answer(f"{emoji} Correct: {correct_label}"),
+        outbound.edit_message_text(chat_id, query.message.message_id,
+                                   f"{emoji} {query.message.text}\n\nCorrect: {correct_label}", priority=FEEDBACK),
+    ]
+    if nxt is not None:
+        s.current = nxt
+        pending.append(send_question(chat_id, context, s, started=started))
+    for result in await asyncio.gather(*pending, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.warning("Answer pipeline step failed: %s", result)
 
 def register_quiz_play_handlers(app):
-    # play flow
-    app.add_handler(CallbackQueryHandler(show_subjects, pattern='^play_quiz$'))
-    app.add_handler(CallbackQueryHandler(subject_selected, pattern='^subject:'))
-    app.add_handler(CallbackQueryHandler(quiz_selected, pattern='^quiz:'))
-    app.add_handler(CallbackQueryHandler(start_quiz, pattern='^start:'))
-    # answer pattern: ans:session_id:question_index:selected_index
-    app.add_handler(CallbackQueryHandler(answer_handler, pattern='^ans:'))
+    # timeouts orphaned by a stopped worker are picked up by the deadline sweeper;
+    # the application exposes .bot like a callback context does
+    async def _recover_timeout(session_id: str, idx: int):
+        s = await SessionManager.get(session_id)
+        if s:
+            await handle_timeout(s.chat_id, app, session_id, idx)
+    on_expired_deadline(SOLO, _recover_timeout)
+
+    # play flow callbacks are routed by the decorators above
@@ -1,9 +1,10 @@
 from telegram import Update
-from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler
+from telegram.ext import ContextTypes, CommandHandler
 from bot.utils.keyboards import main_menu_keyboard
 from bot.config import settings
 
 from bot.utils.helpers import rate_limit
+from bot.utils.router import callback_router
 
 @rate_limit()
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -14,26 +15,25 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     await update.message.reply_text(text, reply_markup=main_menu_keyboard())
 
-async def _play_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    await query.edit_message_text("Choose a subject:", reply_markup=None)
-
+@callback_router.route('my_score')
 async def _my_score(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     await query.edit_message_text("Your scores (coming soon)")
 
+@callback_router.route('leaderboard')
 async def _leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     await query.edit_message_text("Leaderboards (coming soon)")
 
+@callback_router.route('premium')
 async def _premium(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     await query.edit_message_text("Premium features (coming soon)")
 
+@callback_router.route('help')
 async def _help(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -41,9 +41,5 @@ async def _help(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 def register_start_handlers(app):
+    # menu callbacks are routed by the decorators above ('play_quiz' lives in quiz_play)
     app.add_handler(CommandHandler('start', start_command))
-    app.add_handler(CallbackQueryHandler(_play_callback, pattern='^play_quiz$'))
-    app.add_handler(CallbackQueryHandler(_my_score, pattern='^my_score$'))
-    app.add_handler(CallbackQueryHandler(_leaderboard, pattern='^leaderboard$'))
-    app.add_handler(CallbackQueryHandler(_premium, pattern='^premium$'))
-    app.add_handler(CallbackQueryHandler(_help, pattern='^help$'))
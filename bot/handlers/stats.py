@@ -0,0 +1,19 @@
+import io
+import json
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+from bot.services.stats import snapshot
+from bot.utils.helpers import admin_only
+
+MAX_MESSAGE_CHARS = 4000  # Telegram caps messages at 4096
+
+@admin_only
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # caches, pools, queues and latency histograms of this bot process
+    text = json.dumps(snapshot(), indent=1, default=str)
+    if len(text) <= MAX_MESSAGE_CHARS:
+        return await update.message.reply_text(text)
+    await update.message.reply_document(io.BytesIO(text.encode()), filename='stats.json')
+
+def register_stats_handlers(app):
+    app.add_handler(CommandHandler('stats', stats_cmd))
@@ -8,6 +8,7 @@ if ROOT not in sys.path:
 
 import asyncio
 import logging
+import secrets
 from dotenv import load_dotenv
 from telegram.ext import ApplicationBuilder
 
@@ -17,7 +18,15 @@ from bot.handlers.quiz_create import register_quiz_create_handlers
 from bot.handlers.quiz_play import register_quiz_play_handlers
 from bot.handlers.leaderboard import register_leaderboard_handlers
 from bot.handlers.group_quiz import register_group_handlers
+from bot.handlers.export import register_export_handlers
+from bot.handlers.stats import register_stats_handlers
+from bot.services.catalog import SubjectCatalog
+from bot.services.drafts import DraftService
 from bot.services.firestore import FirestoreClient
+from bot.services.outbound import outbound
+from bot.services.result_writer import result_writer
+from bot.services.session_store import run_deadline_sweeper
+from bot.utils.router import callback_router
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,6 +36,12 @@ load_dotenv()
 async def main() -> None:
     # Initialize services
     await FirestoreClient.init()
+    await FirestoreClient.refresh_subject_catalog()
+    if SubjectCatalog.is_empty():
+        # first run after upgrading: build the catalog from existing quizzes once
+        await FirestoreClient.backfill_subject_catalog()
+    # ship results journaled but not yet written before the last shutdown
+    await result_writer.start()
 
     app = ApplicationBuilder().token(settings.TELEGRAM_BOT_TOKEN).concurrent_updates(True).build()
 
@@ -36,6 +51,10 @@ async def main() -> None:
     register_quiz_play_handlers(app)
     register_leaderboard_handlers(app)
     register_group_handlers(app)
+    register_export_handlers(app)
+    register_stats_handlers(app)
+    # one CallbackQueryHandler dispatching on the callback_data prefix
+    callback_router.attach(app)
 
     # global error handler
     async def _error_handler(update, context):
@@ -46,9 +65,44 @@ async def main() -> None:
     logger.info("Starting bot")
     await app.initialize()
     await app.start()
-    await app.updater.start_polling()
-    # Run forever
-    await asyncio.Event().wait()
+    outbound.start(app.bot)
+    if settings.SESSION_STORE == 'redis':
+        asyncio.create_task(run_deadline_sweeper(settings.SESSION_SWEEP_INTERVAL, settings.SESSION_SWEEP_GRACE))
+    try:
+        if settings.WEBHOOK_URL and await _start_webhook(app):
+            return
+        await app.updater.start_polling()
+        # Run forever
+        await asyncio.Event().wait()
+    finally:
+        # results and draft edits are written behind; don't lose the buffered ones on shutdown
+        await DraftService.flush_all()
+        await result_writer.close()
+
+async def _start_webhook(app) -> bool:
+    """Serve updates through bot/server.py; returns False to fall back to polling."""
+    import uvicorn
+    from telegram import Update
+    from bot.server import app as server_app, TELEGRAM_WEBHOOK_PATH
+    from bot.services.webhook import create_ingress
+
+    # Telegram echoes the secret in a header on every delivery; never run the endpoint without one
+    secret = settings.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    try:
+        await app.bot.set_webhook(
+            url=str(settings.WEBHOOK_URL),
+            secret_token=secret,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+        )
+    except Exception:
+        logger.exception("Could not register webhook, falling back to polling")
+        return False
+    create_ingress(app, secret)
+    logger.info("Receiving updates via webhook on %s", TELEGRAM_WEBHOOK_PATH)
+    server = uvicorn.Server(uvicorn.Config(server_app, host=settings.WEBHOOK_LISTEN, port=settings.WEBHOOK_PORT))
+    await server.serve()
+    return True
 
 if __name__ == "__main__":
     try:
@@ -1,17 +1,82 @@
-"""Small FastAPI server to receive webhooks (payments) and health-checks."""
+"""Small FastAPI server to receive webhooks (payments, Telegram updates) and health-checks."""
+import hmac
 import logging
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+from bot.config import settings
+from bot.services.firestore import FirestoreClient
 from bot.services.payment import app as payment_app
+from bot.services.results_export import FORMATS, export_chunks, export_filename
+from bot.services.stats import snapshot
+from bot.services.webhook import get_ingress
 
 logger = logging.getLogger(__name__)
 app = FastAPI()
 
 app.mount('/payment', payment_app)
 
+TELEGRAM_WEBHOOK_PATH = (urlparse(str(settings.WEBHOOK_URL)).path if settings.WEBHOOK_URL else '') or '/telegram/webhook'
+
 @app.get('/health')
 async def health():
     return {"status":"ok"}
 
+@app.post(TELEGRAM_WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    ingress = get_ingress()
+    if ingress is None or not ingress.attached:
+        # server running without the bot (e.g. payments only)
+        return Response(status_code=503)
+    if not ingress.verify(request.headers.get('X-Telegram-Bot-Api-Secret-Token')):
+        return Response(status_code=403)
+    try:
+        accepted = await ingress.submit(await request.json())
+    except ValueError:
+        # malformed JSON or not an update; a retry wouldn't help
+        return Response(status_code=400)
+    if not accepted:
+        # buffer full: Telegram retries non-2xx deliveries later
+        return Response(status_code=503)
+    return Response(status_code=200)
+
+def _admin_denied(request: Request) -> Optional[Response]:
+    """The error response for a request without the admin bearer token, None if it has it."""
+    if not settings.ADMIN_API_TOKEN:
+        return Response(status_code=404)
+    expected = f"Bearer {settings.ADMIN_API_TOKEN}".encode()
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+        return Response(status_code=401)
+    return None
+
+@app.get('/metrics')
+async def metrics(request: Request):
+    """In-process metrics of the bot serving this app (the same snapshot as /stats)."""
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    return snapshot()
+
+@app.get('/admin/export/results')
+async def export_results(request: Request, start: Optional[int] = None, end: Optional[int] = None,
+                         format: str = 'csv', quiz_id: Optional[str] = None, gzip: bool = True):
+    """Results between `start` and `end` (epoch seconds, default the last 7 days), streamed in chunks."""
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    if format not in FORMATS:
+        return Response(f"format must be one of {', '.join(FORMATS)}", status_code=400)
+    end = end if end is not None else int(time.time())
+    start = start if start is not None else end - 7 * 86400
+    await FirestoreClient.init()  # no-op inside the bot process
+    media_type = 'application/gzip' if gzip else ('text/csv' if format == 'csv' else 'application/x-ndjson')
+    name = export_filename(format, start, end, compress=gzip)
+    return StreamingResponse(export_chunks(start, end, format, quiz_id, compress=gzip), media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="{name}"'})
+
 if __name__ == '__main__':
     uvicorn.run(app, host='0.0.0.0', port=8000)
@@ -0,0 +1,85 @@
+"""In-memory subject catalog (subject -> quiz summaries).
+
+Mirrors the `subject_catalog` collection so the subject menu is served from memory
+instead of scanning every document in `quizzes`. FirestoreClient keeps both in sync.
+A subject's quiz map is spread over CATALOG_SHARDS documents by quiz id (see
+catalog_doc_id), so no single document hits Firestore's 1 MiB limit.
+"""
+import hashlib
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from bot.config import settings
+
+_subjects: Dict[str, Dict[str, dict]] = {}  # subject -> {quiz_id: summary}
+_sorted_subjects: Optional[List[str]] = None
+_loaded_at = 0.0
+
+
+def subject_doc_id(subject: str) -> str:
+    # subject names may contain '/' or other characters Firestore rejects in ids
+    return hashlib.sha1(subject.encode('utf-8')).hexdigest()[:20]
+
+
+def catalog_doc_id(subject: str, quiz_id: str) -> str:
+    """The catalog shard of `subject` holding `quiz_id`; shard 0 keeps the plain subject id."""
+    shard = zlib.crc32(quiz_id.encode('utf-8')) % settings.CATALOG_SHARDS
+    doc_id = subject_doc_id(subject)
+    return doc_id if shard == 0 else f'{doc_id}-{shard}'
+
+
+def quiz_summary(payload: dict) -> dict:
+    return {
+        'title': payload.get('title', ''),
+        'is_premium': bool(payload.get('is_premium', False)),
+    }
+
+
+class SubjectCatalog:
+    @staticmethod
+    def add(subject: str, quiz_id: str, summary: dict):
+        global _sorted_subjects
+        quizzes = _subjects.get(subject)
+        if quizzes is None:
+            quizzes = _subjects[subject] = {}
+            _sorted_subjects = None
+        quizzes[quiz_id] = summary
+
+    @staticmethod
+    def remove(subject: str, quiz_id: str):
+        global _sorted_subjects
+        quizzes = _subjects.get(subject)
+        if quizzes is not None and quizzes.pop(quiz_id, None) is not None and not quizzes:
+            _sorted_subjects = None
+
+    @staticmethod
+    def replace(subjects: Dict[str, Dict[str, dict]]):
+        """Swap in a freshly loaded catalog."""
+        global _subjects, _sorted_subjects, _loaded_at
+        _subjects = subjects
+        _sorted_subjects = None
+        _loaded_at = time.time()
+
+    @staticmethod
+    def subjects() -> List[str]:
+        global _sorted_subjects
+        if _sorted_subjects is None:
+            _sorted_subjects = sorted(s for s, quizzes in _subjects.items() if quizzes)
+        return _sorted_subjects
+
+    @staticmethod
+    def quiz_count(subject: str) -> int:
+        return len(_subjects.get(subject, ()))
+
+    @staticmethod
+    def quizzes(subject: str) -> List[dict]:
+        return [summary | {'id': quiz_id} for quiz_id, summary in _subjects.get(subject, {}).items()]
+
+    @staticmethod
+    def is_empty() -> bool:
+        return not _subjects
+
+    @staticmethod
+    def is_stale(max_age: float) -> bool:
+        return time.time() - _loaded_at > max_age
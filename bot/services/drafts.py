@@ -1,32 +1,310 @@
-"""Service to manage in-progress quiz drafts for admins."""
+"""Service to manage in-progress quiz drafts for admins.
+
+Drafts live in an in-memory workspace per admin: builder commands change it and
+return without touching Firestore. Each change is remembered as a field path
+(`title`, `questions.3.options`, ...) and the pending paths are written as one
+field-level update DRAFT_FLUSH_DELAY seconds after the first unsaved change, so a
+burst of commands costs one small write instead of a get + full set each.
+`flush()` writes immediately; /publish_quiz calls it first.
+
+In the `quiz_drafts` document questions are a map keyed by index ("0", "1", ...)
+so a single question can be updated by path; drafts saved as an array by older
+versions are converted on load and rewritten whole on their next flush.
+
+The workspace is per process, so with several workers an admin's commands may
+land on different copies. Every save bumps the document's `rev` in a transaction:
+a workspace whose `rev` is behind re-reads the stored draft, re-applies its own
+pending paths on top and writes the result, instead of overwriting what another
+worker saved. `flush()` also picks up such changes when nothing is pending.
+"""
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import copy
 import logging
+from typing import List, Optional, Set
 
+from bot.config import settings
 from bot.services.firestore import FirestoreClient
+from bot.services.timers import timer_wheel
 
 logger = logging.getLogger(__name__)
 
+COLLECTION = 'quiz_drafts'
+NEW_DRAFT = {'title': '', 'subject': '', 'time_per_question': 15, 'is_premium': False}
+
+_drafts = {}  # admin_id -> _Draft (None once we know the admin has no draft)
+_locks = {}  # admin_id -> asyncio.Lock serialising loads and flushes
+
+
+def _mark(paths: Set[str], path: str):
+    """Add `path` to the pending `paths`; a path under a pending one is covered by it."""
+    if any(path == p or path.startswith(p + '.') for p in paths):
+        return
+    # Firestore rejects an update naming both a path and one beneath it
+    paths.difference_update([p for p in paths if p.startswith(path + '.')])
+    paths.add(path)
+
+
+def _path_order(path: str):
+    # questions in index order, so appended ones keep their relative order
+    name, *rest = path.split('.')
+    return (name, int(rest[0]) if rest else -1, path)
+
+
+class _Draft:
+    __slots__ = ('admin_id', 'fields', 'questions', 'rev', 'dirty', 'replace', 'flush')
+
+    def __init__(self, admin_id: int, fields: dict, questions: List[dict], rev: int = 0, replace: bool = False):
+        self.admin_id = admin_id
+        self.fields = fields
+        self.questions = questions
+        self.rev = rev  # the stored `rev` this workspace is based on
+        self.dirty: Set[str] = set()  # field paths changed since the last save
+        self.replace = replace  # the stored document is to be replaced by this one as a whole
+        self.flush = None  # TimerHandle of the pending flush
+
+    @classmethod
+    def from_doc(cls, admin_id: int, doc: dict) -> '_Draft':
+        doc = dict(doc)
+        rev = doc.pop('rev', 0)
+        stored = doc.pop('questions', None) or {}
+        if isinstance(stored, list):
+            return cls(admin_id, doc, stored, rev)
+        return cls(admin_id, doc, [stored[k] for k in sorted(stored, key=int)], rev)
+
+    def copy(self) -> '_Draft':
+        return _Draft(self.admin_id, copy.deepcopy(self.fields), copy.deepcopy(self.questions), self.rev)
+
+    def value(self, path: str):
+        name, *rest = path.split('.')
+        if name != 'questions':
+            return self.fields.get(name)
+        if not rest:
+            return self.document()['questions']
+        question = self.questions[int(rest[0])]
+        return question if len(rest) == 1 else question.get(rest[1])
+
+    def apply(self, other: '_Draft', paths: Set[str]) -> Set[str]:
+        """Copy the values at `paths` from `other` into this draft; returns where they landed.
+
+        A question `other` added (a whole-question path) whose index holds a different
+        question here was added concurrently through another worker: it is appended
+        instead of replacing that one.
+        """
+        landed = set()
+        for path in sorted(paths, key=_path_order):
+            name, *rest = path.split('.')
+            if name != 'questions':
+                self.fields[name] = other.fields.get(name)
+            elif not rest:
+                self.questions = copy.deepcopy(other.questions)
+            elif len(rest) == 1:
+                idx = int(rest[0])
+                question = other.questions[idx]
+                if idx < len(self.questions) and self.questions[idx] == question:
+                    continue  # already saved
+                self.questions.append(copy.deepcopy(question))
+                path = f'questions.{len(self.questions) - 1}'
+            elif int(rest[0]) < len(self.questions):
+                idx = int(rest[0])
+                self.questions[idx][rest[1]] = copy.deepcopy(other.questions[idx].get(rest[1]))
+            else:
+                continue  # the question is gone from this draft
+            landed.add(path)
+        return landed
+
+    def rebase(self, saved: '_Draft'):
+        """Take over the draft as saved, keeping changes made while it was being saved."""
+        if not self.replace:
+            self.dirty = saved.apply(self, self.dirty)
+            self.fields, self.questions = saved.fields, saved.questions
+        self.rev = saved.rev
+
+    def document(self) -> dict:
+        return {**self.fields, 'questions': {str(i): q for i, q in enumerate(self.questions)}}
+
+    def view(self) -> dict:
+        return {**self.fields, 'questions': self.questions}
+
+
+def _save(txn, db, admin_id: int, local: Optional[_Draft], paths: Set[str], replace: bool) -> Optional[_Draft]:
+    """Transaction body of flush(): the draft as stored afterwards, None if there is none."""
+    ref = db.collection(COLLECTION).document(str(admin_id))
+    snap = ref.get(transaction=txn)
+    stored = snap.to_dict() if snap.exists else None
+    rev = (stored or {}).get('rev', 0)
+    if replace:
+        result = local.copy()
+    else:
+        if stored is None and not paths:
+            return None
+        result = _Draft.from_doc(admin_id, stored) if stored is not None else _Draft(admin_id, dict(NEW_DRAFT), [])
+        if not paths:
+            return result  # nothing to save, but another worker's changes are picked up
+        in_place = stored is not None and rev == local.rev and not isinstance(stored.get('questions'), list)
+        result.apply(local, paths)
+        if in_place:
+            # nobody saved since this workspace was loaded: write only the changed paths
+            txn.update(ref, {**{p: local.value(p) for p in paths}, 'rev': rev + 1})
+            result.rev = rev + 1
+            return result
+    result.rev = rev + 1
+    txn.set(ref, {**result.document(), 'rev': result.rev})
+    return result
+
+
+def _lock(admin_id: int) -> asyncio.Lock:
+    return _locks.setdefault(admin_id, asyncio.Lock())
+
+
+async def _load(admin_id: int) -> Optional[_Draft]:
+    if admin_id in _drafts:
+        return _drafts[admin_id]
+    async with _lock(admin_id):
+        if admin_id not in _drafts:
+            doc = await FirestoreClient.get_doc(COLLECTION, str(admin_id))
+            _drafts[admin_id] = _Draft.from_doc(admin_id, doc) if doc else None
+    return _drafts[admin_id]
+
+
+async def _workspace(admin_id: int) -> _Draft:
+    """The admin's draft, starting an empty one if there is none."""
+    draft = await _load(admin_id)
+    if draft is None:
+        # not `replace`: should another worker have started a draft meanwhile, the save merges into it
+        draft = _drafts[admin_id] = _Draft(admin_id, dict(NEW_DRAFT), [])
+    return draft
+
+
+def _changed(draft: _Draft, path: Optional[str] = None):
+    if path is not None and not draft.replace:
+        _mark(draft.dirty, path)
+    if draft.flush is None:
+        async def _fire():
+            draft.flush = None
+            try:
+                await DraftService.flush(draft.admin_id)
+            except Exception:
+                logger.warning("Saving draft of admin %s failed, will retry", draft.admin_id, exc_info=True)
+                _changed(draft)
+        draft.flush = timer_wheel.schedule(settings.DRAFT_FLUSH_DELAY, _fire)
+
+
 class DraftService:
-    collection = 'quiz_drafts'
+    collection = COLLECTION
+
+    @staticmethod
+    async def create_draft(admin_id: int, payload: Optional[dict] = None) -> dict:
+        """Start a fresh draft, replacing any existing one."""
+        await _load(admin_id)
+        old = _drafts.get(admin_id)
+        if old is not None and old.flush:
+            old.flush.cancel()
+        payload = {**NEW_DRAFT, **(payload or {})}
+        questions = payload.pop('questions', None) or []
+        draft = _drafts[admin_id] = _Draft(admin_id, payload, list(questions), replace=True)
+        _changed(draft)
+        return draft.view()
+
+    @staticmethod
+    async def create_or_update_draft(admin_id: int, payload: dict) -> dict:
+        draft = await _workspace(admin_id)
+        for field, value in payload.items():
+            if field == 'questions':
+                draft.questions = list(value)
+                _changed(draft, 'questions')
+            else:
+                draft.fields[field] = value
+                _changed(draft, field)
+        return draft.view()
+
+    @staticmethod
+    async def set_field(admin_id: int, field: str, value) -> dict:
+        draft = await _workspace(admin_id)
+        draft.fields[field] = value
+        _changed(draft, field)
+        return draft.view()
 
     @staticmethod
-    async def create_or_update_draft(admin_id: int, payload: dict):
-        # Store drafts under doc id = admin_id
-        doc_id = str(admin_id)
-        client = FirestoreClient
-        # read existing doc and merge
-        existing = await client.get_doc('quiz_drafts', doc_id)
-        merged = {**(existing or {}), **payload}
-        await client.set_doc('quiz_drafts', doc_id, merged)
-        return merged
+    async def add_question(admin_id: int, question_text: str) -> int:
+        """Append an empty question; returns its index."""
+        draft = await _workspace(admin_id)
+        q = {'question_text': question_text, 'options': [], 'correct_index': None}
+        draft.questions.append(q)
+        idx = len(draft.questions) - 1
+        _changed(draft, f'questions.{idx}')
+        return idx
 
     @staticmethod
-    async def get_draft(admin_id: int):
-        doc_id = str(admin_id)
-        return await FirestoreClient.get_doc('quiz_drafts', doc_id)
+    async def set_question_field(admin_id: int, question_index: int, field: str, value) -> bool:
+        """False when the draft has no question `question_index`."""
+        draft = await _workspace(admin_id)
+        if question_index < 0 or question_index >= len(draft.questions):
+            return False
+        draft.questions[question_index][field] = value
+        _changed(draft, f'questions.{question_index}.{field}')
+        return True
+
+    @staticmethod
+    async def get_draft(admin_id: int) -> Optional[dict]:
+        draft = await _load(admin_id)
+        return draft.view() if draft is not None else None
+
+    @staticmethod
+    async def flush(admin_id: int):
+        """Write the admin's unsaved changes now, picking up changes other workers saved."""
+        async with _lock(admin_id):
+            draft = _drafts.get(admin_id)
+            if draft is not None and draft.flush:
+                draft.flush.cancel()
+                draft.flush = None
+            paths, replace = (draft.dirty, draft.replace) if draft is not None else (set(), False)
+            # copied because commands keep editing the draft while the transaction runs in a thread
+            local = draft.copy() if draft is not None else None
+            if draft is not None:
+                draft.dirty, draft.replace = set(), False
+            try:
+                saved = await FirestoreClient.run_transaction(
+                    lambda txn, db: _save(txn, db, admin_id, local, paths, replace), op='save_draft')
+            except Exception:
+                if draft is not None:
+                    for path in paths:
+                        _mark(draft.dirty, path)
+                    draft.replace = draft.replace or replace
+                raise
+            if draft is None:
+                if _drafts.get(admin_id) is None:
+                    _drafts[admin_id] = saved  # None, or a draft started through another worker
+                return
+            if _drafts.get(admin_id) is not draft:
+                return  # replaced by create_draft meanwhile
+            if saved is not None:
+                draft.rebase(saved)
+            elif not draft.dirty and not draft.replace:
+                _drafts[admin_id] = None  # published or deleted through another worker
+
+    @staticmethod
+    async def flush_all() -> int:
+        """Write every draft with unsaved changes (on shutdown); returns how many failed."""
+        admin_ids = [a for a, d in _drafts.items() if d is not None and (d.replace or d.dirty)]
+        results = await asyncio.gather(*(DraftService.flush(a) for a in admin_ids), return_exceptions=True)
+        failed = [a for a, r in zip(admin_ids, results) if isinstance(r, Exception)]
+        if failed:
+            logger.error("Could not save the drafts of admins %s", failed)
+        return len(failed)
 
     @staticmethod
     async def delete_draft(admin_id: int):
-        doc_id = str(admin_id)
-        return await FirestoreClient.delete_doc('quiz_drafts', doc_id)
+        async with _lock(admin_id):
+            draft = _drafts.get(admin_id)
+            if draft is not None and draft.flush:
+                draft.flush.cancel()
+            _drafts[admin_id] = None
+            return await FirestoreClient.delete_doc(COLLECTION, str(admin_id))
+
+    @staticmethod
+    def stats() -> dict:
+        drafts = [d for d in _drafts.values() if d is not None]
+        return {
+            'drafts': len(drafts),
+            'unsaved': sum(1 for d in drafts if d.replace or d.dirty),
+        }
@@ -7,6 +7,7 @@ Schema outline (Firestore):
     - subject
     - time_per_question
     - is_premium
+    - updated_at (version, set on every write)
     - questions: array of {question_text, options: [A,B,C,D], correct_index}
 - results (collection)
   - {result_id}
@@ -15,21 +16,169 @@ Schema outline (Firestore):
     - score
     - timestamp
     - time_taken
-- leaderboard (collection) derived by queries
+- quiz_drafts (collection) maintained by services/drafts.DraftService
+  - {admin_id}: title, subject, time_per_question, is_premium,
+    questions: map of index ("0", "1", ...) -> {question_text, options, correct_index}
+- subject_catalog (collection) maintained by create_quiz
+  - {sha1(subject)[:20]}
+    - subject
+    - quizzes: map of quiz_id -> {title, is_premium}; its size is the subject's quiz count
+- leaderboards (collection) rollups maintained by apply_rollups, sharded by user id
+  - {daily_YYYY-MM-DD | weekly_YYYY-Www | quiz_<quiz_id>}[-<shard>]
+    - entries: map of user_id -> rank (see services/leaderboards.encode_rank)
+- result_buckets_hourly / result_buckets_daily (collections) maintained by apply_rollups
+  - {YYYYMMDDHH | YYYYMMDD}[-<shard>]
+    - start: bucket start (epoch)
+    - users: map of user_id -> rank
+The per-user maps are exempt from indexing (see bot/firestore.indexes.json).
 """
 import asyncio
 import json
 import logging
+import time
 from concurrent.futures import ThreadPoolExecutor
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+from bot.config import settings
+from bot.services.catalog import SubjectCatalog, catalog_doc_id, quiz_summary
+from bot.services.leaderboards import Leaderboard, LeaderboardStore, board_keys, encode_rank
+from bot.services import rollups
+from bot.utils.cache import AsyncLRUCache
+from bot.utils.metrics import Histogram
+
 logger = logging.getLogger(__name__)
 
-_executor = ThreadPoolExecutor(max_workers=5)
+# The sync SDK multiplexes calls over one gRPC channel, so the pool only bounds
+# how many calls are in flight; size it for the expected concurrency.
+_executor = ThreadPoolExecutor(max_workers=settings.FIRESTORE_MAX_WORKERS, thread_name_prefix='firestore')
 _db = None
+_catalog_refresh = None  # background refresh task, if one is running
+
+# Published quizzes only change when create_quiz(zes) rewrites them, which invalidates.
+_quiz_cache = AsyncLRUCache(
+    max_entries=settings.QUIZ_CACHE_MAX_ENTRIES,
+    ttl=settings.QUIZ_CACHE_TTL,
+    max_weight=settings.QUIZ_CACHE_MAX_QUESTIONS,
+    weigher=lambda quiz: max(1, len(quiz.get('questions') or [])),
+)
+
+# value transforms for set_doc/update_doc, so callers don't import the SDK
+Increment = firestore.Increment
+ArrayUnion = firestore.ArrayUnion
+ArrayRemove = firestore.ArrayRemove
+DELETE_FIELD = firestore.DELETE_FIELD
+SERVER_TIMESTAMP = firestore.SERVER_TIMESTAMP
+
+_DEFAULT_TIMEOUT = object()
+_op_latency = {}  # op name -> Histogram of time spent in the SDK call
+_queue_wait = Histogram()  # time between submission and a pool thread picking the call up
+# in_flight: calls submitted to the pool and not finished yet, including ones whose caller timed out.
+# Finished calls are counted once, as completed, errors or cancelled (timed out before a thread
+# picked them up); timeouts counts callers that stopped waiting, whatever the call did afterwards.
+_pool = {'in_flight': 0, 'completed': 0, 'errors': 0, 'cancelled': 0, 'timeouts': 0}
+
+
+async def _run(op: str, fn, timeout=_DEFAULT_TIMEOUT):
+    """Run a blocking SDK call on the pool with a deadline, recording queue wait and latency.
+
+    On timeout the caller gets asyncio.TimeoutError; the SDK call itself finishes in
+    its thread, since a running thread can't be interrupted, and stays in_flight until it does.
+    """
+    if timeout is _DEFAULT_TIMEOUT:
+        timeout = settings.FIRESTORE_TIMEOUT
+    loop = asyncio.get_running_loop()
+    submitted = time.monotonic()
+    marks = []  # [started, finished], filled in by the pool thread
+
+    def _timed():
+        marks.append(time.monotonic())
+        try:
+            return fn()
+        finally:
+            marks.append(time.monotonic())
+
+    def _finished(future):
+        # metrics are only touched from the event loop thread
+        _pool['in_flight'] -= 1
+        if future.cancelled():
+            _pool['cancelled'] += 1
+        elif future.exception() is not None:
+            _pool['errors'] += 1
+        else:
+            _pool['completed'] += 1
+        if marks:
+            _queue_wait.observe(marks[0] - submitted)
+        if len(marks) == 2:
+            _op_latency.setdefault(op, Histogram()).observe(marks[1] - marks[0])
+
+    def _done(future):
+        # runs in the pool thread (or here, if cancelled before starting)
+        try:
+            loop.call_soon_threadsafe(_finished, future)
+        except RuntimeError:
+            pass  # loop already closed at shutdown
+
+    future = _executor.submit(_timed)
+    _pool['in_flight'] += 1
+    future.add_done_callback(_done)
+    try:
+        # cancelling the wrapper on timeout only cancels calls still waiting for a thread
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except asyncio.TimeoutError:
+        _pool['timeouts'] += 1
+        logger.warning("Firestore %s exceeded its %ss deadline", op, timeout)
+        raise
+
+
+def _invalidate_quiz(quiz_id: str):
+    """Forget cached copies of a quiz that is being (re)written."""
+    from bot.services.render_cache import RenderCache  # imports this module
+    _quiz_cache.invalidate(quiz_id)
+    RenderCache.invalidate(quiz_id)
+
+
+MAX_BATCH_WRITES = 500  # Firestore's limit per WriteBatch
+
+
+def _rollup_targets(payload: dict) -> List[Tuple[str, str, str, dict]]:
+    """[(collection, doc_id, field, extra_fields)] a result is folded into; empty without a user."""
+    user_id = payload.get('user_id')
+    if user_id is None:
+        return []
+    ts = payload.get('timestamp') or int(time.time())
+    targets = [('leaderboards', rollups.shard_doc_id(key, user_id), 'entries', {})
+               for key in board_keys(payload.get('quiz_id'), ts)]
+    targets += [(collection, rollups.shard_doc_id(doc_id, user_id), 'users', {'start': start})
+                for collection, doc_id, start in rollups.bucket_refs(ts)]
+    return targets
+
+
+def _write_rollups(pending: dict) -> int:
+    """Commit `{(collection, doc_id): (field, extra_fields, {uid: rank})}` as Maximum merges.
+
+    Runs on a pool thread. Returns the number of document writes.
+    """
+    batch = _db.batch()
+    writes = total = 0
+    for (collection, doc_id), (field, extra, users) in pending.items():
+        items = list(users.items())
+        # Firestore allows at most 500 field transforms per document write
+        for i in range(0, len(items), 500):
+            chunk = {uid: firestore.Maximum(rank) for uid, rank in items[i:i + 500]}
+            batch.set(_db.collection(collection).document(doc_id), {**extra, field: chunk}, merge=True)
+            writes += 1
+            total += 1
+            if writes == MAX_BATCH_WRITES:
+                batch.commit()
+                batch = _db.batch()
+                writes = 0
+    if writes:
+        batch.commit()
+    return total
+
 
 class FirestoreClient:
     @classmethod
@@ -40,7 +189,6 @@ class FirestoreClient:
         # Initialize SDK in thread pool to avoid blocking
         def _init():
             cred_path = None
-            from bot.config import settings
             if settings.FIREBASE_CREDENTIALS_JSON:
                 cred_path = settings.FIREBASE_CREDENTIALS_JSON
             if cred_path:
@@ -53,71 +201,402 @@ class FirestoreClient:
                 firebase_admin.initialize_app()
             return firestore.client()
 
-        _db = await asyncio.get_event_loop().run_in_executor(_executor, _init)
+        _db = await _run('init', _init, timeout=None)
         logger.info("Firestore initialized")
 
     @staticmethod
     async def create_quiz(quiz_id: str, payload: dict):
+        """Write the quiz and its catalog entry; stamps payload['updated_at'], the quiz's version."""
+        payload['updated_at'] = time.time()
+        summary = quiz_summary(payload)
+        subject = payload.get('subject')
+
         def _task():
-            doc_ref = _db.collection('quizzes').document(quiz_id)
-            doc_ref.set(payload)
+            # quiz and its catalog entry are written atomically
+            batch = _db.batch()
+            batch.set(_db.collection('quizzes').document(quiz_id), payload)
+            if subject:
+                # no stored count: an Increment would count a rewritten quiz twice
+                batch.set(_db.collection('subject_catalog').document(catalog_doc_id(subject, quiz_id)), {
+                    'subject': subject,
+                    'quizzes': {quiz_id: summary},
+                }, merge=True)
+            batch.commit()
             return True
-        return await asyncio.get_event_loop().run_in_executor(_executor, _task)
+        try:
+            result = await _run('create_quiz', _task)
+        finally:
+            _invalidate_quiz(quiz_id)
+        if subject:
+            SubjectCatalog.add(subject, quiz_id, summary)
+        return result
+
+    @staticmethod
+    async def create_quizzes(items: List[Tuple[str, dict]]):
+        """create_quiz for many `(quiz_id, payload)` pairs, in WriteBatches of at most 500 writes.
+
+        Catalog entries of quizzes sharing a catalog shard within a batch are combined into
+        one write, and each batch commits its quizzes and their catalog entries atomically.
+        """
+        updated_at = time.time()
+        for _, payload in items:
+            payload['updated_at'] = updated_at
+
+        def _task():
+            batch = _db.batch()
+            writes = 0
+            pending = {}  # catalog doc id -> (subject, {quiz_id: summary})
+
+            def _commit():
+                nonlocal batch, writes
+                for doc_id, (subject, quizzes) in pending.items():
+                    batch.set(_db.collection('subject_catalog').document(doc_id), {
+                        'subject': subject,
+                        'quizzes': quizzes,
+                    }, merge=True)
+                batch.commit()
+                batch = _db.batch()
+                writes = 0
+                pending.clear()
+
+            for quiz_id, payload in items:
+                subject = payload.get('subject')
+                doc_id = catalog_doc_id(subject, quiz_id) if subject else None
+                new_doc = 1 if doc_id and doc_id not in pending else 0
+                if writes and writes + 1 + new_doc > MAX_BATCH_WRITES:
+                    _commit()
+                    new_doc = 1 if doc_id else 0
+                batch.set(_db.collection('quizzes').document(quiz_id), payload)
+                writes += 1 + new_doc
+                if doc_id:
+                    pending.setdefault(doc_id, (subject, {}))[1][quiz_id] = quiz_summary(payload)
+            if writes:
+                _commit()
+            return len(items)
+        try:
+            result = await _run('create_quizzes', _task, timeout=None)
+        finally:
+            for quiz_id, _ in items:
+                _invalidate_quiz(quiz_id)
+        for quiz_id, payload in items:
+            if payload.get('subject'):
+                SubjectCatalog.add(payload['subject'], quiz_id, quiz_summary(payload))
+        return result
+
+    @staticmethod
+    async def delete_quiz(quiz_id: str) -> bool:
+        """Delete a quiz and its catalog entry; False if there was no such quiz."""
+        def _task():
+            ref = _db.collection('quizzes').document(quiz_id)
+            doc = ref.get(field_paths=['subject'])
+            if not doc.exists:
+                return False, None
+            subject = (doc.to_dict() or {}).get('subject')
+            batch = _db.batch()
+            batch.delete(ref)
+            if subject:
+                batch.set(_db.collection('subject_catalog').document(catalog_doc_id(subject, quiz_id)),
+                          {'quizzes': {quiz_id: DELETE_FIELD}}, merge=True)
+            batch.commit()
+            return True, subject
+        try:
+            deleted, subject = await _run('delete_quiz', _task)
+        finally:
+            _invalidate_quiz(quiz_id)
+        if subject:
+            SubjectCatalog.remove(subject, quiz_id)
+        return deleted
 
     @staticmethod
     async def get_quiz(quiz_id: str) -> Optional[dict]:
         def _task():
             doc = _db.collection('quizzes').document(quiz_id).get()
             return doc.to_dict() if doc.exists else None
-        return await asyncio.get_event_loop().run_in_executor(_executor, _task)
+
+        async def _load():
+            return await _run('get_quiz', _task)
+        return await _quiz_cache.get_or_load(quiz_id, _load)
+
+    @staticmethod
+    def quiz_cache_stats() -> dict:
+        return _quiz_cache.stats()
+
+    @staticmethod
+    def pool_stats() -> dict:
+        return {
+            'max_workers': settings.FIRESTORE_MAX_WORKERS,
+            **_pool,
+            'queue_wait': _queue_wait.snapshot(),
+            'ops': {op: h.snapshot() for op, h in _op_latency.items()},
+        }
 
     @staticmethod
     async def list_quizzes_by_subject(subject: str):
         def _task():
             q = _db.collection('quizzes').where('subject', '==', subject).stream()
             return [doc.to_dict() | {'id': doc.id} for doc in q]
-        return await asyncio.get_event_loop().run_in_executor(_executor, _task)
+        return await _run('list_quizzes_by_subject', _task)
+
+    @staticmethod
+    async def list_quiz_page(subject: str, limit: int, start_after: Optional[str] = None):
+        """One page of `{id, title}` for a subject, ordered by document id.
+
+        Only `title` is projected, so question arrays never leave Firestore. Returns
+        `(items, next_cursor)`; `next_cursor` is None on the last page.
+        """
+        def _task():
+            col = _db.collection('quizzes')
+            doc_id = firestore.FieldPath.document_id()
+            q = col.where('subject', '==', subject).select(['title']).order_by(doc_id)
+            if start_after:
+                q = q.start_after({doc_id: col.document(start_after)})
+            # one extra document tells us whether another page exists
+            docs = list(q.limit(limit + 1).stream())
+            items = [{'id': d.id, 'title': (d.to_dict() or {}).get('title') or d.id} for d in docs[:limit]]
+            next_cursor = items[-1]['id'] if len(docs) > limit else None
+            return items, next_cursor
+        return await _run('list_quiz_page', _task)
 
     @staticmethod
     async def save_result(payload: dict):
+        """Store a result and fold it into the daily/weekly/per-quiz leaderboard rollups."""
+        result_id = _db.collection('results').document().id
+        await FirestoreClient.save_results([(result_id, payload)])
+        LeaderboardStore.record_result(payload, now=int(time.time()))
+        try:
+            await FirestoreClient.apply_rollups([payload])
+        except Exception:
+            # the result itself is stored; `python -m bot.services.rollups` repairs the rollups
+            logger.exception("Rollup update failed for result %s", result_id)
+        else:
+            LeaderboardStore.results_written()
+        return result_id
+
+    @staticmethod
+    async def save_results(items: List[Tuple[str, dict]]):
+        """Write `(result_id, payload)` pairs in WriteBatches of at most 500 writes.
+
+        Only the raw results are written; rollups go through apply_rollups in their own
+        batches, so a failing rollup write can't hold results back. Result ids come from
+        the caller, so retrying a failed call rewrites the same documents.
+        """
         def _task():
-            doc_ref = _db.collection('results').document()
-            doc_ref.set(payload)
-            return doc_ref.id
-        return await asyncio.get_event_loop().run_in_executor(_executor, _task)
+            col = _db.collection('results')
+            for i in range(0, len(items), MAX_BATCH_WRITES):
+                batch = _db.batch()
+                for result_id, payload in items[i:i + MAX_BATCH_WRITES]:
+                    batch.set(col.document(result_id), payload)
+                batch.commit()
+            return len(items)
+        return await _run('save_results', _task)
 
     @staticmethod
-    async def set_doc(collection: str, doc_id: str, payload: dict):
+    async def apply_rollups(payloads: List[dict]):
+        """Fold result payloads into the leaderboard and bucket rollups.
+
+        Updates to the same rollup shard are combined into one Maximum write, so
+        retrying (or replaying results already counted) can't change a rank twice.
+        In-memory boards are left to the caller.
+        """
+        def _task():
+            pending = {}  # (collection, doc_id) -> (field, extra_fields, {uid: rank})
+            for payload in payloads:
+                uid = str(payload.get('user_id'))
+                rank = encode_rank(payload.get('score', 0), payload.get('time_taken'))
+                for collection, doc_id, field, extra in _rollup_targets(payload):
+                    users = pending.setdefault((collection, doc_id), (field, extra, {}))[2]
+                    if users.get(uid, rank - 1) < rank:
+                        users[uid] = rank
+            return _write_rollups(pending)
+        return await _run('apply_rollups', _task)
+
+    @staticmethod
+    async def get_leaderboard(key: str, max_age: Optional[float] = None) -> Leaderboard:
+        """In-memory board for `key`, with the persisted rollup merged in at most `max_age` seconds ago.
+
+        Re-reading the rollup picks up results other processes wrote; results of this
+        process that are not written yet stay in the board, since merging keeps the best.
+        """
+        if max_age is None:
+            max_age = settings.LEADERBOARD_CACHE_TTL
+        board = LeaderboardStore.get(key)
+        if board is not None and board.loaded and time.monotonic() - board.loaded_at < max_age:
+            return board
+
         def _task():
-            _db.collection(collection).document(doc_id).set(payload)
+            col = _db.collection('leaderboards')
+            entries = {}
+            for doc in _db.get_all([col.document(d) for d in rollups.shard_doc_ids(key)], field_paths=['entries']):
+                if doc.exists:
+                    entries.update((doc.to_dict() or {}).get('entries', {}))
+            return {int(uid): int(rank) for uid, rank in entries.items()}
+        entries = await _run('get_leaderboard', _task)
+        return LeaderboardStore.load(key, entries)
+
+    @staticmethod
+    async def get_range_leaderboard(start_ts: int, end_ts: int) -> Leaderboard:
+        """Leaderboard for an arbitrary range, merged from the hourly/daily buckets covering it."""
+        refs = [(c, shard) for c, d in rollups.plan_range(start_ts, end_ts) for shard in rollups.shard_doc_ids(d)]
+
+        def _task():
+            docs = _db.get_all([_db.collection(c).document(d) for c, d in refs], field_paths=['users'])
+            return [(doc.to_dict() or {}).get('users', {}) for doc in docs if doc.exists]
+        buckets = await _run('get_range_leaderboard', _task)
+        return rollups.merge_buckets(buckets)
+
+    @staticmethod
+    async def backfill_result_rollups(flush_every: int = 5000) -> int:
+        """Rebuild bucket and leaderboard rollups from the `results` collection.
+
+        All writes are Maximum transforms, so the job is idempotent and can run while
+        new results arrive. At most `flush_every` user entries are buffered at a time.
+        """
+        def _task():
+            pending = {}  # (collection, doc_id) -> (field, extra_fields, {uid: rank})
+            buffered = 0
+
+            def _track(collection, doc_id, field, extra, uid, rank):
+                entry = pending.setdefault((collection, doc_id), (field, extra, {}))
+                users = entry[2]
+                if users.get(uid, rank - 1) < rank:
+                    users[uid] = rank
+                    return 1
+                return 0
+
+            def _flush():
+                _write_rollups(pending)
+                pending.clear()
+
+            count = 0
+            fields = ['user_id', 'quiz_id', 'score', 'time_taken', 'timestamp']
+            for d in _db.collection('results').select(fields).stream():
+                data = d.to_dict() or {}
+                if data.get('user_id') is None or not data.get('timestamp'):
+                    continue
+                count += 1
+                uid = str(data['user_id'])
+                ts = int(data['timestamp'])
+                rank = encode_rank(data.get('score', 0), data.get('time_taken'))
+                for collection, doc_id, field, extra in _rollup_targets(data):
+                    buffered += _track(collection, doc_id, field, extra, uid, rank)
+                if buffered >= flush_every:
+                    _flush()
+                    buffered = 0
+            _flush()
+            return count
+        return await _run('backfill_result_rollups', _task, timeout=None)
+
+    @staticmethod
+    async def set_doc(collection: str, doc_id: str, payload: dict, merge: bool = False,
+                      fields: Optional[List[str]] = None):
+        """Write `payload`, replacing the document unless `merge` or a `fields` mask is given.
+
+        With `merge` the payload's (nested) fields are merged into the existing document;
+        with `fields` only those field paths are written. Either way the document is
+        created if missing and transforms are allowed as values.
+        """
+        def _task():
+            _db.collection(collection).document(doc_id).set(payload, merge=fields or merge)
             return True
-        return await asyncio.get_event_loop().run_in_executor(_executor, _task)
+        return await _run('set_doc', _task)
+
+    @staticmethod
+    async def update_doc(collection: str, doc_id: str, updates: dict):
+        """Field-level update; keys are field paths ('a.b.c') and the document must exist.
+
+        Values may be transforms (Increment, ArrayUnion, ArrayRemove, DELETE_FIELD,
+        SERVER_TIMESTAMP), which Firestore applies server-side without a read.
+        """
+        def _task():
+            _db.collection(collection).document(doc_id).update(updates)
+            return True
+        return await _run('update_doc', _task)
+
+    @staticmethod
+    async def run_transaction(fn: Callable, op: str = 'transaction'):
+        """Run `fn(transaction, db)` in a Firestore transaction and return its result.
+
+        `fn` runs on the pool thread with the sync SDK and is retried on contention, so
+        it must only read through the transaction and have no other side effects.
+        """
+        def _task():
+            return firestore.transactional(lambda txn: fn(txn, _db))(_db.transaction())
+        return await _run(op, _task)
 
     @staticmethod
     async def get_doc(collection: str, doc_id: str) -> Optional[dict]:
         def _task():
             doc = _db.collection(collection).document(doc_id).get()
             return doc.to_dict() if doc.exists else None
-        return await asyncio.get_event_loop().run_in_executor(_executor, _task)
+        return await _run('get_doc', _task)
 
     @staticmethod
     async def delete_doc(collection: str, doc_id: str) -> bool:
         def _task():
             _db.collection(collection).document(doc_id).delete()
             return True
-        return await asyncio.get_event_loop().run_in_executor(_executor, _task)
+        return await _run('delete_doc', _task)
 
     @staticmethod
     async def list_subjects():
+        """Subjects served from the in-memory catalog; a stale catalog is refreshed in the background."""
+        global _catalog_refresh
+        if SubjectCatalog.is_stale(settings.CATALOG_REFRESH_SECONDS) and (_catalog_refresh is None or _catalog_refresh.done()):
+            _catalog_refresh = asyncio.create_task(FirestoreClient.refresh_subject_catalog())
+        return SubjectCatalog.subjects()
+
+    @staticmethod
+    async def refresh_subject_catalog():
+        """Reload the catalog from `subject_catalog` (one document per subject, no quiz scans)."""
+        def _task():
+            subjects = {}
+            for d in _db.collection('subject_catalog').stream():
+                data = d.to_dict() or {}
+                if data.get('subject'):
+                    # a subject's entries are spread over several shard documents
+                    subjects.setdefault(data['subject'], {}).update(data.get('quizzes') or {})
+            return subjects
+        try:
+            subjects = await _run('refresh_subject_catalog', _task)
+        except Exception:
+            logger.exception("Subject catalog refresh failed")
+            return
+        SubjectCatalog.replace(subjects)
+        logger.info("Subject catalog loaded: %d subjects", len(subjects))
+
+    @staticmethod
+    async def backfill_subject_catalog():
+        """Rebuild `subject_catalog` from a one-off projection scan of `quizzes`."""
         def _task():
-            docs = _db.collection('quizzes').select(['subject']).stream()
-            subjects = set()
-            for d in docs:
+            subjects = {}
+            for d in _db.collection('quizzes').select(['subject', 'title', 'is_premium']).stream():
                 data = d.to_dict() or {}
-                if 'subject' in data:
-                    subjects.add(data['subject'])
-            return sorted(list(subjects))
-        return await asyncio.get_event_loop().run_in_executor(_executor, _task)
+                if data.get('subject'):
+                    subjects.setdefault(data['subject'], {})[d.id] = quiz_summary(data)
+            shards = {}  # catalog doc id -> (subject, {quiz_id: summary})
+            for subject, quizzes in subjects.items():
+                for quiz_id, summary in quizzes.items():
+                    shards.setdefault(catalog_doc_id(subject, quiz_id), (subject, {}))[1][quiz_id] = summary
+            col = _db.collection('subject_catalog')
+            batch = _db.batch()
+            pending = 0
+            for doc_id, (subject, quizzes) in shards.items():
+                batch.set(col.document(doc_id), {
+                    'subject': subject,
+                    'quizzes': quizzes,
+                })
+                pending += 1
+                if pending == MAX_BATCH_WRITES:
+                    batch.commit()
+                    batch = _db.batch()
+                    pending = 0
+            if pending:
+                batch.commit()
+            return subjects
+        subjects = await _run('backfill_subject_catalog', _task, timeout=None)
+        SubjectCatalog.replace(subjects)
+        logger.info("Subject catalog backfilled: %d subjects", len(subjects))
+        return subjects
 
     @staticmethod
     async def get_results_for_timeframe(start_ts, end_ts, quiz_id: Optional[str] = None):
@@ -128,6 +607,26 @@ class FirestoreClient:
                 q = q.where('quiz_id', '==', quiz_id)
             docs = q.stream()
             return [d.to_dict() for d in docs]
-        return await asyncio.get_event_loop().run_in_executor(_executor, _task)
+        return await _run('get_results_for_timeframe', _task, timeout=None)
+
+    @staticmethod
+    async def results_page(start_ts: int, end_ts: int, quiz_id: Optional[str] = None, limit: int = 500,
+                           after: Optional[Tuple[int, str]] = None):
+        """One page of results in (timestamp, id) order as `([(result_id, payload)], cursor)`.
+
+        Pass `cursor` back as `after` for the next page; it is None after the last page.
+        Unlike get_results_for_timeframe only `limit` documents are held at a time.
+        """
+        def _task():
+            q = _db.collection('results').where('timestamp', '>=', start_ts).where('timestamp', '<=', end_ts)
+            if quiz_id:
+                q = q.where('quiz_id', '==', quiz_id)
+            q = q.order_by('timestamp').order_by(firestore.FieldPath.document_id()).limit(limit)
+            if after is not None:
+                q = q.start_after(list(after))
+            return [(d.id, d.to_dict()) for d in q.stream()]
+        rows = await _run('results_page', _task)
+        cursor = (rows[-1][1].get('timestamp'), rows[-1][0]) if len(rows) == limit else None
+        return rows, cursor
 
     # Additional methods for leaderboards and admin queries will be added as needed
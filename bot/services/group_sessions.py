@@ -1,81 +1,280 @@
 """Group quiz session manager: multiple users compete in same quiz."""
 import asyncio
 import time
-import uuid
 import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+from bot.config import settings
+from bot.services.outbound import FEEDBACK, QUESTION, outbound
+from bot.services.quiz_registry import OPTION_LABELS, QuizRegistry
+from bot.services.session_store import GROUP, GroupSession, session_store, timer_key
+from bot.services.timers import timer_wheel
 
 logger = logging.getLogger(__name__)
-_group_sessions = {}
+_timers = {}  # (session_id, question_index) -> TimerHandle owned by this process
+_tallies = {}  # session_id -> _Tally for the question currently open in this process
+_engines = {}  # session_id -> _Engine
+
+TALLY_MAX_NAMES = 30
+
+# why a question was closed
+TIMEOUT = 'timeout'
+ALL_ANSWERED = 'all_answered'
+
+
+@dataclass
+class QuestionStats:
+    index: int
+    expected: int  # participants registered before the question opened
+    answered: int
+    correct: int
+    duration: float  # seconds the question was open
+    closed_by: str
+
+
+class _Engine:
+    """Per-session coordination: answers and the close of a question never interleave."""
+    __slots__ = ('lock', 'closed', 'opened_at', 'stats')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.closed = -1  # highest question index closed by this process
+        self.opened_at = time.monotonic()
+        self.stats: List[QuestionStats] = []
+
+
+def _engine(session_id: str) -> _Engine:
+    engine = _engines.get(session_id)
+    if engine is None:
+        engine = _engines[session_id] = _Engine()
+    return engine
+
+
+def _expected(s: GroupSession, question_index: int):
+    return [uid for uid, first in s.participants.items() if first <= question_index]
+
+
+class _Tally:
+    """Live answer count shown under a group question, edited at most every `interval` seconds.
+
+    Answers only mark the tally dirty; one scheduled flush turns everything that
+    arrived since the last edit into a single edit of the question message.
+    """
+    __slots__ = ('session_id', 'question_index', 'chat_id', 'message_id', 'text', 'reply_markup',
+                 'names', 'count', 'per_option', 'dirty', 'last_edit', 'flush')
+
+    def __init__(self, session_id: str, question_index: int, chat_id: int, message_id: int, text: str,
+                 reply_markup, option_count: int):
+        self.session_id = session_id
+        self.question_index = question_index
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+        self.reply_markup = reply_markup
+        self.names: List[str] = []
+        self.count = 0
+        self.per_option = [0] * option_count
+        self.dirty = False
+        self.last_edit = 0.0
+        self.flush = None  # TimerHandle of the scheduled edit
+
+    def render(self, final: bool = False) -> str:
+        names = ', '.join(self.names)
+        if self.count > len(self.names):
+            names += f' +{self.count - len(self.names)} more'
+        lines = [self.text, '', f"Answered: {self.count}" + (f" ({names})" if names else '')]
+        if final:
+            # the distribution is only revealed once the question is closed
+            lines.append(' | '.join(f"{OPTION_LABELS[i]}: {n}" for i, n in enumerate(self.per_option)))
+        return '\n'.join(lines)
 
 class GroupSessionManager:
     @staticmethod
-    def create(chat_id: int, quiz_id: str, quiz_payload: dict, host_id: int):
-        session_id = str(uuid.uuid4())
-        s = {
-            'id': session_id,
-            'chat_id': chat_id,
-            'host_id': host_id,
-            'quiz_id': quiz_id,
-            'quiz': quiz_payload,
-            'current': 0,
-            'scores': {},  # user_id -> score
-            'answers': {},  # question_index -> {user_id: selected}
-            'started_at': time.time(),
-            'question_tasks': {},
-        }
-        _group_sessions[session_id] = s
+    async def create(chat_id: int, quiz_id: str, quiz_payload: dict, host_id: int):
+        session_id = await session_store.new_id()
+        s = GroupSession(
+            id=session_id,
+            chat_id=chat_id,
+            host_id=host_id,
+            quiz_id=quiz_id,
+            quiz=QuizRegistry.intern(quiz_id, quiz_payload),
+            started_at=time.time(),
+        )
+        await session_store.create(GROUP, s)
         return s
 
     @staticmethod
-    def get(session_id: str):
-        return _group_sessions.get(session_id)
+    async def get(session_id: str):
+        s = await session_store.get(GROUP, session_id)
+        if s is not None and s.quiz is None:
+            s.quiz = await QuizRegistry.load(s.quiz_id, s.quiz_version)
+            if s.quiz is None:
+                logger.warning("Quiz %s of group session %s was removed or rewritten", s.quiz_id, session_id)
+                return None
+        return s
 
     @staticmethod
-    def answer(session_id: str, question_index: int, user_id: int, selected: int):
-        s = _group_sessions.get(session_id)
+    async def join(session_id: str, user_id: int) -> bool:
+        """Register a player; they count towards closing questions early from the current one on."""
+        s = await GroupSessionManager.get(session_id)
         if not s:
             return False
-        if question_index != s['current']:
-            return False
-        # ensure user hasn't answered this question
-        qmap = s['answers'].setdefault(question_index, {})
-        if user_id in qmap:
-            return False
-        qmap[user_id] = selected
-        correct = s['quiz']['questions'][question_index]['correct_index']
-        if selected == correct:
-            s['scores'][user_id] = s['scores'].get(user_id, 0) + 1
+        return await session_store.add_participant(session_id, user_id, s.current)
+
+    @staticmethod
+    async def answer(session_id: str, question_index: int, user_id: int, selected: int, name: str = None):
+        async with _engine(session_id).lock:
+            s = await GroupSessionManager.get(session_id)
+            if not s:
+                # ended or unknown session (e.g. a stale button): don't keep the engine around
+                _engines.pop(session_id, None)
+                return False
+            if question_index != s.current:
+                return False
+            correct = s.quiz.questions[question_index].correct_index
+            # the store ensures the user hasn't answered this question, atomically
+            ok = await session_store.record_group_answer(session_id, question_index, user_id, selected, selected == correct)
+            if not ok:
+                return False
+            if user_id not in s.participants:
+                # players who didn't tap Join are expected from the next question on
+                await session_store.add_participant(session_id, user_id, question_index + 1)
+        GroupSessionManager._note_answer(session_id, question_index, name or str(user_id), selected)
         return True
 
     @staticmethod
-    def timeout(session_id: str, question_index: int):
-        s = _group_sessions.get(session_id)
-        if not s:
+    async def close_question(session_id: str, question_index: int, reason: str) -> bool:
+        """Close the question and advance the session; exactly one caller gets True and posts the next one.
+
+        With reason=ALL_ANSWERED the question is only closed if every expected participant
+        has answered; the pending timeout is then taken away from the timer wheel.
+        """
+        engine = _engine(session_id)
+        async with engine.lock:
+            if engine.closed >= question_index:
+                return False
+            s = await GroupSessionManager.get(session_id)
+            if not s:
+                _engines.pop(session_id, None)
+                return False
+            if s.current != question_index:
+                return False
+            answers = s.answers.get(question_index, {})
+            expected = _expected(s, question_index)
+            if reason == ALL_ANSWERED:
+                if not expected or any(uid not in answers for uid in expected):
+                    return False
+                GroupSessionManager.cancel_timeout(session_id, question_index)
+                # with a shared store, a sweeper elsewhere may have claimed the deadline already
+                if not await session_store.claim_deadline(timer_key(GROUP, session_id, question_index)):
+                    return False
+            engine.closed = question_index
+            correct = s.quiz.questions[question_index].correct_index
+            engine.stats.append(QuestionStats(
+                index=question_index,
+                expected=len(expected),
+                answered=len(answers),
+                correct=sum(1 for sel in answers.values() if sel == correct),
+                duration=time.monotonic() - engine.opened_at,
+                closed_by=reason,
+            ))
+            GroupSessionManager.close_tally(session_id)
+            await session_store.advance(GROUP, session_id)
+            return True
+
+    @staticmethod
+    async def timeout(session_id: str, question_index: int) -> bool:
+        # the deadline was claimed by the caller; False if the question was already closed early
+        return await GroupSessionManager.close_question(session_id, question_index, TIMEOUT)
+
+    @staticmethod
+    async def finish(session_id: str):
+        GroupSessionManager.close_tally(session_id)
+        engine = _engines.pop(session_id, None)
+        if engine and engine.stats:
+            early = sum(1 for st in engine.stats if st.closed_by == ALL_ANSWERED)
+            logger.info("Group session %s: %d questions, %d closed early, %.1fs total",
+                        session_id, len(engine.stats), early, sum(st.duration for st in engine.stats))
+        return await session_store.delete(GROUP, session_id)
+
+    @staticmethod
+    def question_stats(session_id: str) -> List[QuestionStats]:
+        engine = _engines.get(session_id)
+        return list(engine.stats) if engine else []
+
+    @staticmethod
+    def open_tally(session_id: str, question_index: int, chat_id: int, message_id: int, text: str,
+                   reply_markup, option_count: int):
+        """Start the live tally for a question that was just posted as `message_id`."""
+        old = _tallies.pop(session_id, None)
+        if old and old.flush:
+            old.flush.cancel()
+        _tallies[session_id] = _Tally(session_id, question_index, chat_id, message_id, text, reply_markup, option_count)
+
+    @staticmethod
+    def _note_answer(session_id: str, question_index: int, name: str, selected: int):
+        tally = _tallies.get(session_id)
+        if tally is None or tally.question_index != question_index:
             return
-        # finalize question and move on
+        tally.count += 1
+        if len(tally.names) < TALLY_MAX_NAMES:
+            tally.names.append(name)
+        if 0 <= selected < len(tally.per_option):
+            tally.per_option[selected] += 1
+        tally.dirty = True
+        if tally.flush is None:
+            GroupSessionManager._schedule_tally(
+                tally, max(0.0, tally.last_edit + settings.GROUP_TALLY_INTERVAL - time.monotonic()))
 
     @staticmethod
-    def next(session_id: str):
-        s = _group_sessions.get(session_id)
-        if not s:
-            return None
-        s['current'] += 1
-        return s['current']
+    def _schedule_tally(tally: _Tally, delay: float):
+        async def _flush():
+            tally.flush = None
+            GroupSessionManager._edit_tally(tally)
+        tally.flush = timer_wheel.schedule(delay, _flush)
+
+    @staticmethod
+    def _edit_tally(tally: _Tally, final: bool = False):
+        if not tally.dirty and not final:
+            return  # nobody answered since the last edit
+        if not final and outbound.has_queued(tally.chat_id, QUESTION):
+            # the group's budget (20 messages/min) goes to quiz messages first
+            GroupSessionManager._schedule_tally(tally, settings.GROUP_TALLY_INTERVAL)
+            return
+        tally.dirty = False
+        tally.last_edit = time.monotonic()
+        outbound.edit_message_text(tally.chat_id, tally.message_id, tally.render(final),
+                                   reply_markup=None if final else tally.reply_markup, priority=FEEDBACK)
 
     @staticmethod
-    def finish(session_id: str):
-        return _group_sessions.pop(session_id, None)
+    def close_tally(session_id: str) -> Optional[_Tally]:
+        """Stop live updates and show the final counts (the question's buttons are removed)."""
+        tally = _tallies.pop(session_id, None)
+        if tally is None:
+            return None
+        if tally.flush:
+            tally.flush.cancel()
+            tally.flush = None
+        GroupSessionManager._edit_tally(tally, final=True)
+        return tally
 
     @staticmethod
-    def schedule_timeout(session_id: str, question_index: int, seconds: int, coro):
-        async def _worker():
-            try:
-                await asyncio.sleep(seconds)
+    async def schedule_timeout(session_id: str, question_index: int, seconds: int, coro):
+        _engine(session_id).opened_at = time.monotonic()
+        key = timer_key(GROUP, session_id, question_index)
+        await session_store.set_deadline(key, time.time() + seconds)
+
+        async def _fire():
+            _timers.pop((session_id, question_index), None)
+            if await session_store.claim_deadline(key):
                 await coro()
-            except asyncio.CancelledError:
-                return
-        task = asyncio.create_task(_worker())
-        s = _group_sessions.get(session_id)
-        if s:
-            s['question_tasks'][question_index] = task
-        return task
+        handle = timer_wheel.schedule(seconds, _fire)
+        _timers[(session_id, question_index)] = handle
+        return handle
+
+    @staticmethod
+    def cancel_timeout(session_id: str, question_index: int):
+        handle = _timers.pop((session_id, question_index), None)
+        if handle and not handle.done():
+            handle.cancel()
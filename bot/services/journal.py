@@ -0,0 +1,192 @@
+"""Segmented append-only journal on local disk.
+
+Records are JSON documents framed as `length (u32) | crc32 (u32) | body` and
+appended to numbered segment files (`00000000000000000001.log`, ...). An append
+returns once the record is fsynced; appends arriving within `fsync_interval` of
+each other share one fsync (group commit), so the cost per record stays close to
+a buffered write. `append_many` writes a batch with a single write and fsync.
+
+A position is `(segment, offset)` just past a record. Consumers ship records
+elsewhere and then `checkpoint()` the position they have durably handled; whole
+segments before the checkpoint are deleted. `replay()` reads everything after the
+checkpoint through mmap and stops at the first torn or corrupt frame, which is
+where a crash mid-append leaves the tail. Each process start writes to a new
+segment, so a torn tail is never appended to.
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Position = Tuple[int, int]  # (segment number, offset just past the record)
+
+_FRAME = struct.Struct('>II')
+_SUFFIX = '.log'
+_CHECKPOINT = 'checkpoint.json'
+
+
+class Journal:
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024, fsync_interval: float = 0.01):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self._fd: Optional[int] = None
+        self._segment = 0
+        self._offset = 0
+        self._checkpoint: Position = (0, 0)
+        self._sync_future: Optional[asyncio.Future] = None
+        self.appended = 0
+        self.fsyncs = 0
+
+    # lifecycle
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._checkpoint = self._read_checkpoint()
+        segments = self._segments()
+        self._roll(max(segments[-1] if segments else 0, self._checkpoint[0]) + 1)
+
+    def close(self):
+        if self._fd is not None:
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def position(self) -> Position:
+        """Position just past the last record written."""
+        return self._segment, self._offset
+
+    @property
+    def checkpointed(self) -> Position:
+        return self._checkpoint
+
+    # writing
+    async def append(self, record: dict) -> Position:
+        """Append `record` and return its position once it is on disk."""
+        return (await self.append_many([record]))[0]
+
+    async def append_many(self, records: List[dict]) -> List[Position]:
+        """Append `records` with one write and one fsync; returns their positions once on disk."""
+        positions = self.write(records)
+        await self.sync()
+        return positions
+
+    def write(self, records: List[dict]) -> List[Position]:
+        """Write `records` without waiting for the fsync (call `sync()` for that); returns their positions."""
+        if self._offset >= self.segment_bytes:
+            self._roll(self._segment + 1)
+        frames = []
+        positions = []
+        for record in records:
+            body = json.dumps(record, separators=(',', ':')).encode()
+            frames.append(_FRAME.pack(len(body), zlib.crc32(body)) + body)
+            self._offset += _FRAME.size + len(body)
+            positions.append((self._segment, self._offset))
+        os.write(self._fd, b''.join(frames))
+        self.appended += len(records)
+        return positions
+
+    async def sync(self):
+        """Return once everything written so far is on disk."""
+        # group commit: every append made before the fsync starts shares it
+        if self._sync_future is None:
+            self._sync_future = asyncio.get_running_loop().create_future()
+            asyncio.create_task(self._flush(self._sync_future))
+        await asyncio.shield(self._sync_future)
+
+    async def _flush(self, fut: asyncio.Future):
+        await asyncio.sleep(self.fsync_interval)
+        self._sync_future = None
+        try:
+            if self._fd is not None:  # close() already synced everything
+                await asyncio.get_running_loop().run_in_executor(None, os.fsync, self._fd)
+            self.fsyncs += 1
+            fut.set_result(None)
+        except Exception as e:
+            fut.set_exception(e)
+
+    def _roll(self, segment: int):
+        if self._fd is not None:
+            self.close()
+        self._segment = segment
+        self._offset = 0
+        self._fd = os.open(self._path(segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    # reading
+    def replay(self) -> Iterator[Tuple[Position, dict]]:
+        """Records after the checkpoint, oldest first."""
+        return self.read_after(self._checkpoint)
+
+    def read_after(self, position: Position) -> Iterator[Tuple[Position, dict]]:
+        """Records written after `position`, oldest first."""
+        start_segment, start_offset = position
+        for segment in self._segments():
+            if segment < start_segment:
+                continue
+            yield from self._read(segment, start_offset if segment == start_segment else 0)
+
+    def _read(self, segment: int, start: int) -> Iterator[Tuple[Position, dict]]:
+        path = self._path(segment)
+        size = os.path.getsize(path)
+        if size <= start:
+            return
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            offset = start
+            while offset + _FRAME.size <= size:
+                length, crc = _FRAME.unpack_from(m, offset)
+                end = offset + _FRAME.size + length
+                body = m[offset + _FRAME.size:end]
+                if end > size or zlib.crc32(body) != crc:
+                    logger.warning("Journal segment %d: torn record at offset %d, ignoring the rest", segment, offset)
+                    return
+                yield (segment, end), json.loads(body)
+                offset = end
+
+    # checkpoints
+    async def checkpoint(self, position: Position):
+        """Mark everything up to `position` as handled and drop segments before it."""
+        if position <= self._checkpoint:
+            return
+        self._checkpoint = position
+        await asyncio.get_running_loop().run_in_executor(None, self._write_checkpoint, position)
+
+    def _write_checkpoint(self, position: Position):
+        path = os.path.join(self.directory, _CHECKPOINT)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'segment': position[0], 'offset': position[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        for segment in self._segments():
+            if segment < position[0]:
+                os.remove(self._path(segment))
+
+    def _read_checkpoint(self) -> Position:
+        try:
+            with open(os.path.join(self.directory, _CHECKPOINT)) as f:
+                data = json.load(f)
+            return int(data['segment']), int(data['offset'])
+        except FileNotFoundError:
+            return 0, 0
+
+    # helpers
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f'{segment:020d}{_SUFFIX}')
+
+    def _segments(self):
+        return sorted(int(name[:-len(_SUFFIX)]) for name in os.listdir(self.directory) if name.endswith(_SUFFIX))
+
+    def stats(self) -> dict:
+        return {
+            'segment': self._segment,
+            'checkpoint': self._checkpoint,
+            'appended': self.appended,
+            'fsyncs': self.fsyncs,
+        }
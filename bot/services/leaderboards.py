@@ -0,0 +1,169 @@
+"""Pre-aggregated leaderboards: best score (then fastest time) per user.
+
+Each board (daily, weekly, per quiz) lives in memory as a sorted list so a top-N
+read is a slice, and is persisted to the `leaderboards` collection as rollup
+documents (sharded by user, see rollups.shard_doc_id) that FirestoreClient.apply_rollups
+updates with blind `Maximum` writes.
+
+A user's best result is packed into one integer rank (higher is better) so the
+Firestore rollup needs no read-modify-write: score dominates, lower time breaks ties.
+"""
+import bisect
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from bot.config import settings
+from bot.utils.cache import SWRCache
+
+RANK_TIME_SCALE = 10 ** 6  # time_taken is clamped below this many seconds
+
+
+def encode_rank(score: int, time_taken) -> int:
+    t = min(max(int(time_taken or 0), 0), RANK_TIME_SCALE - 1)
+    return int(score) * RANK_TIME_SCALE - t
+
+
+def decode_rank(rank: int) -> Tuple[int, int]:
+    score = -(-rank // RANK_TIME_SCALE)
+    return score, score * RANK_TIME_SCALE - rank
+
+
+def daily_key(ts: int) -> str:
+    return 'daily_' + datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d')
+
+
+def weekly_key(ts: int) -> str:
+    year, week, _ = datetime.fromtimestamp(ts, timezone.utc).isocalendar()
+    return f'weekly_{year}-W{week:02d}'
+
+
+def quiz_key(quiz_id: str) -> str:
+    return f'quiz_{quiz_id}'
+
+
+def board_keys(quiz_id: Optional[str], ts: int) -> List[str]:
+    keys = [daily_key(ts), weekly_key(ts)]
+    if quiz_id:
+        keys.append(quiz_key(quiz_id))
+    return keys
+
+
+class Leaderboard:
+    """Best rank per user plus a list kept sorted by (-rank, user_id).
+
+    Finding a user's entry is an O(log n) bisect and `top(n)` a slice of the head, but
+    improving a rank inserts into (and deletes from) the list, which is O(n) element moves.
+    """
+    __slots__ = ('best', '_ranked', 'loaded', 'loaded_at')
+
+    def __init__(self):
+        self.best: Dict[int, int] = {}
+        self._ranked: List[Tuple[int, int]] = []
+        self.loaded = False  # True once the persisted rollup has been merged in
+        self.loaded_at = 0.0  # monotonic time of the last merge of the persisted rollup
+
+    def offer(self, user_id: int, rank: int) -> bool:
+        prev = self.best.get(user_id)
+        if prev is not None:
+            if prev >= rank:
+                return False
+            del self._ranked[bisect.bisect_left(self._ranked, (-prev, user_id))]
+        bisect.insort(self._ranked, (-rank, user_id))
+        self.best[user_id] = rank
+        return True
+
+    def merge(self, entries: Dict[int, int]):
+        for user_id, rank in entries.items():
+            self.offer(user_id, rank)
+
+    def top(self, n: int = 10) -> List[Tuple[int, int, int]]:
+        """[(user_id, score, time_taken), ...] best first."""
+        return [(uid, *decode_rank(-neg)) for neg, uid in self._ranked[:n]]
+
+    def __len__(self):
+        return len(self.best)
+
+
+_boards: Dict[str, Leaderboard] = {}  # daily/weekly boards; prune() drops expired periods
+# per-quiz boards, least recently used first; an evicted board is rebuilt from its rollup
+# on the next read, since a new board starts with loaded=False
+_quiz_boards: 'OrderedDict[str, Leaderboard]' = OrderedDict()
+_pruned_day: Optional[str] = None  # daily_key of the last prune
+
+
+def _board(key: str, create: bool = False) -> Optional[Leaderboard]:
+    if not key.startswith('quiz_'):
+        board = _boards.get(key)
+        if board is None and create:
+            board = _boards[key] = Leaderboard()
+        return board
+    board = _quiz_boards.get(key)
+    if board is not None:
+        _quiz_boards.move_to_end(key)
+    elif create:
+        board = _quiz_boards[key] = Leaderboard()
+        while len(_quiz_boards) > settings.LEADERBOARD_QUIZ_BOARDS:
+            _quiz_boards.popitem(last=False)
+    return board
+
+# rendered /leaderboard replies keyed by (view, period or quiz); see LeaderboardStore.cached_view
+_views = SWRCache(max_entries=256, ttl=settings.LEADERBOARD_CACHE_TTL, stale_ttl=settings.LEADERBOARD_CACHE_STALE)
+RANGE_VIEWS = ('month', 'last')  # merged from Firestore bucket rollups rather than in-memory boards
+
+
+class LeaderboardStore:
+    @staticmethod
+    def get(key: str) -> Optional[Leaderboard]:
+        return _board(key)
+
+    @staticmethod
+    def load(key: str, entries: Dict[int, int]) -> Leaderboard:
+        """Merge a persisted rollup into the in-memory board (max-merge, so order doesn't matter)."""
+        board = _board(key, create=True)
+        board.merge(entries)
+        board.loaded = True
+        board.loaded_at = time.monotonic()
+        return board
+
+    @staticmethod
+    def record(keys: Iterable[str], user_id: int, rank: int, now: Optional[int] = None):
+        for key in keys:
+            _board(key, create=True).offer(user_id, rank)
+        if now is not None and daily_key(now) != _pruned_day:
+            LeaderboardStore.prune(now)
+
+    @staticmethod
+    def record_result(payload: dict, now: Optional[int] = None):
+        """Fold a result payload into the boards it belongs to (no-op without a user)."""
+        user_id = payload.get('user_id')
+        if user_id is None:
+            return
+        keys = board_keys(payload.get('quiz_id'), payload.get('timestamp') or int(time.time()))
+        LeaderboardStore.record(keys, user_id, encode_rank(payload.get('score', 0), payload.get('time_taken')), now=now)
+        # views of the in-memory boards can refresh right away; range views wait for results_written
+        _views.mark_stale(lambda view: view[1] in keys)
+
+    @staticmethod
+    def results_written():
+        """Results reached the Firestore rollups: range views may now see them."""
+        _views.mark_stale(lambda view: view[0] in RANGE_VIEWS)
+
+    @staticmethod
+    async def cached_view(view: Tuple[str, Hashable], render: Callable[[], Awaitable[str]]) -> str:
+        """The reply for `view`, rendered at most once per TTL and served stale while re-rendering."""
+        return await _views.get_or_load(view, render)
+
+    @staticmethod
+    def view_stats() -> dict:
+        return _views.stats()
+
+    @staticmethod
+    def prune(now: int):
+        """Drop daily/weekly boards that can no longer be queried (record() calls this once a day)."""
+        global _pruned_day
+        _pruned_day = daily_key(now)
+        keep = {daily_key(now), daily_key(now - 86400), weekly_key(now), weekly_key(now - 7 * 86400)}
+        for key in [k for k in _boards if k not in keep]:
+            del _boards[key]
@@ -0,0 +1,303 @@
+"""Flood-control-aware scheduler for outgoing Bot API calls.
+
+Telegram allows roughly 30 messages/s per bot, 20/min per group and about one per
+second per private chat; going over earns 429s with a `retry_after`. Handlers hand
+their sends and edits to `outbound` instead of calling the bot directly:
+
+* each chat has its own queue; new messages go out one at a time so they stay in
+  order, while edits of existing messages may overlap with them;
+* a chat is only picked when both its bucket and the global bucket have room, and
+  among ready chats the lowest lane wins, so quiz questions go out ahead of chatter;
+* a 429 defers only the chat it hit and the call is retried in place;
+* an edit of a message that already has an edit waiting replaces it, so a burst of
+  updates to one message costs one API call; edits of one message are never in
+  flight together, so a retried older edit can't land after a newer one.
+
+Only `send_message`/`edit_message_text`/... on the bot object are used, so any object
+with those coroutine methods (e.g. a local fake Bot API) can be plugged in.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Dict, Hashable, Optional
+
+from bot.config import settings
+from bot.utils.metrics import Histogram
+from bot.utils.ratelimit import GCRALimiter
+
+logger = logging.getLogger(__name__)
+
+# priority lanes, lowest first
+QUESTION = 0  # quiz flow: questions, time-ups, final scores
+FEEDBACK = 1  # edits reacting to an answer
+NOTIFY = 2  # everything else
+
+MAX_RETRIES = 5
+_GLOBAL = 'global'
+_PRIVATE_BURST = 3.0  # seconds of private-chat budget that may be spent at once
+
+
+def _seconds(retry_after) -> float:
+    # python-telegram-bot 20.x passes an int, later versions a timedelta
+    return float(getattr(retry_after, 'total_seconds', lambda: retry_after)())
+
+
+def _consume(fut: asyncio.Future):
+    # results of fire-and-forget calls are not awaited; failures are logged by the dispatcher
+    if not fut.cancelled():
+        fut.exception()
+
+
+class _Call:
+    __slots__ = ('priority', 'seq', 'chat_id', 'method', 'kwargs', 'key', 'future', 'queued_at', 'attempts')
+
+    def __init__(self, priority: int, seq: int, chat_id: int, method: str, kwargs: dict,
+                 key: Optional[Hashable], future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.method = method
+        self.kwargs = kwargs
+        self.key = key
+        self.future = future
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+
+    def __lt__(self, other: '_Call') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundDispatcher:
+    def __init__(self, global_per_second: int = 30, group_per_minute: int = 20,
+                 private_per_second: int = 1, max_concurrency: int = 30):
+        self._global = GCRALimiter(global_per_second, 1.0)
+        self._groups = GCRALimiter(group_per_minute, 60.0)
+        self._private = GCRALimiter(max(1, int(private_per_second * _PRIVATE_BURST)), _PRIVATE_BURST)
+        self._max_concurrency = max_concurrency
+        self._queues: Dict[tuple, list] = {}  # (chat_id, ordered) lane -> heap of _Call
+        self._ready: list = []  # heap of (priority, seq, lane)
+        self._delayed: list = []  # heap of (ready_at, seq, lane)
+        self._scheduled = set()  # lanes sitting in _ready or _delayed
+        self._busy = set()  # ordered lanes with a message in flight
+        self._edits: Dict[Hashable, _Call] = {}  # coalescing key -> call not yet started
+        self._in_flight_keys = set()  # coalescing keys with a call in flight
+        self._held: Dict[Hashable, _Call] = {}  # key -> call waiting for the key's in-flight call
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._bot = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.queue_wait = Histogram()
+
+    # lifecycle
+    def start(self, bot):
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self._max_concurrency)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for queue in self._queues.values():
+            for call in queue:
+                call.future.cancel()
+        for call in self._held.values():
+            call.future.cancel()
+        self._queues.clear()
+        self._held.clear()
+        self._in_flight_keys.clear()
+        self._ready.clear()
+        self._delayed.clear()
+        self._scheduled.clear()
+        self._edits.clear()
+
+    # API used by handlers; every call returns a future resolving to the Bot API result
+    def send_message(self, chat_id: int, text: str, priority: int = NOTIFY, **kwargs) -> asyncio.Future:
+        return self.submit(chat_id, 'send_message', priority, text=text, **kwargs)
+
+    def edit_message_text(self, chat_id: int, message_id: int, text: str, priority: int = FEEDBACK,
+                          **kwargs) -> asyncio.Future:
+        return self.submit(chat_id, 'edit_message_text', priority, key=('edit', chat_id, message_id),
+                           message_id=message_id, text=text, **kwargs)
+
+    def edit_message_reply_markup(self, chat_id: int, message_id: int, reply_markup=None,
+                                  priority: int = FEEDBACK) -> asyncio.Future:
+        return self.submit(chat_id, 'edit_message_reply_markup', priority, key=('markup', chat_id, message_id),
+                           message_id=message_id, reply_markup=reply_markup)
+
+    def submit(self, chat_id: int, method: str, priority: int = NOTIFY, key: Optional[Hashable] = None,
+               **kwargs) -> asyncio.Future:
+        """Queue `bot.<method>(chat_id=chat_id, **kwargs)`; calls sharing `key` collapse into the latest."""
+        if self._task is None:
+            raise RuntimeError("Outbound dispatcher is not started")
+        kwargs['chat_id'] = chat_id
+        pending = self._edits.get(key) if key is not None else None
+        if pending is not None:
+            # newer content wins; both callers get the one delivery
+            pending.kwargs = kwargs
+            self.coalesced += 1
+            return pending.future
+        fut = asyncio.get_running_loop().create_future()
+        fut.add_done_callback(_consume)
+        call = _Call(priority, next(self._seq), chat_id, method, kwargs, key, fut)
+        if key is not None:
+            self._edits[key] = call
+            if key in self._in_flight_keys:
+                self._held[key] = call  # queued once the current call for `key` finishes
+                return fut
+        self._enqueue(call)
+        return fut
+
+    def has_queued(self, chat_id: int, max_priority: int = QUESTION) -> bool:
+        """True while a call for `chat_id` with priority <= `max_priority` is waiting to be sent."""
+        for ordered in (True, False):
+            queue = self._queues.get((chat_id, ordered))
+            if queue and queue[0].priority <= max_priority:
+                return True
+        return False
+
+    @staticmethod
+    def _lane(call: _Call):
+        # new messages of a chat form one ordered lane; edits of existing messages another
+        return call.chat_id, call.key is None
+
+    def _enqueue(self, call: _Call):
+        lane = self._lane(call)
+        heapq.heappush(self._queues.setdefault(lane, []), call)
+        self._reschedule(lane)
+
+    def _limiter(self, chat_id: int) -> GCRALimiter:
+        return self._groups if chat_id < 0 else self._private
+
+    def _reschedule(self, lane):
+        if lane in self._scheduled or lane in self._busy:
+            return
+        queue = self._queues.get(lane)
+        if not queue:
+            self._queues.pop(lane, None)
+            return
+        heapq.heappush(self._ready, (queue[0].priority, queue[0].seq, lane))
+        self._scheduled.add(lane)
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, lane = heapq.heappop(self._delayed)
+                self._scheduled.discard(lane)
+                self._reschedule(lane)
+            if not self._ready:
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            wait = self._global.wait_time(_GLOBAL, now)
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            _, seq, lane = heapq.heappop(self._ready)
+            chat_id, ordered = lane
+            limiter = self._limiter(chat_id)
+            wait = limiter.wait_time(chat_id, now)
+            if wait:
+                heapq.heappush(self._delayed, (now + wait, seq, lane))
+                continue
+            limiter.reserve(chat_id, now)
+            self._global.reserve(_GLOBAL, now)
+            self._scheduled.discard(lane)
+            call = heapq.heappop(self._queues[lane])
+            if ordered:
+                self._busy.add(lane)  # the chat's next message waits for this one
+            else:
+                self._edits.pop(call.key, None)  # later edits start a new call
+                self._in_flight_keys.add(call.key)
+            await self._slots.acquire()
+            asyncio.create_task(self._deliver(call))
+            self._reschedule(lane)
+
+    async def _deliver(self, call: _Call):
+        chat_id = call.chat_id
+        lane = self._lane(call)
+        try:
+            if call.attempts == 0:
+                self.queue_wait.observe(time.monotonic() - call.queued_at)
+            call.attempts += 1
+            result = await getattr(self._bot, call.method)(**call.kwargs)
+        except asyncio.CancelledError:
+            call.future.cancel()
+            raise
+        except Exception as e:
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after is not None and call.attempts < MAX_RETRIES:
+                self.retried += 1
+                delay = _seconds(retry_after)
+                logger.warning("Flood control in chat %s, retrying in %.1fs", chat_id, delay)
+                self._limiter(chat_id).defer(chat_id, delay)
+                newer = self._edits.get(call.key) if call.key is not None else None
+                if newer is not None:
+                    # a fresher edit is waiting; drop this one and let that answer this caller too
+                    newer.future.add_done_callback(lambda f, fut=call.future: _chain(f, fut))
+                else:
+                    if call.key is not None:
+                        self._edits[call.key] = call
+                    heapq.heappush(self._queues.setdefault(lane, []), call)
+            else:
+                self.failed += 1
+                logger.warning("Outbound %s to chat %s failed: %s", call.method, chat_id, e)
+                if not call.future.done():
+                    call.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not call.future.done():
+                call.future.set_result(result)
+        finally:
+            self._slots.release()
+            self._busy.discard(lane)
+            if call.key is not None:
+                self._in_flight_keys.discard(call.key)
+                held = self._held.pop(call.key, None)
+                if held is not None:
+                    heapq.heappush(self._queues.setdefault(lane, []), held)
+            self._reschedule(lane)
+
+    def stats(self) -> dict:
+        return {
+            'queued': sum(len(q) for q in self._queues.values()) + len(self._held),
+            'chats': len({chat_id for chat_id, _ in self._queues}),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'coalesced': self.coalesced,
+            'queue_wait': self.queue_wait.snapshot(),
+        }
+
+
+def _chain(source: asyncio.Future, target: asyncio.Future):
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+outbound = OutboundDispatcher(
+    global_per_second=settings.OUTBOUND_GLOBAL_PER_SECOND,
+    group_per_minute=settings.OUTBOUND_GROUP_PER_MINUTE,
+    private_per_second=settings.OUTBOUND_PRIVATE_PER_SECOND,
+    max_concurrency=settings.OUTBOUND_MAX_CONCURRENCY,
+)
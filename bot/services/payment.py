@@ -4,7 +4,7 @@ This is intentionally minimal and safe: real payment verification must verify si
 """
 import logging
 from fastapi import FastAPI, Request
-from bot.services.firestore import FirestoreClient
+from bot.services.firestore import ArrayUnion, FirestoreClient
 
 logger = logging.getLogger(__name__)
 app = FastAPI()
@@ -19,6 +19,11 @@ async def payment_webhook(request: Request):
     data = payload.get('data', {})
     user_id = data.get('user_id')
     if user_id:
-        # mark user as premium in a simple users collection
-        await FirestoreClient.set_doc('users', str(user_id), {'is_premium': True})
+        # mark user as premium in a simple users collection; merged so the rest of the doc is kept
+        update = {'is_premium': True}
+        purchase_id = data.get('purchase_id')
+        if purchase_id:
+            # appended server-side, so concurrent webhooks for one user don't overwrite each other
+            update['purchases'] = ArrayUnion([purchase_id])
+        await FirestoreClient.set_doc('users', str(user_id), update, merge=True)
     return {"ok": True}
@@ -0,0 +1,211 @@
+"""Bulk quiz import from CSV or JSON files uploaded by admins.
+
+CSV: one row per question, with the header
+    title,subject,time_per_question,is_premium,question,option1,option2,option3,option4,correct
+Consecutive rows with the same title and subject form one quiz; time_per_question
+(default 15) and is_premium are read from its first row, `correct` is 0-3.
+
+JSON: quiz objects in the `quizzes` document shape ({title, subject,
+time_per_question, is_premium, questions: [{question_text, options, correct_index}]}),
+either one per line (NDJSON) or as one top-level array.
+
+Files are read from disk a quiz at a time, so memory holds one quiz plus one write
+batch whatever the file size. The file is read twice: the first pass checks every
+quiz with the rules /publish_quiz uses and collects all errors; only a file without
+errors is written, so a corrected file can simply be uploaded again.
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+from bot.services.firestore import FirestoreClient
+from bot.utils.validation import describe, quiz_errors
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'json', '.ndjson': 'json'}
+CSV_COLUMNS = ['title', 'subject', 'question', 'option1', 'option2', 'option3', 'option4', 'correct']
+DEFAULT_TIME_PER_QUESTION = 15
+MAX_REPORTED_ERRORS = 1000
+MAX_JSON_QUIZ_CHARS = 2 * 1024 * 1024  # a quiz object bigger than this can't be a valid document anyway
+BATCH_QUIZZES = 400
+BATCH_BYTES = 4 * 1024 * 1024  # stay well below Firestore's 10 MiB per commit
+_READ_CHUNK = 64 * 1024
+_TRUE = {'1', 'true', 'yes', 'y'}
+
+
+class ImportFileError(Exception):
+    """The file can't be read any further (bad header, broken JSON)."""
+
+
+@dataclass
+class ImportReport:
+    quizzes: int = 0
+    questions: int = 0
+    written: int = 0
+    errors: List[str] = field(default_factory=list)
+    error_count: int = 0
+    failure: Optional[str] = None  # set when writing stopped part way
+
+    def error(self, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+
+def import_format(file_name: Optional[str]) -> Optional[str]:
+    return FORMATS.get(os.path.splitext(file_name or '')[1].lower())
+
+
+# parsing: both readers yield (label, quiz, errors found while parsing)
+def _read_csv(path: str) -> Iterator[Tuple[str, dict, List[str]]]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        missing = [c for c in CSV_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ImportFileError(f"CSV header is missing columns: {', '.join(missing)}")
+        seen = set()
+        key = quiz = label = None
+        errors: List[str] = []
+        for row in reader:
+            line = reader.line_num
+            row_key = ((row['title'] or '').strip(), (row['subject'] or '').strip())
+            if row_key != key:
+                if quiz is not None:
+                    yield label, quiz, errors
+                key, errors = row_key, []
+                label = f"{key[0] or '(untitled)'!r} (line {line})"
+                if key in seen:
+                    errors.append(f"line {line}: rows of this quiz are not contiguous")
+                seen.add(key)
+                quiz = {'title': key[0], 'subject': key[1], 'time_per_question': DEFAULT_TIME_PER_QUESTION,
+                        'is_premium': (row.get('is_premium') or '').strip().lower() in _TRUE, 'questions': []}
+                secs = (row.get('time_per_question') or '').strip()
+                if secs:
+                    try:
+                        quiz['time_per_question'] = int(secs)
+                    except ValueError:
+                        errors.append(f"line {line}: time_per_question is not a number")
+            try:
+                correct = int(row['correct'])
+            except (TypeError, ValueError):
+                correct = None
+                errors.append(f"line {line}: correct must be a number 0-3")
+            quiz['questions'].append({
+                'question_text': (row['question'] or '').strip(),
+                'options': [(row[f'option{i}'] or '').strip() for i in range(1, 5)],
+                'correct_index': correct,
+            })
+        if quiz is not None:
+            yield label, quiz, errors
+
+
+def _json_values(f) -> Iterator[object]:
+    """Top-level JSON values of a file holding NDJSON or one array, decoded one at a time."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+    while True:
+        while True:
+            # values are separated by whitespace, commas and the array's brackets
+            while pos < len(buf) and buf[pos] in ' \t\r\n,[]':
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            chunk = f.read(_READ_CHUNK)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+        if pos >= len(buf):
+            return
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                break
+            except json.JSONDecodeError as e:
+                if eof or len(buf) - pos > MAX_JSON_QUIZ_CHARS:
+                    raise ImportFileError(f"invalid JSON: {e.msg}") from None
+                chunk = f.read(_READ_CHUNK)
+                buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+        yield value
+        pos = end
+
+
+def _read_json(path: str) -> Iterator[Tuple[str, dict, List[str]]]:
+    with open(path, encoding='utf-8-sig') as f:
+        for n, value in enumerate(_json_values(f), 1):
+            label = f"quiz #{n}"
+            if not isinstance(value, dict):
+                yield label, {}, ["not a JSON object"]
+                continue
+            label = f"quiz #{n} ({value.get('title') or '(untitled)'!r})"
+            questions = value.get('questions')
+            if not isinstance(questions, list) or not all(isinstance(q, dict) for q in questions):
+                yield label, {}, ["questions must be a list of objects"]
+                continue
+            yield label, {
+                'title': value.get('title'),
+                'subject': value.get('subject'),
+                'time_per_question': value.get('time_per_question', DEFAULT_TIME_PER_QUESTION),
+                'is_premium': bool(value.get('is_premium', False)),
+                'questions': [{k: q.get(k) for k in ('question_text', 'options', 'correct_index')} for q in questions],
+            }, []
+
+
+def read_quizzes(path: str, fmt: str) -> Iterator[Tuple[str, dict, List[str]]]:
+    return _read_csv(path) if fmt == 'csv' else _read_json(path)
+
+
+def check_file(path: str, fmt: str) -> ImportReport:
+    """First pass: count quizzes and collect every error, without writing anything."""
+    report = ImportReport()
+    try:
+        for label, quiz, errors in read_quizzes(path, fmt):
+            report.quizzes += 1
+            report.questions += len(quiz.get('questions') or ())
+            for message in errors:
+                report.error(f"{label}: {message}")
+            if not errors:
+                for error in quiz_errors(quiz):
+                    report.error(f"{label}: {describe(error)}")
+    except (ImportFileError, UnicodeDecodeError, csv.Error) as e:
+        report.error(f"stopped reading: {e}")
+    if not report.quizzes and not report.error_count:
+        report.error("the file contains no quizzes")
+    return report
+
+
+def _next_batch(quizzes: Iterator[Tuple[str, dict, List[str]]]) -> List[Tuple[str, dict]]:
+    """The next write batch from `quizzes`, empty at the end; parses the file, so run it in a thread."""
+    batch: List[Tuple[str, dict]] = []
+    size = 0
+    for _, quiz, _ in quizzes:
+        batch.append((str(uuid.uuid4()), quiz))
+        size += len(json.dumps(quiz))
+        if len(batch) >= BATCH_QUIZZES or size >= BATCH_BYTES:
+            break
+    return batch
+
+
+class QuizImporter:
+    @staticmethod
+    async def run(path: str, fmt: str) -> ImportReport:
+        """Validate the whole file, then write its quizzes in batches if it had no errors."""
+        report = await asyncio.to_thread(check_file, path, fmt)
+        if report.error_count:
+            return report
+        quizzes = read_quizzes(path, fmt)
+        try:
+            while True:
+                batch = await asyncio.to_thread(_next_batch, quizzes)
+                if not batch:
+                    break
+                report.written += await FirestoreClient.create_quizzes(batch)
+        except Exception as e:
+            logger.exception("Quiz import failed after %d of %d quizzes", report.written, report.quizzes)
+            report.failure = str(e) or type(e).__name__
+        finally:
+            quizzes.close()
+        return report
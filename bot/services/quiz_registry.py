@@ -0,0 +1,93 @@
+"""Interned, immutable quiz objects shared by every session playing the same quiz.
+
+Sessions hold a reference to one `Quiz` per quiz version instead of their own copy
+of the payload. Quizzes are kept in a bounded LRU keyed by (quiz_id, updated_at):
+with a shared session store every update rebuilds its session from Redis, so the
+registry, not the session, is what keeps a quiz alive between answers.
+A quiz written again under the same id gets a new `updated_at`, so new sessions get
+the new version; running sessions record the version they started with and keep it.
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from bot.config import settings
+from bot.services.firestore import FirestoreClient
+from bot.utils.cache import AsyncLRUCache
+
+OPTION_LABELS = ('A', 'B', 'C', 'D')
+
+
+@dataclass(frozen=True, slots=True)
+class Question:
+    question_text: str
+    options: Tuple[str, ...]
+    correct_index: int
+
+
+@dataclass(frozen=True)
+class Quiz:
+    id: str
+    title: str
+    subject: str
+    time_per_question: int
+    is_premium: bool
+    questions: Tuple[Question, ...]
+    version: Optional[float] = None  # the payload's updated_at
+
+    @classmethod
+    def from_payload(cls, quiz_id: str, payload: dict) -> 'Quiz':
+        return cls(
+            id=quiz_id,
+            title=payload.get('title', ''),
+            subject=payload.get('subject', ''),
+            time_per_question=int(payload.get('time_per_question') or 15),
+            is_premium=bool(payload.get('is_premium', False)),
+            questions=tuple(
+                Question(q['question_text'], tuple(q['options']), int(q['correct_index']))
+                for q in payload.get('questions') or ()
+            ),
+            version=payload.get('updated_at'),
+        )
+
+
+# (quiz_id, version) -> Quiz; entries outlive the sessions that are playing them
+_quizzes = AsyncLRUCache(
+    max_entries=settings.QUIZ_CACHE_MAX_ENTRIES,
+    ttl=settings.SESSION_TTL_SECONDS,
+    max_weight=settings.QUIZ_CACHE_MAX_QUESTIONS,
+    weigher=lambda quiz: max(1, len(quiz.questions)),
+)
+
+
+class QuizRegistry:
+    @staticmethod
+    def intern(quiz_id: str, payload: dict) -> Quiz:
+        key = (quiz_id, payload.get('updated_at'))
+        quiz = _quizzes.get(key)
+        if quiz is None:
+            quiz = Quiz.from_payload(quiz_id, payload)
+            _quizzes.put(key, quiz)
+        return quiz
+
+    @staticmethod
+    def get(quiz_id: str, version: Optional[float] = None) -> Optional[Quiz]:
+        return _quizzes.get((quiz_id, version))
+
+    @staticmethod
+    async def load(quiz_id: str, version: Optional[float] = None) -> Optional[Quiz]:
+        """Version `version` of a quiz, fetched through the Firestore quiz cache if not interned.
+
+        None when the quiz is gone or was rewritten since: a session that started on the
+        old version can't continue with questions its player was never shown.
+        """
+        quiz = _quizzes.get((quiz_id, version))
+        if quiz is None:
+            payload = await FirestoreClient.get_quiz(quiz_id)
+            if not payload or payload.get('updated_at') != version:
+                return None
+            quiz = QuizRegistry.intern(quiz_id, payload)
+        return quiz
+
+    @staticmethod
+    def count() -> int:
+        return _quizzes.stats()['entries']
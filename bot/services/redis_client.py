@@ -0,0 +1,16 @@
+"""Shared asyncio Redis client (optional dependency, only needed when a Redis backend is enabled)."""
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        from bot.config import settings
+        if not settings.REDIS_URL:
+            raise RuntimeError("This feature requires REDIS_URL to be set")
+        try:
+            from redis import asyncio as aioredis
+        except Exception as e:
+            raise ImportError("Missing dependency 'redis'. Install dependencies with: pip install -r bot/requirements.txt") from e
+        _client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
@@ -0,0 +1,91 @@
+"""Pre-rendered question messages shared by every session playing the same quiz.
+
+A question's text and inline keyboard are the same for every player apart from the
+callback data, which carries the session token. Each question is therefore rendered
+once (at publish time or when the quiz is first loaded) into its text plus the
+keyboard already serialized to JSON, split around the session token. Sending a
+question is then a single `str.join` instead of building buttons and a markup object
+that the bot serializes again.
+
+The Bot API takes `reply_markup` as a JSON-serialized string and python-telegram-bot
+passes string parameters through unchanged, so the filled template goes straight
+into `send_message`.
+"""
+import json
+from typing import Optional, Sequence, Tuple
+
+from bot.config import settings
+from bot.services.quiz_registry import OPTION_LABELS, Quiz, QuizRegistry
+from bot.utils.cache import AsyncLRUCache
+from bot.utils.callback_data import ANSWER, GROUP_ANSWER, CallbackLayout
+
+OPTION_TEXT_MAX = 40  # option text shown on the private-quiz buttons
+
+
+def _keyboard_parts(labels: Sequence[str], layout: CallbackLayout, index: int) -> Tuple[str, ...]:
+    """JSON keyboard (one button per row) cut wherever the session token goes."""
+    parts = []
+    head = '{"inline_keyboard":['
+    for i, label in enumerate(labels):
+        parts.append(f'{head}[{{"text":{json.dumps(label)},"callback_data":"{layout.fields_prefix(index, i)}')
+        head = '"}],'
+    parts.append('"}]]}')
+    return tuple(parts)
+
+
+class QuestionRender:
+    __slots__ = ('text', '_solo', '_group')
+
+    def __init__(self, index: int, question_text: str, options: Sequence[str]):
+        self.text = f"Q{index+1}. {question_text}"
+        self._solo = _keyboard_parts(
+            [f"{OPTION_LABELS[i]} - {opt[:OPTION_TEXT_MAX]}" for i, opt in enumerate(options)], ANSWER, index)
+        self._group = _keyboard_parts(OPTION_LABELS[:len(options)], GROUP_ANSWER, index)
+
+    def solo_markup(self, session_id: str) -> str:
+        return session_id.join(self._solo)
+
+    def group_markup(self, session_id: str) -> str:
+        return session_id.join(self._group)
+
+
+def render_quiz(quiz: Quiz) -> Tuple[QuestionRender, ...]:
+    return tuple(QuestionRender(i, q.question_text, q.options) for i, q in enumerate(quiz.questions))
+
+
+# quiz_id -> (quiz version, renders); a render of another version is replaced on use
+_renders = AsyncLRUCache(
+    max_entries=settings.QUIZ_CACHE_MAX_ENTRIES,
+    ttl=settings.QUIZ_CACHE_TTL,
+    max_weight=settings.QUIZ_CACHE_MAX_QUESTIONS,
+    weigher=lambda entry: len(entry[1]),
+)
+
+
+class RenderCache:
+    @staticmethod
+    def question(quiz: Quiz, index: int) -> QuestionRender:
+        """Rendered question `index` of `quiz`, rendering the whole quiz on first use."""
+        entry = _renders.get(quiz.id)
+        if entry is None or entry[0] != quiz.version:
+            entry = (quiz.version, render_quiz(quiz))
+            _renders.put(quiz.id, entry)
+        return entry[1][index]
+
+    @staticmethod
+    def warm(quiz_id: str, payload: dict):
+        """Render a freshly published quiz so its first players don't pay for it."""
+        quiz = QuizRegistry.intern(quiz_id, payload)
+        _renders.put(quiz_id, (quiz.version, render_quiz(quiz)))
+
+    @staticmethod
+    def invalidate(quiz_id: Optional[str] = None):
+        if quiz_id is None:
+            _renders.clear()
+        else:
+            _renders.invalidate(quiz_id)
+
+    @staticmethod
+    def stats() -> dict:
+        return _renders.stats()
+
@@ -0,0 +1,287 @@
+"""Write-behind persistence for quiz results.
+
+Handlers call `result_writer.enqueue(payload)` (or `enqueue_many` for the results
+of a whole group) and move on: each result gets a
+client-side id, is folded into the in-memory leaderboards right away, and is
+buffered. A background task flushes the buffer through FirestoreClient.save_results
+(WriteBatches of up to 500 writes) once `flush_size` results are waiting or
+`flush_interval` seconds after the first one arrived, whichever comes first.
+
+The buffer is bounded to `max_buffer` results. Without a journal, enqueue raises
+ResultBufferFull rather than wait when it is full. Failed flushes are retried with exponential backoff; since result ids are
+fixed and rollups are Maximum transforms, a retry can't double count. `close()`
+flushes whatever is left on shutdown.
+
+Rollups (leaderboards, result buckets) are written after the results they come from,
+by a separate background task. A failed rollup write is retried with the next flush's
+rollups and never holds raw results back or blocks the flusher.
+
+With a journal configured (RESULT_JOURNAL_DIR), enqueue first appends the result
+to the local on-disk journal (bot/services/journal.py) and returns once it is
+fsynced, so a crash or a long Firestore outage can't lose it. Each successful
+flush checkpoints the journal, and `start()` replays whatever was journaled but
+not yet shipped when the previous process stopped. Journaled results are never
+dropped from the buffer; the journal is what they are recovered from. When the
+buffer is full, new results spill: they are only journaled (and folded into the
+in-memory boards), and are read back from the journal as flushes make room.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from bot.config import settings
+from bot.services.firestore import FirestoreClient
+from bot.services.journal import Journal, Position
+from bot.services.leaderboards import LeaderboardStore
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 60.0
+
+
+class ResultBufferFull(Exception):
+    """The buffer is full and there is no journal to spill to; the result was not queued."""
+
+
+class ResultWriter:
+    def __init__(self, flush_size: int = 500, flush_interval: float = 2.0, max_buffer: int = 20000,
+                 max_retries: int = 5, journal: Optional[Journal] = None):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.max_retries = max_retries
+        self.journal = journal
+        self._buffer: List[Tuple[str, dict, Optional[Position]]] = []
+        self._spilled: Optional[Position] = None  # journal position after which results are not in the buffer
+        self._pending: Optional[asyncio.Event] = None  # set while the buffer is non-empty
+        self._full: Optional[asyncio.Event] = None  # set once flush_size results are waiting
+        self._task: Optional[asyncio.Task] = None
+        self._rollup_backlog: List[dict] = []  # written results whose rollups are not yet written
+        self._rollup_task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.written = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.rejected = 0
+        self.failed_flushes = 0
+        self.failed_rollups = 0
+        self.dropped_rollups = 0
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            if self._pending is None:
+                self._pending = asyncio.Event()
+                self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self):
+        """Open the journal and re-queue results a previous process journaled but never wrote."""
+        self._ensure_started()
+        if self.journal is None:
+            return
+        self.journal.open()
+        self._spilled = self.journal.checkpointed
+        self.replayed = self._refill()
+        if self.replayed:
+            logger.info("Replaying %d journaled results", self.replayed)
+
+    async def enqueue(self, payload: dict) -> str:
+        """Queue a result for writing and return its id; see enqueue_many."""
+        return (await self.enqueue_many([payload]))[0]
+
+    async def enqueue_many(self, payloads: List[dict]) -> List[str]:
+        """Queue results for writing and return their ids, with one journal write and fsync for all.
+
+        Never waits for a flush: with a journal, results that don't fit in the buffer
+        spill to it; without one, ResultBufferFull is raised and nothing is queued.
+        """
+        self._ensure_started()
+        ids = [uuid.uuid4().hex for _ in payloads]
+        if not payloads:
+            return ids
+        if self.journal is None:
+            if len(self._buffer) + len(payloads) > self.max_buffer:
+                self.rejected += len(payloads)
+                raise ResultBufferFull(f"{len(self._buffer)} results are waiting to be written")
+            for result_id, payload in zip(ids, payloads):
+                self._push(result_id, payload, None)
+        else:
+            # buffer order must stay journal order (checkpoints rely on it), so place the
+            # results right after writing them, before waiting for the fsync
+            before = self.journal.position
+            positions = self.journal.write([{'id': rid, 'payload': p} for rid, p in zip(ids, payloads)])
+            for result_id, payload, position in zip(ids, payloads, positions):
+                if self._spilled is None and len(self._buffer) >= self.max_buffer:
+                    self._spilled = before
+                if self._spilled is None:
+                    self._push(result_id, payload, position)
+                else:
+                    self.spilled += 1
+                    LeaderboardStore.record_result(payload, now=int(time.time()))
+                before = position
+            await self.journal.sync()
+        self.enqueued += len(payloads)
+        return ids
+
+    def _refill(self) -> int:
+        """Move spilled results back from the journal into the buffer while it has room."""
+        if self._spilled is None:
+            return 0
+        moved = 0
+        for position, record in self.journal.read_after(self._spilled):
+            if len(self._buffer) >= self.max_buffer:
+                break
+            self._push(record['id'], record['payload'], position)
+            self._spilled = position
+            moved += 1
+        else:
+            self._spilled = None
+        return moved
+
+    def _push(self, result_id: str, payload: dict, position: Optional[Position]):
+        self._buffer.append((result_id, payload, position))
+        LeaderboardStore.record_result(payload, now=int(time.time()))
+        self._pending.set()
+        if len(self._buffer) >= self.flush_size:
+            self._full.set()
+
+    async def _run(self):
+        while True:
+            await self._pending.wait()
+            if len(self._buffer) < self.flush_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            if await self._flush_once():
+                self._refill()
+
+    async def _flush_once(self, pause: bool = True) -> bool:
+        """Write up to flush_size buffered results; False if they had to be put back."""
+        chunk = self._buffer[:self.flush_size]
+        del self._buffer[:len(chunk)]
+        self._update_events()
+        delay = 0.5
+        try:
+            for attempt in range(1, self.max_retries + 1):
+                try:
+                    await FirestoreClient.save_results([(result_id, payload) for result_id, payload, _ in chunk])
+                    self.written += len(chunk)
+                    if self.journal is not None:
+                        # chunks ship in journal order, so everything up to the last one is written
+                        await self.journal.checkpoint(chunk[-1][2])
+                    self._schedule_rollups([payload for _, payload, _ in chunk])
+                    return True
+                except Exception:
+                    self.failed_flushes += 1
+                    logger.warning("Result flush of %d failed (attempt %d/%d)", len(chunk), attempt,
+                                   self.max_retries, exc_info=True)
+                    if attempt < self.max_retries:
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, MAX_BACKOFF)
+        except asyncio.CancelledError:
+            # stopped mid-flush (close): put the chunk back, rewriting it is harmless
+            self._buffer[:0] = chunk
+            self._update_events()
+            raise
+        # keep the results if there is room, behind a pause so a Firestore outage doesn't spin
+        room = len(chunk) if self.journal is not None else self.max_buffer - len(self._buffer)
+        if room < len(chunk):
+            self.dropped += len(chunk) - room
+            logger.error("Result buffer full, dropping %d results: %s", len(chunk) - room,
+                         [result_id for result_id, _, _ in chunk[room:]])
+        self._buffer[:0] = chunk[:room]
+        self._update_events()
+        if pause:
+            await asyncio.sleep(MAX_BACKOFF)
+        return False
+
+    def _schedule_rollups(self, payloads: List[dict]):
+        self._rollup_backlog.extend(payloads)
+        excess = len(self._rollup_backlog) - self.max_buffer
+        if excess > 0:
+            # the results themselves are stored; `python -m bot.services.rollups` rebuilds these
+            self.dropped_rollups += excess
+            logger.error("Rollup backlog full, dropping rollups of %d written results", excess)
+            del self._rollup_backlog[:excess]
+        if self._rollup_task is None or self._rollup_task.done():
+            self._rollup_task = asyncio.create_task(self._write_rollups())
+
+    async def _write_rollups(self) -> bool:
+        while self._rollup_backlog:
+            payloads, self._rollup_backlog = self._rollup_backlog, []
+            try:
+                await FirestoreClient.apply_rollups(payloads)
+            except Exception:
+                # kept for the next attempt, which the next flush starts
+                self.failed_rollups += 1
+                logger.warning("Rollup update for %d results failed", len(payloads), exc_info=True)
+                self._rollup_backlog[:0] = payloads
+                return False
+            LeaderboardStore.results_written()
+        return True
+
+    def _update_events(self):
+        if self._buffer:
+            self._pending.set()
+        else:
+            self._pending.clear()
+        if len(self._buffer) >= self.flush_size:
+            self._full.set()
+        else:
+            self._full.clear()
+
+    async def close(self):
+        """Stop the background flusher and write out everything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._buffer:
+            if not await self._flush_once(pause=False):
+                break
+        if self._rollup_task is not None:
+            await asyncio.gather(self._rollup_task, return_exceptions=True)
+        if self._rollup_backlog and not await self._write_rollups():
+            logger.error("Shutting down with rollups of %d results unwritten; rebuild them with "
+                         "`python -m bot.services.rollups`", len(self._rollup_backlog))
+        if self._buffer or self._spilled is not None:
+            logger.error("Shutting down with %d unwritten results%s", len(self._buffer),
+                         " (plus spilled ones), they stay in the journal" if self.journal is not None else "")
+        if self.journal is not None:
+            self.journal.close()
+
+    def stats(self) -> dict:
+        return {
+            'buffered': len(self._buffer),
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'replayed': self.replayed,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'rejected': self.rejected,
+            'failed_flushes': self.failed_flushes,
+            'rollup_backlog': len(self._rollup_backlog),
+            'failed_rollups': self.failed_rollups,
+            'dropped_rollups': self.dropped_rollups,
+            'journal': self.journal.stats() if self.journal is not None else None,
+        }
+
+
+result_writer = ResultWriter(
+    flush_size=settings.RESULT_FLUSH_SIZE,
+    flush_interval=settings.RESULT_FLUSH_INTERVAL,
+    max_buffer=settings.RESULT_BUFFER_MAX,
+    max_retries=settings.RESULT_MAX_RETRIES,
+    journal=Journal(
+        settings.RESULT_JOURNAL_DIR,
+        segment_bytes=settings.RESULT_JOURNAL_SEGMENT_BYTES,
+        fsync_interval=settings.RESULT_JOURNAL_FSYNC_INTERVAL,
+    ) if settings.RESULT_JOURNAL_DIR else None,
+)
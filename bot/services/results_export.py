@@ -0,0 +1,63 @@
+"""Streaming export of the `results` collection as CSV or NDJSON.
+
+`export_chunks()` pages through results with Firestore cursors (fetching the next
+page while the current one is encoded) and yields encoded, optionally gzip-compressed
+bytes as it goes, so memory stays at about two pages whatever the size of the export.
+/export_results writes the chunks to a temp file and sends it as a document; the
+`/admin/export/results` endpoint in bot/server.py streams them as the response body.
+"""
+import asyncio
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bot.services.firestore import FirestoreClient
+
+FORMATS = ('csv', 'ndjson')
+COLUMNS = ['result_id', 'user_id', 'quiz_id', 'score', 'timestamp', 'time_taken']
+PAGE_SIZE = 500
+
+
+def export_filename(fmt: str, start_ts: int, end_ts: int, compress: bool = True) -> str:
+    return f"results_{start_ts}_{end_ts}.{fmt}" + ('.gz' if compress else '')
+
+
+def _encode(fmt: str, rows: List[Tuple[str, dict]]) -> bytes:
+    if fmt == 'ndjson':
+        return ''.join(json.dumps({'result_id': rid, **doc}, default=str) + '\n' for rid, doc in rows).encode()
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerows([rid] + [doc.get(c) for c in COLUMNS[1:]] for rid, doc in rows)
+    return out.getvalue().encode()
+
+
+async def export_chunks(start_ts: int, end_ts: int, fmt: str = 'csv', quiz_id: Optional[str] = None,
+                        compress: bool = True, page_size: int = PAGE_SIZE) -> AsyncIterator[bytes]:
+    """Encoded results between `start_ts` and `end_ts` (inclusive), one chunk per page."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits 31: gzip container
+
+    def _out(data: bytes) -> bytes:
+        return gz.compress(data) if gz else data
+
+    def _fetch(after):
+        return asyncio.create_task(FirestoreClient.results_page(start_ts, end_ts, quiz_id, page_size, after))
+
+    if fmt == 'csv':
+        yield _out((','.join(COLUMNS) + '\r\n').encode())
+    task = _fetch(None)
+    try:
+        while task is not None:
+            rows, cursor = await task
+            task = _fetch(cursor) if cursor is not None else None
+            chunk = _out(_encode(fmt, rows))
+            if chunk:
+                yield chunk
+    finally:
+        if task is not None:
+            task.cancel()  # the consumer went away (client disconnected, upload too large)
+    if gz:
+        yield gz.flush()
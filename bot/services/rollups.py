@@ -0,0 +1,94 @@
+"""Hourly/daily result buckets for arbitrary-range leaderboards.
+
+Every result is folded into one hourly and one daily bucket document holding the
+best rank per user (see leaderboards.encode_rank). A range query reads whole days
+from the daily buckets and only the ragged edges from the hourly ones, so a month
+costs ~30 + 48 small documents instead of every raw result.
+
+Bucket and leaderboard rollups are sharded by user id over ROLLUP_SHARDS documents
+(`<id>`, `<id>-1`, `<id>-2`, ...), so no single document grows past Firestore's size
+limit or takes every write of a busy day. Readers fetch all shards and max-merge them.
+
+Run `python -m bot.services.rollups` once to build buckets (and the leaderboard
+rollups) from the existing `results` collection, or to repair rollups after writes
+to them failed.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from bot.config import settings
+from bot.services.leaderboards import Leaderboard
+
+HOURLY_COLLECTION = 'result_buckets_hourly'
+DAILY_COLLECTION = 'result_buckets_daily'
+
+HOUR = 3600
+DAY = 86400
+MAX_RANGE_DAYS = 366
+
+
+def shard_doc_id(doc_id: str, user_id) -> str:
+    """The shard of rollup `doc_id` holding `user_id`; shard 0 keeps the unsharded id."""
+    shard = int(user_id) % settings.ROLLUP_SHARDS
+    return doc_id if shard == 0 else f'{doc_id}-{shard}'
+
+
+def shard_doc_ids(doc_id: str) -> List[str]:
+    return [doc_id] + [f'{doc_id}-{shard}' for shard in range(1, settings.ROLLUP_SHARDS)]
+
+
+def hour_id(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y%m%d%H')
+
+
+def day_id(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y%m%d')
+
+
+def bucket_refs(ts: int) -> List[Tuple[str, str, int]]:
+    """[(collection, doc_id, bucket_start), ...] that a result at `ts` belongs to."""
+    return [
+        (HOURLY_COLLECTION, hour_id(ts), ts - ts % HOUR),
+        (DAILY_COLLECTION, day_id(ts), ts - ts % DAY),
+    ]
+
+
+def plan_range(start_ts: int, end_ts: int) -> List[Tuple[str, str]]:
+    """Minimal set of bucket documents covering [start_ts, end_ts].
+
+    Boundaries are widened to whole hours: a partially covered hour is included.
+    """
+    refs = []
+    t = start_ts - start_ts % HOUR
+    while t <= end_ts:
+        if t % DAY == 0 and t + DAY - 1 <= end_ts:
+            refs.append((DAILY_COLLECTION, day_id(t)))
+            t += DAY
+        else:
+            refs.append((HOURLY_COLLECTION, hour_id(t)))
+            t += HOUR
+    return refs
+
+
+def merge_buckets(buckets: Iterable[Dict[str, int]]) -> Leaderboard:
+    board = Leaderboard()
+    for users in buckets:
+        for uid, rank in users.items():
+            board.offer(int(uid), int(rank))
+    board.loaded = True
+    return board
+
+
+if __name__ == '__main__':
+    import asyncio
+    import logging
+    from bot.services.firestore import FirestoreClient
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def _backfill():
+        await FirestoreClient.init()
+        count = await FirestoreClient.backfill_result_rollups()
+        logging.getLogger(__name__).info("Backfilled rollups from %d results", count)
+
+    asyncio.run(_backfill())
@@ -0,0 +1,445 @@
+"""Pluggable storage for private and group quiz sessions.
+
+`MemorySessionStore` keeps sessions in process (single instance, lost on restart).
+`RedisSessionStore` keeps them in Redis so several bot workers can share load and
+a restart doesn't drop quizzes in progress:
+
+- session state is a hash per session, answers are recorded by Lua scripts so the
+  "is this the current question / not answered yet" checks and the write are atomic;
+- question deadlines live in one sorted set. Whoever removes a deadline owns that
+  timeout, so a timer fires exactly once even if the scheduling worker died (see
+  `claim_deadline` / `due_deadlines`).
+
+Select the backend with SESSION_STORE=memory|redis (redis needs REDIS_URL).
+"""
+import asyncio
+import itertools
+import logging
+import math
+import sys
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from bot.utils.callback_data import b62encode
+
+logger = logging.getLogger(__name__)
+
+SOLO = 'solo'
+GROUP = 'group'
+
+
+class SessionError(Exception):
+    pass
+
+
+def timer_key(kind: str, session_id: str, question_index: int) -> str:
+    return f'{kind}:{session_id}:{question_index}'
+
+
+def parse_timer_key(key: str):
+    kind, session_id, question_index = key.rsplit(':', 2)
+    return kind, session_id, int(question_index)
+
+
+UNANSWERED = -1
+
+
+class QuizSession:
+    """A private quiz in progress.
+
+    `quiz` is the shared interned Quiz (see quiz_registry) and `quiz_version` its
+    `updated_at` when the session started; answers are stored as one signed byte per
+    question (UNANSWERED on timeout) and a float32 latency.
+    """
+    __slots__ = ('id', 'user_id', 'chat_id', 'quiz_id', 'quiz', 'quiz_version', 'current', 'score',
+                 'started_at', 'selections', 'latencies')
+
+    def __init__(self, id: str, user_id: int, chat_id: int, quiz_id: str, quiz=None,
+                 current: int = 0, score: int = 0, started_at: float = 0.0,
+                 quiz_version: Optional[float] = None):
+        self.id = id
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.quiz_id = quiz_id
+        self.quiz = quiz
+        self.quiz_version = quiz_version if quiz is None else quiz.version
+        self.current = current
+        self.score = score
+        self.started_at = started_at
+        self.selections = array('b')
+        self.latencies = array('f')
+
+    @property
+    def answered(self) -> int:
+        return len(self.selections)
+
+    def add_answer(self, selected: Optional[int], time_taken: Optional[float]):
+        self.selections.append(UNANSWERED if selected is None else selected)
+        self.latencies.append(math.nan if time_taken is None else time_taken)
+
+    def footprint(self) -> int:
+        """Bytes owned by this session (the shared quiz is not counted)."""
+        return sys.getsizeof(self) + sys.getsizeof(self.selections) + sys.getsizeof(self.latencies)
+
+
+class GroupSession:
+    """A group quiz in progress; `answers` maps question_index -> {user_id: selected}.
+
+    `participants` maps user_id -> index of the first question they are expected to answer.
+    """
+    __slots__ = ('id', 'chat_id', 'host_id', 'quiz_id', 'quiz', 'quiz_version', 'current', 'started_at',
+                 'scores', 'answers', 'participants')
+
+    def __init__(self, id: str, chat_id: int, host_id: int, quiz_id: str, quiz=None,
+                 current: int = 0, started_at: float = 0.0, quiz_version: Optional[float] = None):
+        self.id = id
+        self.chat_id = chat_id
+        self.host_id = host_id
+        self.quiz_id = quiz_id
+        self.quiz = quiz
+        self.quiz_version = quiz_version if quiz is None else quiz.version
+        self.current = current
+        self.started_at = started_at
+        self.scores: Dict[int, int] = {}
+        self.answers: Dict[int, Dict[int, int]] = {}
+        self.participants: Dict[int, int] = {}
+
+
+def _optional_float(value: str) -> Optional[float]:
+    return float(value) if value else None
+
+
+# quiz_version is stored as '' for quizzes written before versions existed
+_SCALAR_FIELDS = {
+    SOLO: {'id': str, 'user_id': int, 'chat_id': int, 'quiz_id': str, 'quiz_version': _optional_float,
+           'current': int, 'score': int, 'started_at': float},
+    GROUP: {'id': str, 'chat_id': int, 'host_id': int, 'quiz_id': str, 'quiz_version': _optional_float,
+            'current': int, 'started_at': float},
+}
+_SESSION_TYPES = {SOLO: QuizSession, GROUP: GroupSession}
+
+
+class SessionStore:
+    """Interface shared by the session backends; every method is a coroutine."""
+
+    async def new_id(self) -> str:
+        """Short base62 session token, unique within the store (it ends up in callback_data)."""
+        raise NotImplementedError
+
+    async def create(self, kind: str, session):
+        raise NotImplementedError
+
+    async def get(self, kind: str, session_id: str, all_answers: bool = False):
+        """The session record, with `quiz` left as None when the backend can't hold it.
+
+        A group session's `answers` may hold only the current question unless
+        `all_answers` is set; answering and closing questions need nothing more.
+        """
+        raise NotImplementedError
+
+    async def delete(self, kind: str, session_id: str):
+        """Remove the session and return its final state (None if already gone)."""
+        raise NotImplementedError
+
+    async def advance(self, kind: str, session_id: str) -> Optional[int]:
+        raise NotImplementedError
+
+    async def record_answer(self, session_id: str, question_index: int, selected: Optional[int],
+                            time_taken: Optional[float], is_correct: bool):
+        """Append a private-quiz answer; raises SessionError when it is not the current, unanswered question."""
+        raise NotImplementedError
+
+    async def record_group_answer(self, session_id: str, question_index: int, user_id: int,
+                                  selected: int, is_correct: bool) -> bool:
+        raise NotImplementedError
+
+    async def add_participant(self, session_id: str, user_id: int, from_index: int) -> bool:
+        """Register a group player; False if already registered or the session is gone."""
+        raise NotImplementedError
+
+    async def set_deadline(self, key: str, deadline: float):
+        raise NotImplementedError
+
+    async def claim_deadline(self, key: str) -> bool:
+        """True for exactly one caller per deadline (the one allowed to run the timeout)."""
+        raise NotImplementedError
+
+    async def due_deadlines(self, before: float, limit: int = 100) -> List[str]:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self):
+        self._sessions: Dict[str, Dict[str, object]] = {SOLO: {}, GROUP: {}}
+        # seeded from the clock so buttons left over from before a restart can't hit new sessions
+        self._ids = itertools.count(int(time.time() * 1000))
+
+    async def new_id(self):
+        return b62encode(next(self._ids))
+
+    async def create(self, kind, session):
+        self._sessions[kind][session.id] = session
+
+    async def get(self, kind, session_id, all_answers=False):
+        return self._sessions[kind].get(session_id)
+
+    async def delete(self, kind, session_id):
+        return self._sessions[kind].pop(session_id, None)
+
+    async def advance(self, kind, session_id):
+        s = self._sessions[kind].get(session_id)
+        if not s:
+            return None
+        s.current += 1
+        return s.current
+
+    async def record_answer(self, session_id, question_index, selected, time_taken, is_correct):
+        s = self._sessions[SOLO].get(session_id)
+        if not s:
+            raise SessionError("Session not found")
+        if question_index != s.current:
+            raise SessionError("Question mismatch or already progressed")
+        if s.answered > question_index:
+            raise SessionError("Already answered")
+        if is_correct:
+            s.score += 1
+        s.add_answer(selected, time_taken)
+
+    async def record_group_answer(self, session_id, question_index, user_id, selected, is_correct):
+        s = self._sessions[GROUP].get(session_id)
+        if not s or question_index != s.current:
+            return False
+        qmap = s.answers.setdefault(question_index, {})
+        if user_id in qmap:
+            return False
+        qmap[user_id] = selected
+        if is_correct:
+            s.scores[user_id] = s.scores.get(user_id, 0) + 1
+        return True
+
+    async def add_participant(self, session_id, user_id, from_index):
+        s = self._sessions[GROUP].get(session_id)
+        if not s or user_id in s.participants:
+            return False
+        s.participants[user_id] = from_index
+        return True
+
+    def stats(self) -> dict:
+        solo = self._sessions[SOLO].values()
+        solo_bytes = sum(s.footprint() for s in solo)
+        return {
+            'solo_sessions': len(solo),
+            'group_sessions': len(self._sessions[GROUP]),
+            'solo_bytes': solo_bytes,
+            'solo_bytes_per_10k': solo_bytes * 10000 // len(solo) if solo else 0,
+        }
+
+    # a single process owns every timer, so deadlines need no bookkeeping
+    async def set_deadline(self, key, deadline):
+        return None
+
+    async def claim_deadline(self, key):
+        return True
+
+    async def due_deadlines(self, before, limit=100):
+        return []
+
+
+_SOLO_ANSWER = """
+-- KEYS: session hash, answers list, timers zset
+-- ARGV: question_index, "selected:time_taken", is_correct, ttl, timer member
+local current = redis.call('HGET', KEYS[1], 'current')
+if not current then return -1 end
+if tonumber(current) ~= tonumber(ARGV[1]) then return -2 end
+if redis.call('LLEN', KEYS[2]) > tonumber(ARGV[1]) then return -3 end
+redis.call('RPUSH', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+if ARGV[3] == '1' then redis.call('HINCRBY', KEYS[1], 'score', 1) end
+redis.call('ZREM', KEYS[3], ARGV[5])
+return 1
+"""
+
+_GROUP_ANSWER = """
+-- KEYS: session hash, answers hash for the question, scores hash
+-- ARGV: question_index, user_id, selected, is_correct, ttl
+local current = redis.call('HGET', KEYS[1], 'current')
+if not current or tonumber(current) ~= tonumber(ARGV[1]) then return 0 end
+if redis.call('HSETNX', KEYS[2], ARGV[2], ARGV[3]) == 0 then return 0 end
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+if ARGV[4] == '1' then
+  redis.call('HINCRBY', KEYS[3], ARGV[2], 1)
+  redis.call('EXPIRE', KEYS[3], ARGV[5])
+end
+return 1
+"""
+
+_ADVANCE = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return false end
+return redis.call('HINCRBY', KEYS[1], 'current', 1)
+"""
+
+_SOLO_ERRORS = {
+    -1: "Session not found",
+    -2: "Question mismatch or already progressed",
+    -3: "Already answered",
+}
+
+class RedisSessionStore(SessionStore):
+    """Redis backend. `client` is a `redis.asyncio.Redis` (or fakeredis) created with decode_responses=True."""
+
+    def __init__(self, client, ttl: int = 6 * 3600, prefix: str = 'quiz'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.timers_key = f'{prefix}:timers'
+        self.ids_key = f'{prefix}:ids'
+        self._solo_answer = client.register_script(_SOLO_ANSWER)
+        self._group_answer = client.register_script(_GROUP_ANSWER)
+        self._advance = client.register_script(_ADVANCE)
+
+    # keys share a {hash tag} so a session's keys land on one cluster slot
+    def _key(self, kind, session_id, suffix=''):
+        return f'{self.prefix}:{kind}:{{{session_id}}}{suffix}'
+
+    async def new_id(self):
+        return b62encode(await self.client.incr(self.ids_key))
+
+    async def create(self, kind, session):
+        fields = {f: '' if getattr(session, f) is None else getattr(session, f) for f in _SCALAR_FIELDS[kind]}
+        key = self._key(kind, session.id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, self.ttl)
+        await pipe.execute()
+
+    async def get(self, kind, session_id, all_answers=False):
+        key = self._key(kind, session_id)
+        raw = await self.client.hgetall(key)
+        if not raw:
+            return None
+        # hash fields come back as strings
+        fields = _SCALAR_FIELDS[kind]
+        s = _SESSION_TYPES[kind](**{f: conv(raw[f]) for f, conv in fields.items() if f in raw})
+        if kind == SOLO:
+            for entry in await self.client.lrange(self._key(kind, session_id, ':answers'), 0, -1):
+                selected, time_taken = entry.split(':')
+                s.selections.append(int(selected))
+                s.latencies.append(float(time_taken))
+        else:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.hgetall(self._key(kind, session_id, ':scores'))
+            pipe.hgetall(self._key(kind, session_id, ':participants'))
+            # every answer reads the session; loading all past questions each time would be quadratic
+            indexes = range(s.current + 1) if all_answers else (s.current,)
+            for idx in indexes:
+                pipe.hgetall(self._key(kind, session_id, f':answers:{idx}'))
+            scores, participants, *answers = await pipe.execute()
+            s.scores = {int(uid): int(v) for uid, v in scores.items()}
+            s.participants = {int(uid): int(v) for uid, v in participants.items()}
+            s.answers = {idx: {int(uid): int(sel) for uid, sel in qmap.items()}
+                         for idx, qmap in zip(indexes, answers) if qmap}
+        return s
+
+    async def delete(self, kind, session_id):
+        s = await self.get(kind, session_id, all_answers=True)
+        if s is None:
+            return None
+        # only the caller that actually removes the hash gets the final state
+        if not await self.client.delete(self._key(kind, session_id)):
+            return None
+        extra = [self._key(kind, session_id, ':answers'), self._key(kind, session_id, ':scores')]
+        if kind == GROUP:
+            extra.append(self._key(kind, session_id, ':participants'))
+            extra += [self._key(kind, session_id, f':answers:{idx}') for idx in range(s.current + 1)]
+        await self.client.delete(*extra)
+        return s
+
+    async def advance(self, kind, session_id):
+        current = await self._advance(keys=[self._key(kind, session_id)])
+        return int(current) if current is not None else None
+
+    async def record_answer(self, session_id, question_index, selected, time_taken, is_correct):
+        entry = f'{UNANSWERED if selected is None else selected}:{"nan" if time_taken is None else time_taken}'
+        rc = await self._solo_answer(
+            keys=[self._key(SOLO, session_id), self._key(SOLO, session_id, ':answers'), self.timers_key],
+            args=[question_index, entry, int(is_correct), self.ttl,
+                  timer_key(SOLO, session_id, question_index)])
+        if int(rc) != 1:
+            raise SessionError(_SOLO_ERRORS.get(int(rc), "Answer rejected"))
+
+    async def record_group_answer(self, session_id, question_index, user_id, selected, is_correct):
+        rc = await self._group_answer(
+            keys=[self._key(GROUP, session_id), self._key(GROUP, session_id, f':answers:{question_index}'),
+                  self._key(GROUP, session_id, ':scores')],
+            args=[question_index, user_id, selected, int(is_correct), self.ttl])
+        return int(rc) == 1
+
+    async def add_participant(self, session_id, user_id, from_index):
+        key = self._key(GROUP, session_id, ':participants')
+        pipe = self.client.pipeline(transaction=True)
+        pipe.exists(self._key(GROUP, session_id))
+        pipe.hsetnx(key, user_id, from_index)
+        pipe.expire(key, self.ttl)
+        exists, added, _ = await pipe.execute()
+        if not exists:
+            await self.client.delete(key)
+            return False
+        return bool(added)
+
+    async def set_deadline(self, key, deadline):
+        await self.client.zadd(self.timers_key, {key: deadline})
+
+    async def claim_deadline(self, key):
+        return bool(await self.client.zrem(self.timers_key, key))
+
+    async def due_deadlines(self, before, limit=100):
+        return await self.client.zrangebyscore(self.timers_key, '-inf', before, start=0, num=limit)
+
+
+def _build_store() -> SessionStore:
+    from bot.config import settings
+    if settings.SESSION_STORE == 'redis':
+        from bot.services.redis_client import get_redis
+        return RedisSessionStore(get_redis(), ttl=settings.SESSION_TTL_SECONDS)
+    return MemorySessionStore()
+
+
+session_store = _build_store()
+
+
+_expiry_handlers = {}  # kind -> async handler(session_id, question_index)
+
+
+def on_expired_deadline(kind: str, handler):
+    """Register the coroutine that takes over a timeout whose owning worker went away."""
+    _expiry_handlers[kind] = handler
+
+
+async def sweep_expired_deadlines(grace: float) -> int:
+    """Claim deadlines overdue by more than `grace` seconds and run their expiry handler."""
+    claimed = 0
+    for key in await session_store.due_deadlines(time.time() - grace):
+        if not await session_store.claim_deadline(key):
+            continue
+        claimed += 1
+        kind, session_id, question_index = parse_timer_key(key)
+        handler = _expiry_handlers.get(kind)
+        if handler is None:
+            continue
+        try:
+            await handler(session_id, question_index)
+        except Exception:
+            logger.exception("Expired deadline handler failed for %s", key)
+    return claimed
+
+
+async def run_deadline_sweeper(interval: float, grace: float):
+    while True:
+        try:
+            claimed = await sweep_expired_deadlines(grace)
+            if claimed:
+                logger.info("Recovered %d orphaned question timeouts", claimed)
+        except Exception:
+            logger.exception("Deadline sweep failed")
+        await asyncio.sleep(interval)
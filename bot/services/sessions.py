@@ -1,107 +1,106 @@
 """Session manager for active quizzes.
-This is an in-memory manager suitable for single-instance deployments.
-For production scale, substitute with Redis or similar.
+State lives in the configured session store (in-memory by default, Redis for
+multi-instance deployments); see bot/services/session_store.py.
 """
-import asyncio
 import time
-import uuid
 import logging
 
-logger = logging.getLogger(__name__)
+from bot.services.quiz_registry import QuizRegistry
+from bot.services.session_store import SOLO, QuizSession, SessionError, session_store, timer_key
+from bot.services.timers import timer_wheel
+from bot.utils.metrics import Histogram
 
-_sessions = {}
+logger = logging.getLogger(__name__)
 
-class SessionError(Exception):
-    pass
+_timers = {}  # (session_id, question_index) -> TimerHandle owned by this process
+# answer (or timeout) -> next question delivered, as the player perceives it
+_turnaround = Histogram()
 
 class SessionManager:
     @staticmethod
-    def create_session(user_id: int, quiz_id: str, quiz_payload: dict):
-        session_id = str(uuid.uuid4())
+    async def create_session(user_id: int, quiz_id: str, quiz_payload: dict, chat_id: int = None):
+        session_id = await session_store.new_id()
         now = time.time()
-        s = {
-            'id': session_id,
-            'user_id': user_id,
-            'quiz_id': quiz_id,
-            'quiz': quiz_payload,
-            'current': 0,
-            'score': 0,
-            'started_at': now,
-            'answers': [],
-            'question_tasks': {},  # question_index -> asyncio.Task
-            'locked': False,
-        }
-        _sessions[session_id] = s
+        s = QuizSession(
+            id=session_id,
+            user_id=user_id,
+            chat_id=chat_id if chat_id is not None else user_id,
+            quiz_id=quiz_id,
+            quiz=QuizRegistry.intern(quiz_id, quiz_payload),
+            started_at=now,
+        )
+        await session_store.create(SOLO, s)
         return s
 
     @staticmethod
-    def get(session_id: str):
-        return _sessions.get(session_id)
+    async def get(session_id: str):
+        s = await session_store.get(SOLO, session_id)
+        if s is not None and s.quiz is None:
+            # stores that can't hold the quiz keep only quiz_id and version; registry/cache make this cheap
+            s.quiz = await QuizRegistry.load(s.quiz_id, s.quiz_version)
+            if s.quiz is None:
+                logger.warning("Quiz %s of session %s was removed or rewritten", s.quiz_id, session_id)
+                return None
+        return s
 
     @staticmethod
-    def answer(session_id: str, question_index: int, selected_index: int, time_taken: float):
-        s = _sessions.get(session_id)
+    async def answer(session_id: str, question_index: int, selected_index: int, time_taken: float):
+        s = await SessionManager.get(session_id)
         if not s:
             raise SessionError("Session not found")
-        if question_index != s['current']:
+        if question_index != s.current:
             raise SessionError("Question mismatch or already progressed")
-        # ensure not already answered
-        if len(s['answers']) > question_index:
-            raise SessionError("Already answered")
-        q = s['quiz']['questions'][question_index]
-        correct = q['correct_index']
-        is_correct = (selected_index == correct)
-        if is_correct:
-            s['score'] += 1
-        s['answers'].append({
-            'selected': selected_index,
-            'correct': correct,
-            'is_correct': is_correct,
-            'time_taken': time_taken
-        })
-        # cancel timeout task
-        task = s['question_tasks'].pop(question_index, None)
-        if task and not task.done():
-            task.cancel()
+        is_correct = (selected_index == s.quiz.questions[question_index].correct_index)
+        # the store re-checks current/already-answered atomically with the write
+        await session_store.record_answer(session_id, question_index, selected_index, time_taken, is_correct)
+        # cancel timeout
+        SessionManager.cancel_timeout(session_id, question_index)
         return is_correct
 
     @staticmethod
-    def timeout(session_id: str, question_index: int):
-        s = _sessions.get(session_id)
-        if not s:
-            return
-        # record as unanswered (None)
-        s['answers'].append({
-            'selected': None,
-            'correct': s['quiz']['questions'][question_index]['correct_index'],
-            'is_correct': False,
-            'time_taken': None
-        })
-        # proceed to next
+    async def timeout(session_id: str, question_index: int) -> bool:
+        # record as unanswered; False if an answer got there first
+        try:
+            await session_store.record_answer(session_id, question_index, None, None, False)
+        except SessionError:
+            return False
+        return True
 
     @staticmethod
-    def next_question(session_id: str):
-        s = _sessions.get(session_id)
-        if not s:
-            return None
-        s['current'] += 1
-        return s['current']
+    async def next_question(session_id: str):
+        return await session_store.advance(SOLO, session_id)
 
     @staticmethod
-    def finish(session_id: str):
-        s = _sessions.pop(session_id, None)
-        return s
+    async def finish(session_id: str):
+        return await session_store.delete(SOLO, session_id)
 
     @staticmethod
-    def schedule_timeout(session_id: str, question_index: int, seconds: int, coro):
-        async def _worker():
-            try:
-                await asyncio.sleep(seconds)
+    async def schedule_timeout(session_id: str, question_index: int, seconds: int, coro):
+        key = timer_key(SOLO, session_id, question_index)
+        await session_store.set_deadline(key, time.time() + seconds)
+
+        async def _fire():
+            _timers.pop((session_id, question_index), None)
+            # with a shared store another worker may already have handled this deadline
+            if await session_store.claim_deadline(key):
                 await coro()
-            except asyncio.CancelledError:
-                return
-        task = asyncio.create_task(_worker())
-        s = _sessions.get(session_id)
-        if s:
-            s['question_tasks'][question_index] = task
-        return task
+        handle = timer_wheel.schedule(seconds, _fire)
+        _timers[(session_id, question_index)] = handle
+        return handle
+
+    @staticmethod
+    def stats() -> dict:
+        stats = session_store.stats() if hasattr(session_store, 'stats') else {}
+        stats['quizzes_interned'] = QuizRegistry.count()
+        stats['question_turnaround'] = _turnaround.snapshot()
+        return stats
+
+    @staticmethod
+    def observe_turnaround(seconds: float):
+        _turnaround.observe(seconds)
+
+    @staticmethod
+    def cancel_timeout(session_id: str, question_index: int):
+        handle = _timers.pop((session_id, question_index), None)
+        if handle and not handle.done():
+            handle.cancel()
@@ -0,0 +1,28 @@
+"""One snapshot of the in-process metrics every service keeps, served by /stats and GET /metrics."""
+from bot.services.drafts import DraftService
+from bot.services.firestore import FirestoreClient
+from bot.services.leaderboards import LeaderboardStore
+from bot.services.outbound import outbound
+from bot.services.render_cache import RenderCache
+from bot.services.result_writer import result_writer
+from bot.services.sessions import SessionManager
+from bot.services.timers import timer_wheel
+from bot.services.webhook import get_ingress
+from bot.utils.router import callback_router
+
+
+def snapshot() -> dict:
+    ingress = get_ingress()
+    return {
+        'firestore_pool': FirestoreClient.pool_stats(),
+        'quiz_cache': FirestoreClient.quiz_cache_stats(),
+        'render_cache': RenderCache.stats(),
+        'sessions': SessionManager.stats(),
+        'timers': timer_wheel.stats(),
+        'outbound': outbound.stats(),
+        'callbacks': callback_router.stats(),
+        'webhook': ingress.stats() if ingress is not None else None,
+        'result_writer': result_writer.stats(),
+        'leaderboard_views': LeaderboardStore.view_stats(),
+        'drafts': DraftService.stats(),
+    }
@@ -0,0 +1,163 @@
+"""Hierarchical timer wheel shared by the quiz session managers.
+
+Question timeouts are coarse (5-600s) and are usually cancelled by an answer, so
+instead of one asyncio task + sleep per question we keep timers in two wheels of
+64 slots each (`tick` and `tick * 64` resolution) driven by a single coroutine.
+Scheduling and cancelling are O(1) set operations; a task is only created when a
+timer actually fires.
+"""
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable, Optional
+
+from bot.config import settings
+from bot.utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+WHEEL_BITS = 6
+WHEEL_SIZE = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SIZE - 1
+
+
+class TimerHandle:
+    """Returned by TimerWheel.schedule; mirrors the asyncio.Task cancel()/done() surface."""
+    __slots__ = ('deadline', 'expires_tick', 'callback', 'cancelled', 'fired', '_slot', '_wheel')
+
+    def __init__(self, wheel: 'TimerWheel', deadline: float, expires_tick: int, callback: Callable[[], Awaitable]):
+        self._wheel = wheel
+        self.deadline = deadline
+        self.expires_tick = expires_tick
+        self.callback = callback
+        self.cancelled = False
+        self.fired = False
+        self._slot: Optional[set] = None
+
+    def cancel(self) -> bool:
+        if self.done():
+            return False
+        self.cancelled = True
+        if self._slot is not None:
+            self._slot.discard(self)
+            self._slot = None
+            self._wheel._pending -= 1
+        return True
+
+    def done(self) -> bool:
+        return self.cancelled or self.fired
+
+
+class TimerWheel:
+    def __init__(self, tick: float = 0.5):
+        self.tick = tick
+        self._near = [set() for _ in range(WHEEL_SIZE)]  # one tick per slot
+        self._far = [set() for _ in range(WHEEL_SIZE)]  # WHEEL_SIZE ticks per slot
+        self._overflow = set()  # beyond WHEEL_SIZE ** 2 ticks
+        self._origin: Optional[float] = None
+        self._now_tick = 0
+        self._driver: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pending = 0
+        self.scheduled = 0
+        self.fired = 0
+        self.lag = Histogram()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def schedule(self, seconds: float, callback: Callable[[], Awaitable]) -> TimerHandle:
+        """Run `await callback()` after at least `seconds`."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._origin is None:
+            self._origin = now
+        if not self._pending:
+            # nothing pending: jump straight to the current tick instead of replaying empty ones
+            self._now_tick = int((now - self._origin) / self.tick)
+        if self._driver is None or self._driver.done():
+            self._wakeup = asyncio.Event()
+            self._driver = loop.create_task(self._run())
+        deadline = now + seconds
+        expires_tick = max(math.ceil((deadline - self._origin) / self.tick), self._now_tick + 1)
+        handle = TimerHandle(self, deadline, expires_tick, callback)
+        self._insert(handle)
+        self._pending += 1
+        self.scheduled += 1
+        self._wakeup.set()
+        return handle
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'scheduled': self.scheduled,
+            'fired': self.fired,
+            'lag': self.lag.snapshot(),
+        }
+
+    def _insert(self, handle: TimerHandle):
+        delta = handle.expires_tick - self._now_tick
+        if delta < WHEEL_SIZE:
+            slot = self._near[handle.expires_tick & WHEEL_MASK]
+        elif delta < WHEEL_SIZE * WHEEL_SIZE:
+            slot = self._far[(handle.expires_tick >> WHEEL_BITS) & WHEEL_MASK]
+        else:
+            slot = self._overflow
+        slot.add(handle)
+        handle._slot = slot
+
+    def _cascade(self, slot: set):
+        handles = list(slot)
+        slot.clear()
+        for handle in handles:
+            self._insert(handle)
+
+    def _advance(self):
+        self._now_tick += 1
+        near_index = self._now_tick & WHEEL_MASK
+        if near_index == 0:
+            far_index = (self._now_tick >> WHEEL_BITS) & WHEEL_MASK
+            if far_index == 0:
+                self._cascade(self._overflow)
+            self._cascade(self._far[far_index])
+        due = self._near[near_index]
+        if not due:
+            return
+        handles = list(due)
+        due.clear()
+        for handle in handles:
+            handle._slot = None
+            handle.fired = True
+            self._pending -= 1
+            self.fired += 1
+            asyncio.get_running_loop().create_task(self._fire(handle))
+
+    async def _fire(self, handle: TimerHandle):
+        self.lag.observe(max(0.0, asyncio.get_running_loop().time() - handle.deadline))
+        try:
+            await handle.callback()
+        except asyncio.CancelledError:
+            return
+        except Exception:
+            logger.exception("Timer callback failed")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.pending:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=60)
+                except asyncio.TimeoutError:
+                    if not self.pending:
+                        return
+                continue
+            target = int((loop.time() - self._origin) / self.tick)
+            while self._now_tick < target:
+                self._advance()
+            next_at = self._origin + (self._now_tick + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+
+
+timer_wheel = TimerWheel(tick=settings.TIMER_TICK_SECONDS)
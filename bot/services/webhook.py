@@ -0,0 +1,121 @@
+"""Webhook update ingestion with bounded buffering and backpressure.
+
+Updates POSTed by Telegram are verified, parsed and put on a bounded queue. A
+forwarder moves them into `Application.update_queue` only while fewer than
+`max_in_flight` updates are being handled; a catch-all handler registered in the
+last handler group marks each update done. When the queue is full the endpoint
+answers 503 and Telegram redelivers later, so a burst can't grow memory without bound.
+"""
+import asyncio
+import hmac
+import logging
+import sys
+import time
+from typing import Optional
+
+from bot.utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# handler group that runs after every other group
+DONE_GROUP = sys.maxsize
+
+
+class WebhookIngress:
+    def __init__(self, secret: str, max_queue: int = 1000, max_in_flight: int = 256,
+                 enqueue_timeout: float = 1.0):
+        self.secret = secret
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._accepted_at = {}  # update_id -> monotonic time the webhook accepted it, until handled
+        self._application = None
+        self._forwarder: Optional[asyncio.Task] = None
+        self.accepted = 0
+        self.rejected = 0
+        self.latency = Histogram()  # accepted -> all handlers finished
+
+    @property
+    def attached(self) -> bool:
+        return self._application is not None
+
+    def verify(self, token: Optional[str]) -> bool:
+        # without a secret anyone who finds the URL could inject updates
+        if not self.secret:
+            return False
+        return token is not None and hmac.compare_digest(token, self.secret)
+
+    def attach(self, application):
+        """Start forwarding into `application` and register the completion marker."""
+        from telegram import Update
+        from telegram.ext import TypeHandler
+
+        self._application = application
+        application.add_handler(TypeHandler(Update, self._mark_done), group=DONE_GROUP)
+        self._forwarder = asyncio.create_task(self._forward())
+
+    async def detach(self):
+        if self._forwarder:
+            self._forwarder.cancel()
+        self._application = None
+
+    async def submit(self, data: dict) -> bool:
+        """Queue a raw update; False means the buffer stayed full (caller should answer 503).
+
+        Raises ValueError when `data` isn't an update.
+        """
+        from telegram import Update
+
+        if not isinstance(data, dict) or not isinstance(data.get('update_id'), int):
+            raise ValueError("not a Telegram update")
+        update = Update.de_json(data, self._application.bot)
+        if update.update_id in self._accepted_at:
+            # redelivery of an update still queued or being handled: acknowledge it only
+            return True
+        self._accepted_at[update.update_id] = time.monotonic()
+        try:
+            await asyncio.wait_for(self._queue.put(update), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            del self._accepted_at[update.update_id]
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    async def _forward(self):
+        while True:
+            update = await self._queue.get()
+            await self._slots.acquire()
+            await self._application.update_queue.put(update)
+
+    async def _mark_done(self, update, context):
+        accepted_at = self._accepted_at.pop(getattr(update, 'update_id', None), None)
+        if accepted_at is None:
+            return
+        self.latency.observe(time.monotonic() - accepted_at)
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'in_flight': len(self._accepted_at) - self._queue.qsize(),
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'latency': self.latency.snapshot(),
+        }
+
+
+_ingress: Optional[WebhookIngress] = None
+
+
+def get_ingress() -> Optional[WebhookIngress]:
+    return _ingress
+
+
+def create_ingress(application, secret: str) -> WebhookIngress:
+    global _ingress
+    from bot.config import settings
+    _ingress = WebhookIngress(secret, max_queue=settings.WEBHOOK_QUEUE_SIZE,
+                              max_in_flight=settings.WEBHOOK_MAX_IN_FLIGHT)
+    _ingress.attach(application)
+    return _ingress
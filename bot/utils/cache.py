@@ -0,0 +1,199 @@
+"""In-process caches used in front of Firestore reads."""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class _LoadCancelled(Exception):
+    """The caller running a coalesced load was cancelled; the waiters load again."""
+
+
+class AsyncLRUCache:
+    """Bounded LRU cache with TTL expiry and single-flight loading.
+
+    Entries are evicted least-recently-used first once either `max_entries` or
+    `max_weight` (sum of `weigher(value)`) is exceeded. Concurrent misses for the
+    same key share a single loader call.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300,
+                 max_weight: Optional[int] = None,
+                 weigher: Optional[Callable[[Any], int]] = None,
+                 cache_none: bool = False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.cache_none = cache_none
+        self._weigher = weigher or (lambda value: 1)
+        self._data = OrderedDict()  # key -> (expires_at, weight, value)
+        self._weight = 0
+        self._inflight = {}  # key -> asyncio.Future
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, _, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if value is None and not self.cache_none:
+            return
+        weight = self._weigher(value)
+        if self.max_weight is not None and weight > self.max_weight:
+            # never cache something that alone exceeds the budget
+            self._remove(key)
+            return
+        self._remove(key)
+        self._data[key] = (time.monotonic() + self.ttl, weight, value)
+        self._weight += weight
+        while self._data and (len(self._data) > self.max_entries or
+                              (self.max_weight is not None and self._weight > self.max_weight)):
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._remove(key)
+        # a load that started before the invalidation must not repopulate the entry
+        self._inflight.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+        self._inflight.clear()
+        self._weight = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            self.hits += 1
+            return value
+        if key not in self._inflight:
+            self.misses += 1
+        return await self._load(key, loader)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        """Call `loader` once for all concurrent callers and cache the result unless invalidated meanwhile."""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except _LoadCancelled:
+                # another caller's cancellation is not ours: one of the waiters takes over the load
+                return await self._load(key, loader)
+        fut = asyncio.get_event_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await loader()
+        except BaseException as e:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+            fut.set_exception(_LoadCancelled() if isinstance(e, asyncio.CancelledError) else e)
+            fut.exception()  # mark retrieved when nobody else is waiting
+            raise
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+            self.put(key, value)
+        fut.set_result(value)
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'entries': len(self._data),
+            'weight': self._weight,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, key: Hashable):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._weight -= entry[1]
+
+
+class SWRCache(AsyncLRUCache):
+    """AsyncLRUCache that serves stale values while refreshing them in the background.
+
+    An entry is fresh for `ttl` seconds, then served stale for up to `stale_ttl` more:
+    the first stale read starts one background reload and every read returns the old
+    value at once, so once a key is warm callers never wait on a reload. `mark_stale`
+    is the invalidation: it keeps the value but forces the next read to refresh it.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 5, stale_ttl: float = 300, **kwargs):
+        super().__init__(max_entries=max_entries, ttl=ttl + stale_ttl, **kwargs)
+        self.fresh_ttl = ttl
+        self._fresh_until = {}  # key -> monotonic time the entry turns stale
+        self._refreshing = set()  # keys with a background reload scheduled or running
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def put(self, key: Hashable, value: Any):
+        super().put(key, value)
+        if key in self._data:
+            self._fresh_until[key] = time.monotonic() + self.fresh_ttl
+
+    def mark_stale(self, predicate: Optional[Callable[[Hashable], bool]] = None):
+        """Mark entries whose key matches `predicate` (all without one) as needing a refresh."""
+        for key in self._fresh_until:
+            if predicate is None or predicate(key):
+                self._fresh_until[key] = 0.0
+                # a reload that started before the change must not be cached as fresh
+                self._inflight.pop(key, None)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            return await super().get_or_load(key, loader)
+        if self._fresh_until.get(key, 0.0) >= time.monotonic():
+            self.hits += 1
+            return value
+        self.stale_hits += 1
+        if key not in self._inflight and key not in self._refreshing:
+            self.refreshes += 1
+            self._refreshing.add(key)
+            task = asyncio.create_task(self._load(key, loader))
+            task.add_done_callback(lambda t: self._refreshed(key, t))
+        return value
+
+    def _refreshed(self, key: Hashable, task: asyncio.Task):
+        self._refreshing.discard(key)
+        # on failure the stale value keeps being served and the next stale read retries
+        if not task.cancelled() and task.exception() is not None:
+            self.refresh_errors += 1
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        stats.update({
+            'stale_hits': self.stale_hits,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'hit_rate': (self.hits + self.stale_hits + self.coalesced) / lookups if lookups else 0.0,
+        })
+        return stats
+
+    def clear(self):
+        super().clear()
+        self._fresh_until.clear()
+
+    def _remove(self, key: Hashable):
+        super()._remove(key)
+        self._fresh_until.pop(key, None)
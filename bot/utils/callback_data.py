@@ -0,0 +1,81 @@
+"""Compact callback_data encoding.
+
+Telegram caps callback_data at 64 bytes. Session callbacks are laid out as
+`<prefix>:<fixed-width base62 fields><session token>`, e.g. `a:03` + `1` + `9xKq2`
+for "answer question 3 with option 1 in session 9xKq2". Every field sits at a known
+offset, so decoding is a handful of slices with no regex or split, and new fields
+(page cursors, flags) can be added as new layouts without touching existing ones.
+"""
+from typing import Optional, Tuple
+
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+_INDEX = {c: i for i, c in enumerate(ALPHABET)}
+MAX_CALLBACK_BYTES = 64
+
+
+def b62encode(n: int, width: int = 0) -> str:
+    if n < 0:
+        raise ValueError("negative value")
+    chars = []
+    rest = n
+    while rest:
+        rest, r = divmod(rest, 62)
+        chars.append(ALPHABET[r])
+    s = ''.join(reversed(chars)) or '0'
+    if width:
+        if len(s) > width:
+            raise ValueError(f"{n} does not fit in {width} base62 digits")
+        s = s.rjust(width, '0')
+    return s
+
+
+def b62decode(s: str) -> int:
+    n = 0
+    for c in s:
+        n = n * 62 + _INDEX[c]  # KeyError for anything outside the alphabet
+    return n
+
+
+class CallbackLayout:
+    """`prefix` plus fixed-width base62 integer fields, followed by a free-form tail (the session token)."""
+    __slots__ = ('prefix', 'widths', '_head', '_slices', '_tail_at')
+
+    def __init__(self, prefix: str, *widths: int):
+        self.prefix = prefix
+        self.widths = widths
+        self._head = prefix + ':'
+        start = len(self._head)
+        slices = []
+        for w in widths:
+            slices.append(slice(start, start + w))
+            start += w
+        self._slices = tuple(slices)
+        self._tail_at = start
+
+    def encode(self, *fields: int, tail: str = '') -> str:
+        data = self._head + ''.join(b62encode(v, w) for v, w in zip(fields, self.widths)) + tail
+        if len(data.encode()) > MAX_CALLBACK_BYTES:
+            raise ValueError(f"callback_data too long: {data!r}")
+        return data
+
+    def fields_prefix(self, *fields: int) -> str:
+        """Everything before the tail, for templates that append the token per send."""
+        return self._head + ''.join(b62encode(v, w) for v, w in zip(fields, self.widths))
+
+    def decode(self, data: str) -> Optional[Tuple[Tuple[int, ...], str]]:
+        """(fields, tail), or None when `data` wasn't produced by this layout."""
+        if not data.startswith(self._head) or len(data) <= self._tail_at:
+            return None
+        try:
+            fields = tuple([b62decode(data[s]) for s in self._slices])
+        except KeyError:
+            return None
+        return fields, data[self._tail_at:]
+
+
+# session callbacks; the tail is the session token
+QUESTION_INDEX_WIDTH = 2
+MAX_QUESTIONS = 62 ** QUESTION_INDEX_WIDTH  # question indexes that fit the answer layouts
+ANSWER = CallbackLayout('a', QUESTION_INDEX_WIDTH, 1)  # question index, option
+GROUP_ANSWER = CallbackLayout('g', QUESTION_INDEX_WIDTH, 1)  # question index, option
+GROUP_JOIN = CallbackLayout('j')
@@ -1,46 +1,89 @@
-import time
 import functools
 import asyncio
-from typing import Callable
+import logging
+from typing import Callable, Optional
 
-_RATE = {}
+from bot.config import settings
+from bot.utils.ratelimit import GCRALimiter, RedisGCRALimiter
 
-def rate_limit(calls: int = 30, per_seconds: int = 60):
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_MSG = "Rate limit exceeded. Try again later."
+ADMIN_ONLY_MSG = "You must be an admin to use this command."
+
+_local_limiters = {}  # scope -> GCRALimiter, so handlers sharing a `name` share the budget
+
+
+def rate_limit(calls: Optional[int] = None, per_seconds: int = 60, name: Optional[str] = None):
+    """Per-user rate limit for a handler.
+
+    Each decorated handler gets its own budget of `calls` per `per_seconds`
+    (default: RATE_LIMIT_PER_MIN per minute). Handlers decorated with the same
+    `name` share one budget. With RATE_LIMIT_BACKEND=redis, async handlers share
+    the budget across bot processes.
+    """
     def decorator(func: Callable):
+        budget = calls if calls is not None else settings.RATE_LIMIT_PER_MIN
+        scope = name or f"{func.__module__}.{func.__qualname__}"
+        local = _local_limiters.setdefault(scope, GCRALimiter(budget, per_seconds))
+        shared = None
+        if settings.RATE_LIMIT_BACKEND == 'redis':
+            from bot.services.redis_client import get_redis
+            shared = RedisGCRALimiter(get_redis(), scope, budget, per_seconds)
+
         if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
             async def wrapper(update, context, *args, **kwargs):
                 user = update.effective_user
                 if not user:
                     return await func(update, context, *args, **kwargs)
-                now = time.time()
-                arr = _RATE.setdefault(user.id, [])
-                # purge old
-                arr[:] = [t for t in arr if now - t < per_seconds]
-                if len(arr) >= calls:
+                if shared is not None:
+                    try:
+                        allowed = await shared.allow(user.id)
+                    except Exception:
+                        # Redis unavailable: fall back to this process' budget
+                        logger.warning("Shared rate limiter unavailable, using local budget", exc_info=True)
+                        allowed = local.allow(user.id)
+                else:
+                    allowed = local.allow(user.id)
+                if not allowed:
                     # rate limit hit
                     try:
-                        await update.message.reply_text("Rate limit exceeded. Try again later.")
+                        if update.callback_query:
+                            await update.callback_query.answer(RATE_LIMIT_MSG)
+                        else:
+                            await update.effective_message.reply_text(RATE_LIMIT_MSG)
                     except Exception:
                         pass
                     return
-                arr.append(now)
                 return await func(update, context, *args, **kwargs)
             return wrapper
         else:
+            @functools.wraps(func)
             def wrapper(update, context, *args, **kwargs):
                 user = update.effective_user
                 if not user:
                     return func(update, context, *args, **kwargs)
-                now = time.time()
-                arr = _RATE.setdefault(user.id, [])
-                arr[:] = [t for t in arr if now - t < per_seconds]
-                if len(arr) >= calls:
+                if not local.allow(user.id):
                     try:
-                        update.message.reply_text("Rate limit exceeded. Try again later.")
+                        update.effective_message.reply_text(RATE_LIMIT_MSG)
                     except Exception:
                         pass
                     return
-                arr.append(now)
                 return func(update, context, *args, **kwargs)
             return wrapper
     return decorator
+
+
+def admin_only(func: Callable):
+    """Only let users listed in ADMIN_IDS through to an async handler."""
+    @functools.wraps(func)
+    async def wrapper(update, context, *args, **kwargs):
+        user = update.effective_user
+        if user and user.id in settings.admin_id_list:
+            return await func(update, context, *args, **kwargs)
+        if update.callback_query:
+            return await update.callback_query.answer(ADMIN_ONLY_MSG, show_alert=True)
+        if update.effective_message:
+            await update.effective_message.reply_text(ADMIN_ONLY_MSG)
+    return wrapper
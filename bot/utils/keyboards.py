@@ -15,6 +15,18 @@ def subject_selection_keyboard(subjects: List[str]):
     return InlineKeyboardMarkup(keyboard)
 
 
+def quiz_list_keyboard(quizzes: List[dict], has_prev: bool = False, has_next: bool = False):
+    keyboard = [[InlineKeyboardButton(q['title'], callback_data=f"quiz:{q['id']}")] for q in quizzes]
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data='qpage:prev'))
+    if has_next:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data='qpage:next'))
+    if nav:
+        keyboard.append(nav)
+    return InlineKeyboardMarkup(keyboard)
+
+
 def options_keyboard(options: List[str], prefix: str = 'answer'):
     keyboard = []
     for idx, opt in enumerate(options):
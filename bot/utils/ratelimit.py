@@ -0,0 +1,99 @@
+"""GCRA rate limiters (token bucket equivalent, one timestamp of state per key).
+
+Each key stores only its theoretical arrival time (TAT), so a check is O(1). A key
+whose TAT is in the past is indistinguishable from a fresh key and gets evicted by
+the periodic sweep, so the table only holds users that were active recently.
+"""
+import time
+from typing import Dict, Hashable, Optional
+
+
+class GCRALimiter:
+    """Allow `calls` requests per `per_seconds`, with bursts of up to `calls`."""
+
+    def __init__(self, calls: int, per_seconds: float, sweep_interval: float = 60.0):
+        self.calls = calls
+        self.per_seconds = per_seconds
+        self.emission_interval = per_seconds / calls
+        self.tolerance = per_seconds  # == calls * emission_interval
+        self.sweep_interval = sweep_interval
+        self._tat: Dict[Hashable, float] = {}
+        self._next_sweep = 0.0
+        self.evicted = 0
+
+    def reserve(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Consume one slot if available and return 0, else return seconds until one frees up."""
+        if now is None:
+            now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+        tat = self._tat.get(key, now)
+        if tat < now:
+            tat = now
+        new_tat = tat + self.emission_interval
+        wait = new_tat - self.tolerance - now
+        if wait > 1e-9:  # tolerate float rounding on the last slot of a burst
+            return wait
+        self._tat[key] = new_tat
+        return 0.0
+
+    def allow(self, key: Hashable, now: Optional[float] = None) -> bool:
+        return self.reserve(key, now) == 0.0
+
+    def wait_time(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Seconds until `key` could be admitted, without consuming anything."""
+        if now is None:
+            now = time.monotonic()
+        tat = max(self._tat.get(key, now), now)
+        wait = tat + self.emission_interval - self.tolerance - now
+        return wait if wait > 1e-9 else 0.0
+
+    def defer(self, key: Hashable, seconds: float, now: Optional[float] = None):
+        """Block `key` for `seconds` (e.g. after the remote side asked us to back off)."""
+        if now is None:
+            now = time.monotonic()
+        self._tat[key] = max(self._tat.get(key, now), now + self.tolerance - self.emission_interval + seconds)
+
+    def sweep(self, now: Optional[float] = None):
+        """Drop keys whose bucket has fully refilled."""
+        if now is None:
+            now = time.monotonic()
+        idle = [k for k, tat in self._tat.items() if tat <= now]
+        for k in idle:
+            del self._tat[k]
+        self.evicted += len(idle)
+        self._next_sweep = now + self.sweep_interval
+
+    def __len__(self):
+        return len(self._tat)
+
+
+_GCRA_SCRIPT = """
+-- KEYS[1]: limiter key; ARGV: emission_interval, tolerance (seconds)
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local new_tat = tat + tonumber(ARGV[1])
+local wait = new_tat - tonumber(ARGV[2]) - now
+if wait > 1e-9 then return tostring(wait) end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+
+class RedisGCRALimiter:
+    """Same algorithm shared across processes; idle keys expire on their own via PX."""
+
+    def __init__(self, client, name: str, calls: int, per_seconds: float):
+        self.prefix = f'ratelimit:{name}:'
+        self.emission_interval = per_seconds / calls
+        self.tolerance = per_seconds
+        self._script = client.register_script(_GCRA_SCRIPT)
+
+    async def reserve(self, key: Hashable) -> float:
+        wait = await self._script(keys=[f'{self.prefix}{key}'], args=[self.emission_interval, self.tolerance])
+        return float(wait)
+
+    async def allow(self, key: Hashable) -> bool:
+        return await self.reserve(key) == 0.0
@@ -0,0 +1,81 @@
+"""Prefix-dispatch router for callback queries.
+
+python-telegram-bot tries each CallbackQueryHandler's regex in turn for every
+callback. Instead, all callback_data here has the form `<prefix>` or
+`<prefix>:<payload>`, and a single CallbackQueryHandler looks the prefix up in a
+dict. Middleware (rate limits, admin checks) is composed around a route once, at
+registration, and every route is timed.
+
+    @callback_router.route('subject', rate_limit(name='browse'))
+    async def subject_selected(update, context): ...
+"""
+import logging
+import time
+from typing import Awaitable, Callable, Dict
+
+from bot.utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[..., Awaitable]
+
+
+class CallbackRouter:
+    def __init__(self):
+        self._routes: Dict[str, Handler] = {}
+        self._timings: Dict[str, Histogram] = {}
+        self.dispatch_overhead = Histogram()  # lookup cost per update, excluding the handler
+        self.unrouted = 0
+
+    def route(self, prefix: str, *middleware: Callable[[Handler], Handler]):
+        """Register the decorated handler for `prefix`; middleware is applied outermost first."""
+        if ':' in prefix:
+            raise ValueError(f"route prefix may not contain ':': {prefix!r}")
+
+        def decorator(func: Handler) -> Handler:
+            if prefix in self._routes:
+                raise ValueError(f"callback prefix {prefix!r} is already routed")
+            handler = func
+            for wrap in reversed(middleware):
+                handler = wrap(handler)
+            self._routes[prefix] = handler
+            self._timings[prefix] = Histogram()
+            return func
+        return decorator
+
+    def resolve(self, data: str):
+        """(prefix, handler) for `data`; handler is None when nothing is routed there."""
+        prefix = data.partition(':')[0]
+        return prefix, self._routes.get(prefix)
+
+    async def dispatch(self, update, context):
+        started = time.perf_counter()
+        query = update.callback_query
+        prefix, handler = self.resolve(query.data or '')
+        routed_at = time.perf_counter()
+        self.dispatch_overhead.observe(routed_at - started)
+        if handler is None:
+            # stale button from an older version, or a typo in callback_data
+            self.unrouted += 1
+            logger.debug("No route for callback %r", query.data)
+            return await query.answer()
+        try:
+            return await handler(update, context)
+        finally:
+            self._timings[prefix].observe(time.perf_counter() - routed_at)
+
+    def attach(self, app):
+        """Install the single CallbackQueryHandler on `app`."""
+        from telegram.ext import CallbackQueryHandler
+        app.add_handler(CallbackQueryHandler(self.dispatch))
+
+    def stats(self) -> dict:
+        return {
+            'routes': {prefix: h.snapshot() for prefix, h in self._timings.items() if h.count},
+            'dispatch_overhead': self.dispatch_overhead.snapshot(),
+            'unrouted': self.unrouted,
+        }
+
+
+callback_router = CallbackRouter()
+
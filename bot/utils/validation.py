@@ -0,0 +1,73 @@
+"""Rules a quiz must satisfy before it is written to `quizzes`.
+
+Shared by /publish_quiz and the bulk importer so both accept exactly the same quizzes.
+"""
+import json
+from typing import List, Optional, Tuple
+
+from bot.utils.callback_data import MAX_QUESTIONS
+
+MAX_TEXT_LENGTH = 300  # title and question text
+OPTION_COUNT = 4
+MIN_TIME_PER_QUESTION = 5
+MAX_TIME_PER_QUESTION = 600
+MAX_QUIZ_BYTES = 900_000  # Firestore documents are capped at 1 MiB
+
+QuizError = Tuple[Optional[int], str]  # (question index or None for the quiz itself, message)
+
+
+def _is_int(value) -> bool:
+    # bool is an int subclass, but `true` is not a number of seconds or an option index
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def quiz_errors(quiz: dict) -> List[QuizError]:
+    """Everything wrong with `quiz`; empty when it can be published."""
+    errors: List[QuizError] = []
+    for field in ('title', 'subject', 'time_per_question'):
+        if not quiz.get(field):
+            errors.append((None, f"missing {field}"))
+    for field in ('title', 'subject'):
+        if quiz.get(field) and not isinstance(quiz[field], str):
+            errors.append((None, f"{field} must be text"))
+    title = quiz.get('title')
+    if isinstance(title, str) and len(title) > MAX_TEXT_LENGTH:
+        errors.append((None, f"title too long (max {MAX_TEXT_LENGTH} chars)"))
+    secs = quiz.get('time_per_question')
+    if secs and (not _is_int(secs) or not MIN_TIME_PER_QUESTION <= secs <= MAX_TIME_PER_QUESTION):
+        errors.append((None, f"time per question must be between {MIN_TIME_PER_QUESTION} and "
+                             f"{MAX_TIME_PER_QUESTION} seconds"))
+    questions = quiz.get('questions') or []
+    if not isinstance(questions, list) or not all(isinstance(q, dict) for q in questions):
+        errors.append((None, "questions must be a list of objects"))
+        questions = []
+    elif not questions:
+        errors.append((None, "no questions"))
+    elif len(questions) > MAX_QUESTIONS:
+        # answer buttons carry the question index in a fixed-width field
+        errors.append((None, f"too many questions (max {MAX_QUESTIONS})"))
+    for idx, q in enumerate(questions):
+        text = q.get('question_text')
+        if not text:
+            errors.append((idx, "missing question text"))
+        elif not isinstance(text, str):
+            errors.append((idx, "question text must be text"))
+        elif len(text) > MAX_TEXT_LENGTH:
+            errors.append((idx, f"question too long (max {MAX_TEXT_LENGTH} chars)"))
+        options = q.get('options') or []
+        if (not isinstance(options, list) or len(options) != OPTION_COUNT
+                or not all(isinstance(o, str) and o.strip() for o in options)):
+            errors.append((idx, f"needs exactly {OPTION_COUNT} non-empty options"))
+        correct = q.get('correct_index')
+        if correct is None:
+            errors.append((idx, "missing correct option"))
+        elif not _is_int(correct) or not 0 <= correct < OPTION_COUNT:
+            errors.append((idx, f"correct option must be 0-{OPTION_COUNT - 1}"))
+    if not errors and len(json.dumps(quiz)) > MAX_QUIZ_BYTES:
+        errors.append((None, f"too large for one document ({len(questions)} questions); split it up"))
+    return errors
+
+
+def describe(error: QuizError) -> str:
+    idx, message = error
+    return message if idx is None else f"question {idx}: {message}"
@@ -0,0 +1,10 @@
+"""Shared test setup: settings the bot requires at import time."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:test-token')
+os.environ.setdefault('ADMIN_IDS', '1')
@@ -0,0 +1,40 @@
+"""AsyncLRUCache single-flight loading."""
+import asyncio
+
+from bot.utils.cache import AsyncLRUCache
+
+
+def test_waiters_survive_the_leading_caller_being_cancelled():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def scenario():
+        cache = AsyncLRUCache()
+        leader = asyncio.create_task(cache.get_or_load('k', loader))
+        await asyncio.sleep(0)  # the leader's loader is running
+        waiters = [asyncio.create_task(cache.get_or_load('k', loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        return leader.cancelled(), results, cache.get('k')
+
+    cancelled, results, cached = asyncio.run(scenario())
+    assert cancelled
+    # one waiter took over the load and the others shared its result
+    assert results == [2, 2, 2] and cached == 2 and len(calls) == 2
+
+
+def test_loader_errors_reach_every_waiter():
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise KeyError('missing')
+
+    async def scenario():
+        cache = AsyncLRUCache()
+        return await asyncio.gather(*(cache.get_or_load('k', loader) for _ in range(3)), return_exceptions=True)
+
+    assert [type(r) for r in asyncio.run(scenario())] == [KeyError] * 3
@@ -0,0 +1,28 @@
+"""Fixed-width callback_data layouts."""
+import pytest
+
+from bot.utils.callback_data import ANSWER, MAX_CALLBACK_BYTES, MAX_QUESTIONS, CallbackLayout
+
+
+def test_fields_and_tail_round_trip():
+    data = ANSWER.encode(MAX_QUESTIONS - 1, 3, tail='9xKq2')
+    assert data == 'a:zz39xKq2'
+    assert ANSWER.decode(data) == ((MAX_QUESTIONS - 1, 3), '9xKq2')
+    assert ANSWER.fields_prefix(MAX_QUESTIONS - 1, 3) + '9xKq2' == data
+
+
+def test_values_must_fit_their_width():
+    with pytest.raises(ValueError):
+        ANSWER.encode(MAX_QUESTIONS, 0, tail='t')
+
+
+def test_foreign_or_malformed_data_does_not_decode():
+    assert ANSWER.decode('g:0139xKq2') is None  # another layout's prefix
+    assert ANSWER.decode('a:013') is None  # no tail
+    assert ANSWER.decode('a:0-39xKq2') is None  # outside the alphabet
+
+
+def test_encoded_data_respects_telegrams_limit():
+    layout = CallbackLayout('p', 4)
+    with pytest.raises(ValueError):
+        layout.encode(1, tail='x' * MAX_CALLBACK_BYTES)
@@ -0,0 +1,89 @@
+"""Journal crash recovery: torn tails, checkpoints and segment cleanup."""
+import asyncio
+import os
+
+from bot.services.journal import Journal
+
+
+def _journal(directory, **kwargs) -> Journal:
+    journal = Journal(str(directory), fsync_interval=0, **kwargs)
+    journal.open()
+    return journal
+
+
+def _segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.log'))
+
+
+def test_replay_stops_at_a_torn_tail(tmp_path):
+    journal = _journal(tmp_path)
+    asyncio.run(journal.append_many([{'n': 1}, {'n': 2}, {'n': 3}]))
+    journal.close()
+    # a crash in the middle of the last write leaves part of its frame
+    path = os.path.join(tmp_path, _segment_files(tmp_path)[-1])
+    os.truncate(path, os.path.getsize(path) - 3)
+
+    reopened = _journal(tmp_path)
+    assert [record for _, record in reopened.replay()] == [{'n': 1}, {'n': 2}]
+    # the torn segment is never appended to; new records go to a fresh one
+    asyncio.run(reopened.append({'n': 4}))
+    reopened.close()
+    assert [record for _, record in _journal(tmp_path).replay()] == [{'n': 1}, {'n': 2}, {'n': 4}]
+
+
+def test_replay_stops_at_a_corrupt_record(tmp_path):
+    journal = _journal(tmp_path)
+    positions = asyncio.run(journal.append_many([{'n': 1}, {'n': 2}, {'n': 3}]))
+    journal.close()
+    path = os.path.join(tmp_path, _segment_files(tmp_path)[-1])
+    with open(path, 'r+b') as f:
+        f.seek(positions[1][1] - 2)  # inside the body of the second record
+        f.write(b'##')
+
+    assert [record for _, record in _journal(tmp_path).replay()] == [{'n': 1}]
+
+
+def test_replay_resumes_after_the_checkpoint_and_drops_old_segments(tmp_path):
+    journal = _journal(tmp_path, segment_bytes=64)  # every write after the first rolls a segment
+
+    async def scenario():
+        positions = [await journal.append({'n': n, 'pad': 'x' * 40}) for n in range(5)]
+        await journal.checkpoint(positions[2])
+        return positions
+
+    positions = asyncio.run(scenario())
+    assert positions[2][0] > positions[0][0]
+    journal.close()
+    # segments wholly before the checkpoint are gone
+    assert min(int(name[:-4]) for name in _segment_files(tmp_path)) == positions[2][0]
+
+    reopened = _journal(tmp_path)
+    assert reopened.checkpointed == positions[2]
+    assert [record['n'] for _, record in reopened.replay()] == [3, 4]
+
+
+def test_an_older_checkpoint_is_ignored(tmp_path):
+    journal = _journal(tmp_path)
+
+    async def scenario():
+        positions = await journal.append_many([{'n': 1}, {'n': 2}])
+        await journal.checkpoint(positions[1])
+        await journal.checkpoint(positions[0])
+        return positions
+
+    positions = asyncio.run(scenario())
+    assert journal.checkpointed == positions[1]
+    assert list(journal.replay()) == []
+
+
+def test_concurrent_appends_share_fsyncs(tmp_path):
+    journal = _journal(tmp_path)
+
+    async def scenario():
+        return await asyncio.gather(*(journal.append({'n': n}) for n in range(50)))
+
+    positions = asyncio.run(scenario())
+    assert len(set(positions)) == 50
+    assert journal.fsyncs < 50
+    journal.close()
+    assert [record['n'] for _, record in _journal(tmp_path).replay()] == list(range(50))
@@ -0,0 +1,119 @@
+"""Ordering and coalescing of edits in the outbound scheduler."""
+import asyncio
+
+import pytest
+
+pytest.importorskip('pydantic')
+
+from bot.services.outbound import QUESTION, OutboundDispatcher  # noqa: E402
+
+
+class Flood(Exception):
+    """Looks like telegram.error.RetryAfter to the dispatcher."""
+
+    def __init__(self, retry_after: float):
+        super().__init__('flood')
+        self.retry_after = retry_after
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []  # texts in the order calls started
+        self.delivered = []  # texts in the order they reached the chat
+        self.gates = {}  # text -> Event the call waits on
+        self.floods = set()  # texts whose first attempt gets a 429
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.calls.append(text)
+        gate = self.gates.get(text)
+        if gate is not None:
+            await gate.wait()
+        if text in self.floods:
+            self.floods.discard(text)
+            raise Flood(0.01)
+        self.delivered.append(text)
+        return text
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.delivered.append(text)
+        return text
+
+
+async def _dispatcher(bot):
+    dispatcher = OutboundDispatcher(global_per_second=1000, private_per_second=1000)
+    dispatcher.start(bot)
+    return dispatcher
+
+
+async def _settle():
+    for _ in range(20):
+        await asyncio.sleep(0.005)
+
+
+def test_retried_edit_never_lands_after_newer_one():
+    async def scenario():
+        bot = FakeBot()
+        bot.gates['A'] = asyncio.Event()
+        bot.floods.add('A')
+        dispatcher = await _dispatcher(bot)
+        first = dispatcher.edit_message_text(1, 10, 'A')
+        await _settle()
+        assert bot.calls == ['A']
+        second = dispatcher.edit_message_text(1, 10, 'B')
+        await _settle()
+        assert bot.calls == ['A']  # held while A is in flight
+        bot.gates['A'].set()
+        results = await asyncio.wait_for(asyncio.gather(first, second), 1)
+        await dispatcher.stop()
+        return bot, results
+
+    bot, results = asyncio.run(scenario())
+    assert bot.delivered == ['B']
+    assert results == ['B', 'B']
+
+
+def test_retried_edit_is_delivered_when_nothing_newer():
+    async def scenario():
+        bot = FakeBot()
+        bot.floods.add('A')
+        dispatcher = await _dispatcher(bot)
+        result = await asyncio.wait_for(dispatcher.edit_message_text(1, 10, 'A'), 1)
+        await dispatcher.stop()
+        return bot, result, dispatcher.retried
+
+    bot, result, retried = asyncio.run(scenario())
+    assert (bot.calls, bot.delivered, result, retried) == (['A', 'A'], ['A'], 'A', 1)
+
+
+def test_edits_of_one_message_collapse_while_in_flight():
+    async def scenario():
+        bot = FakeBot()
+        bot.gates['A'] = asyncio.Event()
+        dispatcher = await _dispatcher(bot)
+        futures = [dispatcher.edit_message_text(1, 10, 'A')]
+        await _settle()
+        futures += [dispatcher.edit_message_text(1, 10, text) for text in 'BCD']
+        bot.gates['A'].set()
+        results = await asyncio.wait_for(asyncio.gather(*futures), 1)
+        await dispatcher.stop()
+        return bot, results
+
+    bot, results = asyncio.run(scenario())
+    assert bot.delivered == ['A', 'D']
+    assert results == ['A', 'D', 'D', 'D']
+
+
+def test_has_queued_sees_waiting_questions_only():
+    async def scenario():
+        bot = FakeBot()
+        dispatcher = await _dispatcher(bot)
+        edit = dispatcher.edit_message_text(-5, 10, 'tally')
+        before = dispatcher.has_queued(-5)
+        question = dispatcher.send_message(-5, 'Q2', priority=QUESTION)
+        during = dispatcher.has_queued(-5)
+        await asyncio.wait_for(asyncio.gather(edit, question), 1)
+        after = dispatcher.has_queued(-5)
+        await dispatcher.stop()
+        return before, during, after
+
+    assert asyncio.run(scenario()) == (False, True, False)
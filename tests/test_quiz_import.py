@@ -0,0 +1,113 @@
+"""Quiz validation and the bulk importer's CSV/JSON readers."""
+import json
+import os
+
+from bot.services.quiz_import import _READ_CHUNK, check_file, read_quizzes
+from bot.utils.callback_data import MAX_QUESTIONS
+from bot.utils.validation import quiz_errors
+
+CSV_HEADER = 'title,subject,time_per_question,is_premium,question,option1,option2,option3,option4,correct\n'
+
+
+def _question(text='Which planet is red?', correct=1) -> dict:
+    return {'question_text': text, 'options': ['Venus', 'Mars', 'Jupiter', 'Saturn'], 'correct_index': correct}
+
+
+def _quiz(**overrides) -> dict:
+    quiz = {'title': 'Planets', 'subject': 'Physics', 'time_per_question': 15, 'is_premium': False,
+            'questions': [_question()]}
+    quiz.update(overrides)
+    return quiz
+
+
+def _write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_a_valid_quiz_has_no_errors():
+    assert quiz_errors(_quiz()) == []
+
+
+def test_quiz_errors_point_at_the_question():
+    quiz = _quiz(questions=[_question(), _question(text=''), _question(correct=4)])
+    assert quiz_errors(quiz) == [(1, 'missing question text'), (2, 'correct option must be 0-3')]
+
+
+def test_booleans_are_not_numbers():
+    errors = quiz_errors(_quiz(time_per_question=True, questions=[_question(correct=True)]))
+    assert (None, 'time per question must be between 5 and 600 seconds') in errors
+    assert (0, 'correct option must be 0-3') in errors
+
+
+def test_question_count_is_capped_by_the_callback_index():
+    assert quiz_errors(_quiz(questions=[_question()] * MAX_QUESTIONS)) == []
+    assert quiz_errors(_quiz(questions=[_question()] * (MAX_QUESTIONS + 1))) == [
+        (None, f'too many questions (max {MAX_QUESTIONS})')]
+
+
+def test_csv_rows_group_into_quizzes(tmp_path):
+    path = _write(tmp_path, 'quizzes.csv', CSV_HEADER
+                  + 'Planets,Physics,20,yes,Which planet is red?,Venus,Mars,Jupiter,Saturn,1\n'
+                  + 'Planets,Physics,,,Largest planet?,Venus,Mars,Jupiter,Saturn,2\n'
+                  + 'Acids,Chemistry,,,pH of water?,7,1,14,0,0\n')
+    quizzes = list(read_quizzes(path, 'csv'))
+    assert [(quiz['title'], len(quiz['questions']), errors) for _, quiz, errors in quizzes] == [
+        ('Planets', 2, []), ('Acids', 1, [])]
+    planets = quizzes[0][1]
+    assert planets['time_per_question'] == 20 and planets['is_premium'] is True
+    assert planets['questions'][1] == {'question_text': 'Largest planet?',
+                                       'options': ['Venus', 'Mars', 'Jupiter', 'Saturn'], 'correct_index': 2}
+    assert quizzes[1][1]['time_per_question'] == 15 and quizzes[1][1]['is_premium'] is False
+    assert check_file(path, 'csv').error_count == 0
+
+
+def test_csv_errors_are_reported_by_line(tmp_path):
+    path = _write(tmp_path, 'quizzes.csv', CSV_HEADER
+                  + 'Planets,Physics,soon,,Which planet is red?,Venus,Mars,Jupiter,Saturn,one\n'
+                  + 'Acids,Chemistry,,,pH of water?,7,1,14,0,0\n'
+                  + 'Planets,Physics,,,Largest planet?,Venus,Mars,Jupiter,,2\n')
+    report = check_file(path, 'csv')
+    assert report.quizzes == 3 and report.questions == 3
+    assert report.errors == [
+        "'Planets' (line 2): line 2: time_per_question is not a number",
+        "'Planets' (line 2): line 2: correct must be a number 0-3",
+        "'Planets' (line 4): line 4: rows of this quiz are not contiguous",
+    ]
+
+
+def test_csv_with_a_missing_column_stops(tmp_path):
+    path = _write(tmp_path, 'quizzes.csv', 'title,subject,question\nPlanets,Physics,Which?\n')
+    assert check_file(path, 'csv').errors == [
+        'stopped reading: CSV header is missing columns: option1, option2, option3, option4, correct']
+
+
+def test_json_array_and_ndjson_read_the_same(tmp_path):
+    quizzes = [_quiz(), _quiz(title='Acids', subject='Chemistry', is_premium=True)]
+    array = _write(tmp_path, 'quizzes.json', json.dumps(quizzes, indent=2))
+    ndjson = _write(tmp_path, 'quizzes.jsonl', '\n'.join(json.dumps(q) for q in quizzes) + '\n')
+    assert [quiz for _, quiz, _ in read_quizzes(array, 'json')] == quizzes
+    assert [quiz for _, quiz, _ in read_quizzes(ndjson, 'json')] == quizzes
+
+
+def test_json_values_spanning_read_chunks(tmp_path):
+    quizzes = [_quiz(title=f'quiz {n}', questions=[_question(text='x' * 250)] * 8) for n in range(100)]
+    path = _write(tmp_path, 'quizzes.json', json.dumps(quizzes))
+    assert os.path.getsize(path) > 3 * _READ_CHUNK
+    assert [quiz['title'] for _, quiz, _ in read_quizzes(path, 'json')] == [q['title'] for q in quizzes]
+    assert check_file(path, 'json').error_count == 0
+
+
+def test_json_errors(tmp_path):
+    path = _write(tmp_path, 'quizzes.jsonl', '\n'.join([
+        json.dumps(_quiz()), '"not a quiz"', json.dumps(_quiz(questions='none')),
+        json.dumps(_quiz(questions=[_question(correct=None)])), '{"title": "broken",']))
+    report = check_file(path, 'json')
+    assert report.quizzes == 4
+    assert report.errors == [
+        "quiz #2: not a JSON object",
+        "quiz #3 ('Planets'): questions must be a list of objects",
+        "quiz #4 ('Planets'): question 0: missing correct option",
+        "stopped reading: invalid JSON: Expecting property name enclosed in double quotes",
+    ]
@@ -0,0 +1,139 @@
+"""RedisSessionStore against fakeredis: answer-once, deadline claiming and expiry recovery."""
+import asyncio
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')  # fakeredis runs the store's Lua scripts with it
+
+import fakeredis.aioredis  # noqa: E402
+from bot.services import session_store as store_module  # noqa: E402
+from bot.services.session_store import (  # noqa: E402
+    GROUP, SOLO, GroupSession, QuizSession, RedisSessionStore, SessionError, timer_key,
+)
+
+
+def _run(scenario):
+    async def main():
+        # a server per test: clients created without one share state
+        client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+async def _solo(store, session_id='s1'):
+    await store.create(SOLO, QuizSession(id=session_id, user_id=7, chat_id=7, quiz_id='q', started_at=1.0))
+
+
+async def _group(store, session_id='g1'):
+    await store.create(GROUP, GroupSession(id=session_id, chat_id=-100, host_id=7, quiz_id='q', started_at=1.0))
+
+
+def test_solo_answer_is_recorded_once():
+    async def scenario(client):
+        store = RedisSessionStore(client)
+        await _solo(store)
+        await store.record_answer('s1', 0, 2, 1.5, True)
+        with pytest.raises(SessionError, match='Already answered'):
+            await store.record_answer('s1', 0, 3, 2.0, False)
+        with pytest.raises(SessionError, match='Question mismatch'):
+            await store.record_answer('s1', 1, 3, 2.0, False)
+        return await store.get(SOLO, 's1')
+
+    s = _run(scenario)
+    assert (list(s.selections), s.score) == ([2], 1)
+
+
+def test_session_keeps_the_quiz_version_it_started_with():
+    async def scenario(client):
+        store = RedisSessionStore(client)
+        await store.create(SOLO, QuizSession(id='s1', user_id=7, chat_id=7, quiz_id='q', quiz_version=1718000000.125))
+        await _solo(store, 's2')  # a quiz written before versions existed
+        return await store.get(SOLO, 's1'), await store.get(SOLO, 's2')
+
+    versioned, legacy = _run(scenario)
+    assert versioned.quiz_version == 1718000000.125 and legacy.quiz_version is None
+
+
+def test_concurrent_group_answers_count_once_per_user():
+    async def scenario(client):
+        # two workers sharing one Redis
+        stores = [RedisSessionStore(client), RedisSessionStore(client)]
+        await _group(stores[0])
+        results = await asyncio.gather(*(stores[i % 2].record_group_answer('g1', 0, 42, 1, True)
+                                         for i in range(20)))
+        late = await stores[0].record_group_answer('g1', 1, 43, 1, True)  # not the current question
+        return results, late, await stores[1].get(GROUP, 'g1')
+
+    results, late, s = _run(scenario)
+    assert results.count(True) == 1 and not late
+    assert s.answers == {0: {42: 1}} and s.scores == {42: 1}
+
+
+def test_group_get_loads_only_the_current_question():
+    async def scenario(client):
+        store = RedisSessionStore(client)
+        await _group(store)
+        await store.record_group_answer('g1', 0, 42, 1, True)
+        await store.advance(GROUP, 'g1')
+        await store.record_group_answer('g1', 1, 43, 2, False)
+        return await store.get(GROUP, 'g1'), await store.delete(GROUP, 'g1')
+
+    current, final = _run(scenario)
+    assert current.answers == {1: {43: 2}}
+    assert final.answers == {0: {42: 1}, 1: {43: 2}}
+
+
+def test_answering_takes_the_deadline_away():
+    async def scenario(client):
+        store = RedisSessionStore(client)
+        await _solo(store)
+        key = timer_key(SOLO, 's1', 0)
+        await store.set_deadline(key, time.time() + 15)
+        await store.record_answer('s1', 0, 1, 0.5, False)
+        return await store.claim_deadline(key)
+
+    assert _run(scenario) is False
+
+
+def test_deadline_is_claimed_by_exactly_one_worker():
+    async def scenario(client):
+        stores = [RedisSessionStore(client) for _ in range(5)]
+        key = timer_key(GROUP, 'g1', 3)
+        await stores[0].set_deadline(key, time.time())
+        return await asyncio.gather(*(s.claim_deadline(key) for s in stores))
+
+    assert _run(scenario).count(True) == 1
+
+
+def test_sweeper_recovers_orphaned_deadlines(monkeypatch):
+    fired = []
+
+    async def on_expired(session_id, question_index):
+        fired.append((session_id, question_index))
+
+    async def scenario(client):
+        store = RedisSessionStore(client)
+        monkeypatch.setattr(store_module, 'session_store', store)
+        monkeypatch.setattr(store_module, '_expiry_handlers', {})
+        store_module.on_expired_deadline(GROUP, on_expired)
+        now = time.time()
+        # the worker that scheduled these died; one is overdue, one is still running
+        await store.set_deadline(timer_key(GROUP, 'g1', 2), now - 60)
+        await store.set_deadline(timer_key(GROUP, 'g2', 0), now + 60)
+        # a live worker's timer already claimed its own deadline
+        await store.set_deadline(timer_key(GROUP, 'g3', 1), now - 60)
+        assert await store.claim_deadline(timer_key(GROUP, 'g3', 1))
+        first = await store_module.sweep_expired_deadlines(grace=15)
+        second = await store_module.sweep_expired_deadlines(grace=15)
+        remaining = await client.zrange(store.timers_key, 0, -1)
+        return first, second, remaining
+
+    first, second, remaining = _run(scenario)
+    assert (first, second) == (1, 0)
+    assert fired == [('g1', 2)]
+    assert remaining == [timer_key(GROUP, 'g2', 0)]
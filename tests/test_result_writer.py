@@ -0,0 +1,75 @@
+"""ResultWriter spilling to the journal and replaying it after a restart."""
+import asyncio
+
+from bot.services import result_writer as result_writer_module
+from bot.services.journal import Journal
+from bot.services.result_writer import ResultWriter
+
+
+def _writer(directory, **kwargs) -> ResultWriter:
+    return ResultWriter(journal=Journal(str(directory), fsync_interval=0), **kwargs)
+
+
+def _patch_firestore(monkeypatch, saved, fail=False):
+    async def save_results(items):
+        if fail:
+            raise RuntimeError('firestore unavailable')
+        saved.extend(result_id for result_id, _ in items)
+
+    async def apply_rollups(payloads):
+        return None
+
+    monkeypatch.setattr(result_writer_module.FirestoreClient, 'save_results', save_results)
+    monkeypatch.setattr(result_writer_module.FirestoreClient, 'apply_rollups', apply_rollups)
+
+
+def test_spilled_results_are_refilled_from_the_journal(tmp_path, monkeypatch):
+    saved = []
+    _patch_firestore(monkeypatch, saved)
+    writer = _writer(tmp_path, flush_size=2, flush_interval=60, max_buffer=2)
+
+    async def scenario():
+        await writer.start()
+        ids = await writer.enqueue_many([{'n': n} for n in range(5)])
+        spilled = writer.spilled
+        for _ in range(100):
+            if writer.written == len(ids):
+                break
+            await asyncio.sleep(0.01)
+        await writer.close()
+        return ids, spilled
+
+    ids, spilled = asyncio.run(scenario())
+    assert spilled == 3
+    # refilled in journal order, and everything shipped is checkpointed
+    assert saved == ids
+    journal = Journal(str(tmp_path))
+    journal.open()
+    assert list(journal.replay()) == []
+
+
+def test_unwritten_results_are_replayed_after_a_restart(tmp_path, monkeypatch):
+    saved = []
+    _patch_firestore(monkeypatch, saved, fail=True)
+    writer = _writer(tmp_path, flush_size=10, flush_interval=60, max_buffer=2, max_retries=1)
+
+    async def first_run():
+        await writer.start()
+        ids = await writer.enqueue_many([{'n': n} for n in range(5)])
+        await writer.close()  # the final flush fails too
+        return ids
+
+    ids = asyncio.run(first_run())
+    assert saved == [] and writer.written == 0
+
+    _patch_firestore(monkeypatch, saved)
+    restarted = _writer(tmp_path, flush_size=10, flush_interval=60, max_buffer=10)
+
+    async def second_run():
+        await restarted.start()
+        replayed = restarted.replayed
+        await restarted.close()
+        return replayed
+
+    assert asyncio.run(second_run()) == 5
+    assert saved == ids
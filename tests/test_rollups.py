@@ -0,0 +1,29 @@
+"""plan_range: which hourly and daily buckets cover a time range."""
+from datetime import datetime, timezone
+
+from bot.services.rollups import DAILY_COLLECTION, HOURLY_COLLECTION, plan_range
+
+
+def _ts(*args) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def test_whole_days_use_daily_buckets_and_edges_hourly_ones():
+    refs = plan_range(_ts(2024, 3, 1, 22, 30), _ts(2024, 3, 4, 1, 10))
+    assert refs == [
+        (HOURLY_COLLECTION, '2024030122'),
+        (HOURLY_COLLECTION, '2024030123'),
+        (DAILY_COLLECTION, '20240302'),
+        (DAILY_COLLECTION, '20240303'),
+        (HOURLY_COLLECTION, '2024030400'),
+        (HOURLY_COLLECTION, '2024030401'),
+    ]
+
+
+def test_a_range_inside_one_hour_reads_that_hour():
+    assert plan_range(_ts(2024, 3, 1, 9, 5), _ts(2024, 3, 1, 9, 55)) == [(HOURLY_COLLECTION, '2024030109')]
+
+
+def test_exact_days_need_no_hourly_buckets():
+    refs = plan_range(_ts(2024, 2, 28), _ts(2024, 3, 1) - 1)
+    assert refs == [(DAILY_COLLECTION, '20240228'), (DAILY_COLLECTION, '20240229')]
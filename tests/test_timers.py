@@ -0,0 +1,70 @@
+"""TimerWheel: cascading from the far wheel and overflow down to the near wheel."""
+import asyncio
+
+from bot.services.timers import WHEEL_SIZE, TimerWheel
+
+
+async def _noop():
+    return None
+
+
+def _drive(wheel: TimerWheel, handles, ticks: int):
+    """Advance the wheel tick by tick (no driver) and note the tick each handle fired on."""
+    fired_at = {}
+    for _ in range(ticks):
+        wheel._advance()
+        for name, handle in handles.items():
+            if handle.fired and name not in fired_at:
+                fired_at[name] = wheel._now_tick
+    return fired_at
+
+
+def test_far_and_overflow_timers_cascade_to_their_tick():
+    async def scenario():
+        wheel = TimerWheel(tick=1000)  # the driver never gets to a tick on its own
+        handles = {
+            'near': wheel.schedule(5 * 1000, _noop),
+            'far': wheel.schedule((WHEEL_SIZE + 6) * 1000, _noop),
+            'far_cancelled': wheel.schedule((WHEEL_SIZE + 6) * 1000, _noop),
+            'overflow': wheel.schedule((WHEEL_SIZE * WHEEL_SIZE + 3) * 1000, _noop),
+        }
+        wheel._driver.cancel()
+        assert handles['near']._slot in wheel._near
+        assert handles['far']._slot in wheel._far
+        assert handles['overflow']._slot is wheel._overflow
+        handles['far_cancelled'].cancel()
+        fired_at = _drive(wheel, handles, WHEEL_SIZE * WHEEL_SIZE + 5)
+        await asyncio.sleep(0)
+        return wheel, handles, fired_at
+
+    wheel, handles, fired_at = asyncio.run(scenario())
+    # each fires on its own expiry tick, not when its slot cascades
+    assert fired_at == {name: handles[name].expires_tick for name in ('near', 'far', 'overflow')}
+    assert handles['far'].expires_tick > WHEEL_SIZE
+    assert not handles['far_cancelled'].fired
+    assert wheel.pending == 0 and wheel.fired == 3
+
+
+def test_timers_fire_in_deadline_order_and_never_early():
+    events = []
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        wheel = TimerWheel(tick=0.001)
+
+        def record(name, deadline):
+            async def callback():
+                events.append((name, loop.time() >= deadline))
+            return callback
+
+        start = loop.time()
+        for name, delay in (('far', 0.08), ('near', 0.01), ('middle', 0.03)):
+            wheel.schedule(delay, record(name, start + delay))
+        for _ in range(200):
+            if not wheel.pending and len(events) == 3:
+                break
+            await asyncio.sleep(0.005)
+        wheel._driver.cancel()
+
+    asyncio.run(scenario())
+    assert events == [('near', True), ('middle', True), ('far', True)]
@@ -0,0 +1,131 @@
+"""Webhook ingestion end to end: synthetic updates POSTed to bot/server.py through to the handlers."""
+import asyncio
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('telegram')
+httpx = pytest.importorskip('httpx')
+
+from bot import server  # noqa: E402
+from bot.services import webhook  # noqa: E402
+
+SECRET = 'test-secret'
+HEADERS = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+
+
+class StubApplication:
+    """Just enough of telegram.ext.Application: drains update_queue and runs the handlers concurrently."""
+
+    def __init__(self, handle):
+        self.bot = None
+        self.update_queue = asyncio.Queue()
+        self.handlers = []
+        self._handle = handle
+
+    def add_handler(self, handler, group=0):
+        self.handlers.append(handler)
+
+    async def run(self):
+        while True:
+            update = await self.update_queue.get()
+            asyncio.create_task(self._process(update))
+
+    async def _process(self, update):
+        await self._handle(update)
+        for handler in self.handlers:
+            await handler.callback(update, None)
+
+
+def _update(update_id: int) -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 1700000000, 'text': '/start',
+        'chat': {'id': 1000 + update_id % 50, 'type': 'private'},
+        'from': {'id': 1000 + update_id % 50, 'is_bot': False, 'first_name': 'Test'},
+    }}
+
+
+async def _with_ingress(handle, scenario):
+    application = StubApplication(handle)
+    ingress = webhook.create_ingress(application, SECRET)
+    runner = asyncio.create_task(application.run())
+    try:
+        async with httpx.AsyncClient(app=server.app, base_url='http://test') as client:
+            return await scenario(client, ingress)
+    finally:
+        runner.cancel()
+        await ingress.detach()
+        webhook._ingress = None
+
+
+async def _drain(ingress, expected: int, timeout: float = 10.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while ingress.latency.count < expected:
+        assert asyncio.get_running_loop().time() < deadline, ingress.stats()
+        await asyncio.sleep(0.01)
+
+
+def test_end_to_end_latency():
+    handled = []
+
+    async def handle(update):
+        await asyncio.sleep(0.002)  # a handler doing one quick network call
+        handled.append(update.update_id)
+
+    async def scenario(client, ingress):
+        responses = await asyncio.gather(*(client.post(server.TELEGRAM_WEBHOOK_PATH, json=_update(i),
+                                                       headers=HEADERS) for i in range(500)))
+        assert {r.status_code for r in responses} == {200}
+        await _drain(ingress, 500)
+        return ingress.stats()
+
+    stats = asyncio.run(_with_ingress(handle, scenario))
+    assert sorted(handled) == list(range(500))
+    assert stats['in_flight'] == 0 and stats['queued'] == 0
+    latency = stats['latency']
+    assert latency['count'] == 500
+    assert latency['avg'] >= 0.002  # every update waited for its handler
+    assert latency['p50'] <= latency['p99']
+    assert latency['p99'] <= 2.5  # generous: the client, server and handlers share one loop
+
+
+def test_rejects_missing_or_wrong_secret():
+    async def scenario(client, ingress):
+        missing = await client.post(server.TELEGRAM_WEBHOOK_PATH, json=_update(1))
+        wrong = await client.post(server.TELEGRAM_WEBHOOK_PATH, json=_update(2),
+                                  headers={'X-Telegram-Bot-Api-Secret-Token': 'nope'})
+        return missing.status_code, wrong.status_code, ingress.accepted
+
+    assert asyncio.run(_with_ingress(lambda u: asyncio.sleep(0), scenario)) == (403, 403, 0)
+
+
+def test_malformed_body_is_400():
+    async def scenario(client, ingress):
+        broken = await client.post(server.TELEGRAM_WEBHOOK_PATH, content=b'{"update_id": ', headers=HEADERS)
+        not_update = await client.post(server.TELEGRAM_WEBHOOK_PATH, json=[1, 2], headers=HEADERS)
+        return broken.status_code, not_update.status_code
+
+    assert asyncio.run(_with_ingress(lambda u: asyncio.sleep(0), scenario)) == (400, 400)
+
+
+def test_redelivered_update_is_handled_once():
+    release = asyncio.Event()
+    handled = []
+
+    async def handle(update):
+        await release.wait()
+        handled.append(update.update_id)
+
+    async def scenario(client, ingress):
+        for _ in range(3):
+            r = await client.post(server.TELEGRAM_WEBHOOK_PATH, json=_update(7), headers=HEADERS)
+            assert r.status_code == 200
+        await asyncio.sleep(0.05)
+        release.set()
+        await _drain(ingress, 1)
+        await asyncio.sleep(0.05)
+        return ingress.stats()
+
+    stats = asyncio.run(_with_ingress(handle, scenario))
+    assert handled == [7]
+    assert stats['accepted'] == 1 and stats['in_flight'] == 0